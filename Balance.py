@@ -0,0 +1,220 @@
+"""
+Monte Carlo balance simulator.
+
+Simulates many shifts at once using NumPy arrays, with one entry per shift, instead of running
+HeadlessShift one shift at a time. Anomalies appear on the same timeline as GameManager.schedule_spawn()
+and the losing rule follows GameManager.too_many_anomalies(). The player is a simple model:
+they type a command every few seconds, notice each anomaly some time after it appears,
+and report the anomalies they have noticed one at a time. Like GameManager.report(), a correct report
+only fixes the anomaly once the report has been checked.
+
+Usage:
+    python Balance.py [--shifts N] [--probability P] [--min-gap SECONDS] [--max-anomalies N] [--timescale T] [--rooms N]
+"""
+
+import argparse
+import numpy as np
+
+import Duty
+
+SECONDS_BETWEEN_CHECKS = 60
+
+class PlayerModel:
+    """
+    How the simulated player behaves.
+
+    command_seconds: real-world seconds between commands.
+    detection_seconds: mean in-game seconds before the player notices an anomaly (exponentially distributed).
+    report_accuracy: chance that a report names the right room and anomaly.
+    """
+    def __init__(self, command_seconds: float = 5.0, detection_seconds: float = 20*60.0, report_accuracy: float = 0.9):
+        self.command_seconds = command_seconds
+        self.detection_seconds = detection_seconds
+        self.report_accuracy = report_accuracy
+
+def default_settings() -> dict:
+    """
+    Return the default settings of a new GameManager.
+    """
+    return dict(Duty.GameManager().settings)
+
+def next_spawn_times(rng: np.random.Generator, now, last_anomaly_time, n_active, n_rooms: int, settings: dict):
+    """
+    Vectorised version of GameManager.schedule_spawn().
+    Every argument except n_rooms and settings is an array with one entry per shift.
+
+    Return the in-game time of each shift's next anomaly, or infinity if none can appear before the shift ends.
+    """
+    p = settings["probability"]
+    if p <= 0:
+        return np.full(len(now), np.inf)
+
+    earliest = np.maximum(now + 1, last_anomaly_time + settings["min_seconds_between_anomalies"])
+    first_check = np.ceil(earliest / SECONDS_BETWEEN_CHECKS) * SECONDS_BETWEEN_CHECKS
+    when = first_check + (rng.geometric(min(p, 1.0), size=len(now)) - 1) * SECONDS_BETWEEN_CHECKS
+
+    can_spawn = (n_active < settings["max_anomalies"]) & (n_active < n_rooms) & (when <= settings["max_seconds"])
+    return np.where(can_spawn, when, np.inf)
+
+def simulate(n_shifts: int, n_rooms: int = 4, settings: dict = None, player: PlayerModel = None, seed: int = None) -> dict:
+    """
+    Simulate n_shifts shifts at once.
+
+    Return a dictionary of arrays with one entry per shift:
+        lost: whether the shift ended because of too many anomalies
+        time: in-game seconds when the shift ended
+        found: number of anomalies reported correctly
+        total: number of anomalies that appeared
+    """
+    full_settings = default_settings()
+    if settings is not None:
+        full_settings.update(settings)
+    settings = full_settings
+    if player is None:
+        player = PlayerModel()
+
+    if n_rooms < settings["max_anomalies"]:
+        raise ValueError(f"Number of rooms {n_rooms} is fewer than the max number of anomalies {settings['max_anomalies']}.")
+
+    rng = np.random.default_rng(seed)
+    timescale = settings["timescale"]
+    report_seconds = int((int(settings["anomaly_report_time"]) + 1) * timescale)
+    command_seconds = int(player.command_seconds * timescale)
+    end_time = np.ceil(settings["max_seconds"])
+
+    time = np.zeros(n_shifts, dtype=np.int64)
+    last_anomaly_time = np.zeros(n_shifts, dtype=np.float64)
+    n_active = np.zeros(n_shifts, dtype=np.int64)
+    found = np.zeros(n_shifts, dtype=np.int64)
+    total = np.zeros(n_shifts, dtype=np.int64)
+    running = np.ones(n_shifts, dtype=bool)
+    lost = np.zeros(n_shifts, dtype=bool)
+
+    # Per-room anomaly state: whether the room has an anomaly, when the player will notice it,
+    # and when a correct report for it will be finished
+    occupied = np.zeros((n_shifts, n_rooms), dtype=bool)
+    noticed_at = np.full((n_shifts, n_rooms), np.inf)
+    fixed_at = np.full((n_shifts, n_rooms), np.inf)
+    rows = np.arange(n_shifts)
+
+    next_spawn = next_spawn_times(rng, time, last_anomaly_time, n_active, n_rooms, settings)
+
+    while running.any():
+        # 1. Check whether each shift has ended, the same as Duty.update()
+        over_time = running & (time >= settings["max_seconds"])
+        too_many = running & ~over_time & (n_active >= settings["max_anomalies"])
+        lost |= too_many
+        running &= ~(over_time | too_many)
+        if not running.any():
+            break
+
+        # 2. The player reports the anomaly they noticed first, or moves to the next camera.
+        # A correct report fixes the anomaly once it has been checked; after a wrong one the player has to notice it again.
+        first_noticed = np.argmin(noticed_at, axis=1)
+        reporting = running & (noticed_at[rows, first_noticed] <= time)
+        correct = reporting & (rng.random(n_shifts) < player.report_accuracy)
+        wrong = reporting & ~correct
+        fixed_at[rows[correct], first_noticed[correct]] = time[correct] + report_seconds
+        noticed_at[rows[correct], first_noticed[correct]] = np.inf
+        delay = rng.exponential(player.detection_seconds, size=n_shifts)
+        noticed_at[rows[wrong], first_noticed[wrong]] = time[wrong] + delay[wrong]
+
+        # 3. Tick time forward, running the events that fall inside the tick in order, like GameManager.advance_time().
+        # Each round handles the next event of every shift that still has one before the end of the tick.
+        target = time + np.where(running, command_seconds, 0)
+        ended = ~running
+        while True:
+            fix_room = np.argmin(fixed_at, axis=1)
+            next_fix = fixed_at[rows, fix_room]
+            next_change = np.minimum(next_spawn, next_fix)
+            now = np.minimum(next_change, end_time)
+            due = ~ended & (now <= target)
+            if not due.any():
+                break
+
+            # The end of the shift was scheduled first, so it wins a tie
+            is_end = due & (end_time <= next_change)
+            is_fix = due & ~is_end & (next_fix <= next_spawn)
+            is_spawn = due & ~is_end & ~is_fix
+            ended |= is_end
+
+            occupied[rows[is_fix], fix_room[is_fix]] = False
+            fixed_at[rows[is_fix], fix_room[is_fix]] = np.inf
+            n_active -= is_fix
+            found += is_fix
+
+            spawn_room = np.argmin(occupied, axis=1)
+            delay = rng.exponential(player.detection_seconds, size=n_shifts)
+            occupied[rows[is_spawn], spawn_room[is_spawn]] = True
+            noticed_at[rows[is_spawn], spawn_room[is_spawn]] = now[is_spawn] + delay[is_spawn]
+            last_anomaly_time = np.where(is_spawn, now, last_anomaly_time)
+            n_active += is_spawn
+            total += is_spawn
+
+            # Too many anomalies ends the shift the moment the last one appears
+            too_many = is_spawn & (n_active >= settings["max_anomalies"])
+            lost |= too_many
+            ended |= too_many
+
+            changed = is_fix | is_spawn
+            rescheduled = next_spawn_times(rng, now, last_anomaly_time, n_active, n_rooms, settings)
+            next_spawn = np.where(changed, rescheduled, next_spawn)
+
+        time = target
+        running &= ~ended
+
+    return {"lost": lost, "time": time, "found": found, "total": total}
+
+def summarise(results: dict) -> dict:
+    """
+    Return the loss rate and the distributions of found and total anomalies.
+    Distributions are lists where index i is the fraction of shifts with i anomalies.
+    """
+    found = results["found"]
+    total = results["total"]
+    ratio = np.divide(found, total, out=np.ones(len(found)), where=total > 0)
+    return {
+        "shifts": len(found),
+        "loss_rate": float(results["lost"].mean()),
+        "mean_found": float(found.mean()),
+        "mean_total": float(total.mean()),
+        "mean_found_ratio": float(ratio.mean()),
+        "found_distribution": (np.bincount(found) / len(found)).tolist(),
+        "total_distribution": (np.bincount(total) / len(total)).tolist()
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate many shifts to balance the game settings.")
+    parser.add_argument("--shifts", type=int, default=20000)
+    parser.add_argument("--rooms", type=int, default=4)
+    parser.add_argument("--probability", type=float, default=0.1)
+    parser.add_argument("--min-gap", type=float, default=10*60, help="min_seconds_between_anomalies (in-game seconds)")
+    parser.add_argument("--max-anomalies", type=float, default=4)
+    parser.add_argument("--timescale", type=float, default=60)
+    parser.add_argument("--command-seconds", type=float, default=5.0)
+    parser.add_argument("--detection-seconds", type=float, default=20*60.0)
+    parser.add_argument("--accuracy", type=float, default=0.9)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    settings = {
+        "probability": args.probability,
+        "min_seconds_between_anomalies": args.min_gap,
+        "max_anomalies": args.max_anomalies,
+        "timescale": args.timescale
+    }
+    player = PlayerModel(args.command_seconds, args.detection_seconds, args.accuracy)
+    summary = summarise(simulate(args.shifts, args.rooms, settings, player, args.seed))
+
+    print(f"Shifts:           {summary['shifts']}")
+    print(f"Loss rate:        {summary['loss_rate']:.2%}")
+    print(f"Found / total:    {summary['mean_found']:.2f} / {summary['mean_total']:.2f} ({summary['mean_found_ratio']:.2%} found)")
+    print("Found distribution:")
+    for count, fraction in enumerate(summary["found_distribution"]):
+        print(f"  {count:3}: {fraction:.2%}")
+    print("Total distribution:")
+    for count, fraction in enumerate(summary["total_distribution"]):
+        print(f"  {count:3}: {fraction:.2%}")
+
+if __name__ == "__main__":
+    main()
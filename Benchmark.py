@@ -0,0 +1,302 @@
+"""
+Benchmarks for the game engine.
+
+Each benchmark times one of the GameManager hot paths (or the anomaly generators in Game.py) in a game
+with a given number of rooms, from 10 up to 100k. The memory benchmark measures how much memory the rooms take up,
+once with one Room object per room and once with the compact RoomTable (GameManager(compact=True)).
+Item names are built fresh for every room, the same as reading them from a room file.
+
+Results are printed as a table and can be saved as JSON with --output, so the numbers
+from one release can be compared with the next.
+
+Usage:
+    python -m Benchmark [--rooms N ...] [--only NAME ...] [--repeat N] [--output FILE]
+"""
+
+import argparse
+import gc
+import io
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+import Duty
+import Game
+
+# Item names are put together from these words, so the same names come up again and again across rooms
+ITEM_WORDS = [
+    ["Oak", "Pine", "Metal", "Glass", "Leather", "Plastic"],
+    ["Wooden", "Black", "White", "Red", "Round", "Tall"],
+    ["Chair", "Table", "Desk", "Lamp", "Bookshelf", "Sofa", "Bed", "Cabinet", "Rug", "Clock"]
+]
+
+DEFAULT_ROOM_COUNTS = [10, 100, 1000, 10000, 100000]
+
+# Items in each room for the print_camera benchmark
+LARGE_ROOM_ITEMS = 500
+
+def make_items(rng: random.Random, n_items: int) -> list[str]:
+    """
+    Return n_items random item names, each one a new string like a line read from a file.
+    """
+    return [" ".join(rng.choice(words) for words in ITEM_WORDS) for _ in range(n_items)]
+
+def make_rooms(n_rooms: int, n_items: int = 5, seed: int = 0) -> list[tuple[str, list[str]]]:
+    rng = random.Random(seed)
+    return [(f"Room {i}", make_items(rng, n_items)) for i in range(n_rooms)]
+
+def make_game(n_rooms: int, n_items: int = 5, seed: int = 0) -> Duty.GameManager:
+    """
+    Return a headless game with n_rooms rooms and the anomalies from Game.py.
+    """
+    game = Duty.GameManager(headless=True, seed=seed)
+    game.add_rooms_bulk(make_rooms(n_rooms, n_items, seed))
+    with Duty.use_game(game):
+        Game.register_anomalies()
+    return game
+
+def fix_room(game: Duty.GameManager, index: int):
+    """
+    Remove the anomaly from a room straight away, so a benchmark can create another one there.
+    """
+    room = game.get_rooms()[index]
+    if room.get_anomaly():
+        room.clear_anomaly()
+        game.mark_room_free(index)
+        game.working_cameras.set(index, True)
+        game.set_data("active_anomalies", game.get_data("active_anomalies") - 1)
+
+# Each benchmark sets up a game with n_rooms rooms and returns (ops, run), where run() does ops operations.
+# Only run() is timed, and it can be run again and again on the same setup.
+
+def bench_add_room(n_rooms: int, seed: int):
+    rooms = make_rooms(n_rooms, seed=seed)
+    def run():
+        game = Duty.GameManager(headless=True)
+        for name, items in rooms:
+            game.add_room(name, items)
+    return n_rooms, run
+
+def bench_add_rooms_bulk(n_rooms: int, seed: int):
+    rooms = make_rooms(n_rooms, seed=seed)
+    def run():
+        Duty.GameManager(headless=True).add_rooms_bulk(rooms)
+    return n_rooms, run
+
+def bench_get_room(n_rooms: int, seed: int):
+    game = make_game(n_rooms, seed=seed)
+    rng = random.Random(seed)
+    names = [f"ROOM {rng.randrange(n_rooms)}" for _ in range(10000)]
+    def run():
+        for name in names:
+            game.get_room(name)
+    return len(names), run
+
+def bench_number_of_anomalies_to_create(n_rooms: int, seed: int):
+    game = make_game(n_rooms, seed=seed)
+    def run():
+        for _ in range(1000):
+            # A whole shift of idle time since the last check
+            game.set_data("seconds_since_last_anomaly_check", 5*60*60)
+            game.set_data("seconds_since_last_anomaly", 5*60*60)
+            game.set_data("active_anomalies", 0)
+            game.number_of_anomalies_to_create()
+    return 1000, run
+
+def bench_get_random_unchanged_room(n_rooms: int, seed: int):
+    game = make_game(n_rooms, seed=seed)
+    # Half of the rooms have an anomaly
+    for i in range(0, n_rooms, 2):
+        game.add_anomaly_change("CAMERA MALFUNCTION", game.get_rooms()[i], ("hide",))
+    def run():
+        for _ in range(10000):
+            game.get_random_unchanged_room()
+    return 10000, run
+
+def bench_next_camera(n_rooms: int, seed: int):
+    game = make_game(n_rooms, seed=seed)
+    # Every camera but one in ten is broken
+    for i in range(n_rooms):
+        if i % 10 != 0:
+            game.add_anomaly_change("CAMERA MALFUNCTION", game.get_rooms()[i], ("hide",))
+    def run():
+        for _ in range(5000):
+            game.next_camera()
+        for _ in range(5000):
+            game.next_camera(reverse=True)
+    return 10000, run
+
+def bench_print_camera(n_rooms: int, seed: int):
+    game = make_game(n_rooms, LARGE_ROOM_ITEMS, seed)
+    game.headless = False
+    output = io.StringIO()
+    game.renderer.output = output
+    def run():
+        for _ in range(100):
+            game.clear()
+            game.print_camera(game.next_camera())
+            game.flush()
+            output.seek(0)
+            output.truncate()
+    return 100, run
+
+def make_generator_bench(name: str):
+    def bench(n_rooms: int, seed: int):
+        game = make_game(n_rooms, seed=seed)
+        generator, _ = game.generators[name]
+        rng = random.Random(seed)
+        indices = [rng.randrange(len(game.get_rooms())) for _ in range(1000)]
+        def run():
+            with Duty.use_game(game):
+                for i in indices:
+                    generator(game.get_rooms()[i].name)
+                    fix_room(game, i)
+        return len(indices), run
+    return bench
+
+BENCHMARKS = {
+    "add_room": bench_add_room,
+    "add_rooms_bulk": bench_add_rooms_bulk,
+    "get_room": bench_get_room,
+    "number_of_anomalies_to_create": bench_number_of_anomalies_to_create,
+    "get_random_unchanged_room": bench_get_random_unchanged_room,
+    "next_camera": bench_next_camera,
+    "print_camera": bench_print_camera,
+    "camera_malfunction": make_generator_bench("CAMERA MALFUNCTION"),
+    "missing_item": make_generator_bench("MISSING ITEM"),
+    "item_movement": make_generator_bench("ITEM MOVEMENT"),
+    "typo": make_generator_bench("TYPO")
+}
+
+# The fewest and most rooms some benchmarks can be set up with, with None for no limit.
+# The result says how many rooms were really used.
+ROOM_LIMITS = {
+    # The default settings allow 4 anomalies at once, and there have to be at least that many rooms
+    "number_of_anomalies_to_create": (4, None),
+    # Printing one camera doesn't depend on the number of rooms, and rooms this big are slow to set up
+    "print_camera": (None, 1000),
+    # The generator benchmarks are always set up with at least two rooms
+    "camera_malfunction": (2, None),
+    "missing_item": (2, None),
+    "item_movement": (2, None),
+    "typo": (2, None)
+}
+
+def rooms_used(name: str, n_rooms: int) -> int:
+    """
+    Return how many rooms the benchmark is really set up with when asked for n_rooms.
+    """
+    fewest, most = ROOM_LIMITS.get(name, (None, None))
+    if fewest is not None:
+        n_rooms = max(n_rooms, fewest)
+    if most is not None:
+        n_rooms = min(n_rooms, most)
+    return n_rooms
+
+def time_benchmark(name: str, n_rooms: int, repeat: int = 5, seed: int = 0) -> dict:
+    """
+    Set up one benchmark, run it repeat times and return the fastest time per operation.
+    The fastest run is the one least disturbed by anything else the computer was doing.
+    The result has the number of rooms really used, which can differ from n_rooms (see ROOM_LIMITS).
+    """
+    n_rooms = rooms_used(name, n_rooms)
+    ops, run = BENCHMARKS[name](n_rooms, seed)
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        run()
+        seconds = (time.perf_counter() - start) / ops
+        if best is None or seconds < best:
+            best = seconds
+    return {"benchmark": name, "rooms": n_rooms, "value": best, "unit": "seconds_per_op"}
+
+def room_memory(n_rooms: int, n_items: int = 5, compact: bool = False, seed: int = 0) -> int:
+    """
+    Build a game with n_rooms rooms and return how many bytes were still allocated for them afterwards.
+    """
+    rng = random.Random(seed)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        game = Duty.GameManager(headless=True, compact=compact)
+        for i in range(n_rooms):
+            game.add_room(f"Room {i}", make_items(rng, n_items))
+        gc.collect()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # Keep the game alive until the memory has been measured
+    del game
+    return size
+
+def memory(room_counts: list[int], n_items: int = 5, seed: int = 0) -> list[dict]:
+    """
+    Measure the memory used per room for each number of rooms, with and without the compact table.
+    """
+    results = []
+    for n_rooms in room_counts:
+        for compact in (False, True):
+            size = room_memory(n_rooms, n_items, compact, seed)
+            results.append({
+                "benchmark": "memory_compact" if compact else "memory",
+                "rooms": n_rooms,
+                "value": size / n_rooms,
+                "unit": "bytes_per_room"
+            })
+    return results
+
+def run_all(room_counts: list[int], names: list[str] = None, repeat: int = 5, seed: int = 0) -> list[dict]:
+    """
+    Run the named benchmarks (default all of them, plus the memory benchmark) for each number of rooms.
+    Return one result per benchmark and number of rooms it really used, so a benchmark limited to fewer rooms
+    (see ROOM_LIMITS) is only run once at its limit.
+    """
+    if names is None:
+        names = list(BENCHMARKS) + ["memory"]
+
+    results = []
+    for name in names:
+        if name == "memory":
+            results.extend(memory(room_counts, seed=seed))
+            continue
+        for n_rooms in sorted(set(rooms_used(name, n_rooms) for n_rooms in room_counts)):
+            results.append(time_benchmark(name, n_rooms, repeat, seed))
+    return results
+
+def print_table(results: list[dict], file=sys.stdout):
+    for result in results:
+        if result["unit"] == "seconds_per_op":
+            value = f"{result['value']*1e6:12.3f} us/op"
+        else:
+            value = f"{result['value']:12.1f} bytes/room"
+        print(f"{result['benchmark']:<30} {result['rooms']:>8}  {value}", file=file)
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the game engine's hot paths for different numbers of rooms.")
+    parser.add_argument("--rooms", type=int, nargs="+", default=DEFAULT_ROOM_COUNTS)
+    parser.add_argument("--only", nargs="+", default=None, choices=list(BENCHMARKS) + ["memory"], help="benchmarks to run, defaults to all of them")
+    parser.add_argument("--repeat", type=int, default=5, help="runs of each benchmark, the fastest is kept")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="save the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = run_all(args.rooms, args.only, args.repeat, args.seed)
+    print_table(results)
+
+    if args.output is not None:
+        report = {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "results": results
+        }
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+
+if __name__ == "__main__":
+    main()
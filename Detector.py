@@ -0,0 +1,169 @@
+"""
+An automated player that finds anomalies by comparing what the cameras show to how the rooms looked at the start.
+
+Like a person, the bot only sees one camera at a time and pages through them with "next".
+It remembers every room's digest at the start of the shift (see Duty.items_digest()), and the game keeps each
+room's digest up to date as anomalies come and go, so a room that looks the same as it did is skipped without
+looking at its items. Only a room whose digest changed is
+compared item by item, using each item's hash as a fingerprint, to work out which anomaly it has:
+    MISSING ITEM: one item is gone
+    ITEM MOVEMENT: two items swapped places
+    TYPO: one item is one letter different (a letter doubled or replaced)
+    CAMERA MALFUNCTION: the camera was skipped, or shows nothing
+Anything else is left alone, since the bot can't tell what it is.
+
+Used for load testing and as a regression check that every anomaly in Game.py can be found.
+
+Usage:
+    python Detector.py [--shifts N] [--seconds-between-commands S] [--rooms FILE]
+"""
+
+import argparse
+
+import Duty
+import Simulation
+
+def one_edit_apart(original: str, changed: str) -> bool:
+    """
+    Return whether changed is original with one letter replaced or one extra letter added.
+    """
+    if len(changed) == len(original):
+        return sum(a != b for a, b in zip(original, changed)) == 1
+    if len(changed) == len(original) + 1:
+        # Skip past the first difference in changed, and the rest must line up
+        i = 0
+        while i < len(original) and original[i] == changed[i]:
+            i += 1
+        return original[i:] == changed[i+1:]
+    return False
+
+def classify(original, shown) -> str:
+    """
+    Work out which anomaly turns the original items into the items shown.
+    Return the anomaly name, or None if it doesn't look like any anomaly the bot knows.
+    """
+    if len(original) > 0 and len(shown) == 0:
+        return "CAMERA MALFUNCTION"
+
+    original_prints = [hash(item) for item in original]
+    shown_prints = [hash(item) for item in shown]
+
+    if len(shown) == len(original) - 1:
+        # Everything before the missing item lines up, and everything after it is shifted down by one
+        i = 0
+        while i < len(shown) and shown_prints[i] == original_prints[i]:
+            i += 1
+        if shown_prints[i:] == original_prints[i+1:]:
+            return "MISSING ITEM"
+        return None
+
+    if len(shown) != len(original):
+        return None
+
+    different = [i for i, (a, b) in enumerate(zip(original_prints, shown_prints)) if a != b]
+    if len(different) == 2:
+        a, b = different
+        if shown[a] == original[b] and shown[b] == original[a]:
+            return "ITEM MOVEMENT"
+    elif len(different) == 1:
+        i = different[0]
+        if one_edit_apart(original[i], shown[i]):
+            return "TYPO"
+    return None
+
+class DetectorBot:
+    """
+    A player (see Simulation.py) that looks at one camera per command, reports any anomaly it can work out,
+    and otherwise moves on to the next camera.
+    """
+    def __init__(self, seconds_between_commands: float = 2.0):
+        self.seconds_between_commands = seconds_between_commands
+        # How each room looked at the start: its items and their digest
+        self.baseline = None
+        self.digests = None
+        # Rooms the bot has reported, until their report has been checked
+        self.reported = set()
+        # Reports waiting to be sent, as (room index, anomaly name)
+        self.queue = []
+        # The camera that was showing, and the one that should come up next if nothing is skipped
+        self.shown = None
+        self.expected = None
+
+    def snapshot(self, game: Duty.GameManager):
+        """
+        Remember how every room looks before anything has changed.
+        The rooms' item lists are never changed by anomalies, so they are kept as they are rather than copied.
+        """
+        self.baseline = [room.items for room in game.get_rooms()]
+        self.digests = [room.digest for room in game.get_rooms()]
+
+    def queue_report(self, game: Duty.GameManager, room_index: int, anomaly: str):
+        if room_index in self.reported or anomaly not in game.anomalies:
+            return
+        self.reported.add(room_index)
+        self.queue.append((room_index, anomaly))
+
+    def look(self, game: Duty.GameManager):
+        """
+        Look at the current camera and queue a report for anything that changed.
+        """
+        # Reports that have been checked can be made again, in case the last one was wrong
+        self.reported = {i for i in self.reported if game.report_pending(i) or any(i == queued for queued, _ in self.queue)}
+
+        n_rooms = len(self.baseline)
+        index, shown = game.camera_view()
+
+        # Cameras that were skipped on the way here are broken, and if every camera is offline they all are
+        if self.expected is not None:
+            n_skipped = n_rooms if index == -1 else (index - self.expected) % n_rooms
+            for step in range(n_skipped):
+                self.queue_report(game, (self.expected + step) % n_rooms, "CAMERA MALFUNCTION")
+
+        self.shown = index
+        if index == -1:
+            return
+
+        if index in self.reported or game.room_digest(index) == self.digests[index]:
+            return
+        anomaly = classify(self.baseline[index], shown)
+        if anomaly is not None:
+            self.queue_report(game, index, anomaly)
+
+    def __call__(self, game: Duty.GameManager) -> tuple[float, str]:
+        if self.baseline is None:
+            self.snapshot(game)
+
+        self.look(game)
+        if self.queue:
+            # Reporting doesn't move the camera
+            self.expected = None if self.shown == -1 else self.shown
+            room_index, anomaly = self.queue.pop(0)
+            return self.seconds_between_commands, f"report {room_index+1} {game.anomalies.index(anomaly)+1}"
+
+        self.expected = None if self.shown == -1 else (self.shown + 1) % len(self.baseline)
+        return self.seconds_between_commands, "next"
+
+def main():
+    parser = argparse.ArgumentParser(description="Let the detector bot play some shifts and show how it did.")
+    parser.add_argument("--shifts", type=int, default=100)
+    parser.add_argument("--seconds-between-commands", type=float, default=2.0)
+    parser.add_argument("--rooms", default=None, help="room file, defaults to the default rooms")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    settings = {"timescale": 60, "probability": 0.1, "min_seconds_between_anomalies": 10*60}
+    results = []
+    for shift in range(args.shifts):
+        seed = None if args.seed is None else args.seed + shift
+        player = DetectorBot(args.seconds_between_commands)
+        results.append(Simulation.HeadlessShift(settings=settings, room_file=args.rooms, seed=seed).run(player))
+
+    found = sum(result["found_anomalies"] for result in results)
+    total = sum(result["total_anomalies"] for result in results)
+    lost = sum(result["reason"] == "anomalies" for result in results)
+    print(f"Shifts:        {len(results)}")
+    print(f"Lost:          {lost} ({lost/len(results):.2%})")
+    print(f"Found / total: {found} / {total} ({found/max(total, 1):.2%})")
+
+if __name__ == "__main__":
+    main()
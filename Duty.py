@@ -0,0 +1 @@
+Functions.py
\ No newline at end of file
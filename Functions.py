@@ -11,38 +11,794 @@ You may read through it if you are curious, but do not rely on it to complete th
 Do **NOT** make ANY modifications to this file.
 '''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''
 
-from datetime import datetime
 import time
 import random
+import math
+import heapq
 import os
+import sys
+import io
+import shutil
+import json
+import bisect
+import atexit
+import functools
+import operator
 from warnings import warn
-from typing import Union
+from typing import Union, Callable
+from contextlib import contextmanager
+from collections.abc import Sequence
+from itertools import chain, islice
+from array import array
+
+# Anomalies can only appear on these in-game second boundaries
+SECONDS_BETWEEN_CHECKS = 60
+
+# How many times to try creating an anomaly before giving up, in case the spawner keeps failing
+SPAWN_ATTEMPTS = 100
+
+# Room digests are worked out modulo this prime, so they fit in 64 bits (see items_digest())
+DIGEST_MODULUS = 2**61 - 1
+DIGEST_BASE = 1_000_003
+# DIGEST_BASE to the power of each index, worked out as far as the longest room so far
+DIGEST_POWERS = [1]
+# The digest of a room with every item hidden (see change_digest()). Digests are always less than DIGEST_MODULUS,
+# so no list of items can have this digest.
+HIDDEN_DIGEST = DIGEST_MODULUS
+
+def digest_powers(n: int) -> list[int]:
+    """
+    Return DIGEST_POWERS with at least n powers in it.
+    """
+    while len(DIGEST_POWERS) < n:
+        DIGEST_POWERS.append(DIGEST_POWERS[-1] * DIGEST_BASE % DIGEST_MODULUS)
+    return DIGEST_POWERS
+
+def item_hash(item: str) -> int:
+    """
+    Return the hash of one item for a digest. hash() never returns -1, so this is never 0 and every item,
+    even an empty one, adds something to the digest.
+    """
+    return hash(item) + 1
+
+def items_digest(items) -> int:
+    """
+    Return a digest of the items in order: the sum of each item's hash (see item_hash()) times DIGEST_BASE to the power of its index.
+    Because each item's part only depends on its own index, a change to one or two items can be applied to a digest
+    without going over the rest of them (see change_digest()). Item hashes come from hash(), so digests are only
+    comparable within one run of the game.
+    """
+    powers = digest_powers(len(items))
+    return sum(map(operator.mul, map(item_hash, items), powers)) % DIGEST_MODULUS
+
+def change_digest(items: list[str], digest: int, change: tuple) -> int:
+    """
+    Return the digest of the items with the change (see ItemView) applied, given the items' digest.
+    Replacing, swapping and hiding items take the same time however many items there are; a missing item only
+    goes over the items after it, and a full list of items is worked out from scratch.
+    Return None if the change doesn't fit the items, e.g. an index past the end.
+    """
+    kind = change[0]
+    if kind == "hide":
+        return HIDDEN_DIGEST
+    elif kind == "items":
+        return items_digest(change[1])
+
+    powers = digest_powers(len(items))
+    if kind == "replace":
+        index = change[1]
+        if not 0 <= index < len(items):
+            return None
+        return (digest + (item_hash(change[2]) - item_hash(items[index])) * powers[index]) % DIGEST_MODULUS
+    elif kind == "swap":
+        a, b = change[1], change[2]
+        if not (0 <= a < len(items) and 0 <= b < len(items)):
+            return None
+        return (digest + (item_hash(items[b]) - item_hash(items[a])) * (powers[a] - powers[b])) % DIGEST_MODULUS
+    elif kind == "remove":
+        index = change[1]
+        if not 0 <= index < len(items):
+            return None
+        # Everything after the missing item moves down one place: take it away, then add it back one power lower
+        after = sum(map(operator.mul, map(item_hash, islice(items, index + 1, None)), islice(powers, index + 1, None)))
+        lowered = sum(map(operator.mul, map(item_hash, islice(items, index + 1, None)), islice(powers, index, None)))
+        return (digest - item_hash(items[index]) * powers[index] - after + lowered) % DIGEST_MODULUS
+    raise ValueError(f"Unknown change {change}.")
+
+class ItemView(Sequence):
+    """
+    A read-only view of a room's items with an anomaly's change applied, without copying the items.
+
+    The change is one of:
+        None: the items as they are
+        ("remove", index): the item at index is missing
+        ("swap", a, b): the items at a and b have swapped places
+        ("replace", index, item): the item at index is shown as a different string
+        ("hide",): no items are shown, e.g. a camera malfunction
+        ("items", items): a whole new list of items, for anomalies added with a full list
+    """
+    __slots__ = ("items", "change")
+
+    def __init__(self, items: list[str], change: tuple = None):
+        self.items = items
+        self.change = change
+
+    def __len__(self) -> int:
+        if self.change is None:
+            return len(self.items)
+        kind = self.change[0]
+        if kind == "remove":
+            return len(self.items) - 1
+        elif kind == "hide":
+            return 0
+        elif kind == "items":
+            return len(self.change[1])
+        return len(self.items)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("item index out of range")
+
+        if self.change is None:
+            return self.items[index]
+        kind = self.change[0]
+        if kind == "remove":
+            return self.items[index + 1 if index >= self.change[1] else index]
+        elif kind == "swap":
+            if index == self.change[1]:
+                return self.items[self.change[2]]
+            if index == self.change[2]:
+                return self.items[self.change[1]]
+            return self.items[index]
+        elif kind == "replace":
+            return self.change[2] if index == self.change[1] else self.items[index]
+        else:
+            return self.change[1][index]
+
+    def __iter__(self):
+        if self.change is None:
+            return iter(self.items)
+        kind = self.change[0]
+        if kind == "remove":
+            return chain(islice(self.items, self.change[1]), islice(self.items, self.change[1] + 1, None))
+        elif kind == "hide":
+            return iter(())
+        elif kind == "items":
+            return iter(self.change[1])
+        return (self[i] for i in range(len(self)))
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Sequence) or isinstance(other, str):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __repr__(self) -> str:
+        return repr(list(self))
 
 class Room:
+    # Rooms only ever have these fields, so store them in slots instead of a dictionary per room
+    __slots__ = ("name", "items", "anomaly", "anomaly_change", "anomaly_time", "digest", "anomaly_digest")
+
     def __init__(self, name: str, items: list[str]):
         self.name = name
         self.items = items
         self.anomaly = ""
-        self.anomaly_items = []
+        # How the anomaly changes the items, see ItemView
+        self.anomaly_change = None
+        # The in-game time the anomaly appeared
+        self.anomaly_time = None
+        # Digests (see items_digest()) of the items, and of the items as the anomaly shows them (None without an anomaly)
+        self.digest = items_digest(items)
+        self.anomaly_digest = None
 
     def get_anomaly(self) -> str:
         return self.anomaly
 
+    @property
+    def anomaly_items(self) -> Sequence:
+        """
+        The items as they look with the anomaly, as a read-only view.
+        """
+        if not self.anomaly:
+            return []
+        return ItemView(self.items, self.anomaly_change)
+
     def add_anomaly(self, name: str, items: list[str]) -> bool:
-        # Compare the items in the room to the items in the anomaly
-        # If the incoming item sequence is the same, don't add the anomaly
-        if self.items == items:
+        return self.add_anomaly_change(name, ("items", items))
+
+    def add_anomaly_change(self, name: str, change: tuple) -> bool:
+        # If the change leaves the items looking the same, don't add the anomaly.
+        # A different digest means the items definitely look different; only the same digest has to be checked properly.
+        digest = change_digest(self.items, self.digest, change)
+        if digest is None or (digest == self.digest and not self.changes_items(change)):
             return False
 
         self.anomaly = name.upper()
-        self.anomaly_items = items
+        self.anomaly_change = change
+        self.anomaly_digest = digest
         return True
+
+    def changes_items(self, change: tuple) -> bool:
+        """
+        Return whether the change (see ItemView) would make the items look different.
+        Only a full list of items has to be compared item by item.
+        """
+        kind = change[0]
+        if kind == "remove":
+            return 0 <= change[1] < len(self.items)
+        elif kind == "swap":
+            a, b = change[1], change[2]
+            return 0 <= a < len(self.items) and 0 <= b < len(self.items) and self.items[a] != self.items[b]
+        elif kind == "replace":
+            return 0 <= change[1] < len(self.items) and self.items[change[1]] != change[2]
+        elif kind == "hide":
+            return len(self.items) > 0
+        else:
+            return self.items != change[1]
+
+    def clear_anomaly(self):
+        self.anomaly = ""
+        self.anomaly_change = None
+        self.anomaly_time = None
+        self.anomaly_digest = None
+
+    def visible_digest(self) -> int:
+        """
+        Return the digest of the items as the camera shows them, with the anomaly if there is one.
+        Two calls return the same digest if and only if (barring a one in 2**61 chance) the room looks the same.
+        """
+        return self.digest if self.anomaly_digest is None else self.anomaly_digest
+
+    def camera_working(self) -> bool:
+        return "CAMERA MALFUNCTION" not in self.anomaly
+
+class TableRoom(Room):
+    """
+    A Room whose fields live in a RoomTable. It behaves exactly like a Room,
+    but is only a handle (the table and a position) that is made when a room is looked up.
+    """
+    __slots__ = ("table", "index")
+
+    def __init__(self, table: "RoomTable", index: int):
+        self.table = table
+        self.index = index
+
+    @property
+    def name(self) -> str:
+        return self.table.names[self.index]
+
+    @property
+    def items(self) -> list[str]:
+        return self.table.items[self.index]
+
+    @property
+    def anomaly(self) -> str:
+        return self.table.anomaly_names[self.table.anomaly_ids[self.index]]
+
+    @anomaly.setter
+    def anomaly(self, name: str):
+        self.table.anomaly_ids[self.index] = self.table.anomaly_id(name)
+
+    @property
+    def anomaly_change(self) -> tuple:
+        return self.table.changes.get(self.index)
+
+    @anomaly_change.setter
+    def anomaly_change(self, change: tuple):
+        if change is None:
+            self.table.changes.pop(self.index, None)
+        else:
+            self.table.changes[self.index] = change
+
+    @property
+    def anomaly_time(self) -> int:
+        seconds = self.table.anomaly_times[self.index]
+        return None if seconds < 0 else seconds
+
+    @anomaly_time.setter
+    def anomaly_time(self, seconds: int):
+        self.table.anomaly_times[self.index] = -1 if seconds is None else seconds
+
+    @property
+    def digest(self) -> int:
+        digest = self.table.digests[self.index]
+        if digest < 0:
+            # Tables restored from a snapshot (see Snapshot.py) work each digest out the first time it's needed
+            digest = self.table.digests[self.index] = items_digest(self.items)
+        return digest
+
+    @property
+    def anomaly_digest(self) -> int:
+        return self.table.anomaly_digests.get(self.index)
+
+    @anomaly_digest.setter
+    def anomaly_digest(self, digest: int):
+        if digest is None:
+            self.table.anomaly_digests.pop(self.index, None)
+        else:
+            self.table.anomaly_digests[self.index] = digest
+
+class RoomTable(Sequence):
+    """
+    Every room's fields stored in parallel arrays indexed by room position, instead of one Room object per room.
+    Used by GameManager(compact=True) for very large floor plans.
+
+    It can be used in place of the list of rooms: indexing it returns a TableRoom, which acts like a Room.
+    Anomaly names are stored as small numbers, and only rooms that have an anomaly store a change.
+    """
+    def __init__(self):
+        self.names = []
+        self.items = []
+        # Position of each room's anomaly in anomaly_names, where 0 means no anomaly
+        self.anomaly_ids = array("H")
+        # In-game time each room's anomaly appeared, or -1 for none
+        self.anomaly_times = array("q")
+        # Room position to change (see ItemView), only for rooms with an anomaly
+        self.changes = {}
+        # Digest of each room's items (-1 until it has been worked out), and room position to the anomaly's digest for rooms with an anomaly
+        self.digests = array("q")
+        self.anomaly_digests = {}
+
+        self.anomaly_names = [""]
+        self.anomaly_name_ids = {"": 0}
+
+    def anomaly_id(self, name: str) -> int:
+        """
+        Return the number stored for an anomaly name, giving it a new one the first time it is seen.
+        """
+        if name not in self.anomaly_name_ids:
+            self.anomaly_name_ids[name] = len(self.anomaly_names)
+            self.anomaly_names.append(name)
+        return self.anomaly_name_ids[name]
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [TableRoom(self, i) for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("room index out of range")
+        return TableRoom(self, index)
+
+    def append(self, room: Room):
+        self.names.append(room.name)
+        self.items.append(room.items)
+        self.anomaly_ids.append(self.anomaly_id(room.anomaly))
+        self.anomaly_times.append(-1 if room.anomaly_time is None else room.anomaly_time)
+        self.digests.append(room.digest)
+        if room.anomaly_change is not None:
+            self.changes[len(self.names) - 1] = room.anomaly_change
+        if room.anomaly_digest is not None:
+            self.anomaly_digests[len(self.names) - 1] = room.anomaly_digest
+
+    def extend(self, rooms: list[Room]):
+        """
+        Append many rooms at once, growing each array once instead of once per room.
+        """
+        first = len(self.names)
+        self.names.extend(room.name for room in rooms)
+        self.items.extend(room.items for room in rooms)
+        self.anomaly_ids.extend(self.anomaly_id(room.anomaly) for room in rooms)
+        self.anomaly_times.extend(-1 if room.anomaly_time is None else room.anomaly_time for room in rooms)
+        self.digests.extend(room.digest for room in rooms)
+        for i, room in enumerate(rooms):
+            if room.anomaly_change is not None:
+                self.changes[first + i] = room.anomaly_change
+            if room.anomaly_digest is not None:
+                self.anomaly_digests[first + i] = room.anomaly_digest
+
+    def pop(self, index: int = -1) -> Room:
+        """
+        Remove the room at index and return it as a plain Room.
+        Rooms after it shift down by one position, the same as list.pop().
+        """
+        if index < 0:
+            index += len(self)
+        room = Room(self.names[index], self.items[index])
+        room.anomaly = self.anomaly_names[self.anomaly_ids[index]]
+        room.anomaly_change = self.changes.get(index)
+        room.anomaly_time = None if self.anomaly_times[index] < 0 else self.anomaly_times[index]
+        room.anomaly_digest = self.anomaly_digests.get(index)
+
+        del self.names[index]
+        del self.items[index]
+        del self.anomaly_ids[index]
+        del self.anomaly_times[index]
+        del self.digests[index]
+        self.changes = {(i - 1 if i > index else i): change for i, change in self.changes.items() if i != index}
+        self.anomaly_digests = {(i - 1 if i > index else i): digest for i, digest in self.anomaly_digests.items() if i != index}
+        return room
     
-class GameManager:
+class VirtualClock:
+    """
+    A clock that only moves when told to, used to run the game without waiting in real time.
+    Pass clock.now to a GameManager to drive it from this clock.
+    """
+    def __init__(self, start: float = 0.0):
+        self.seconds = start
+
+    def now(self) -> float:
+        return self.seconds
+
+    def advance(self, seconds: float):
+        self.seconds += seconds
+
+class Scheduler:
+    """
+    A timeline of future events ordered by in-game time, stored as a heap.
+    Each event has a kind (e.g. "spawn", "report" or "end") and an optional payload.
+    """
     def __init__(self):
-        self.rooms = []
+        self.events = []
+        # Breaks ties so events at the same time come out in the order they were scheduled
+        self.count = 0
+
+    def schedule(self, when: int, kind: str, payload=None):
+        heapq.heappush(self.events, (when, self.count, kind, payload))
+        self.count += 1
+
+    def next_time(self):
+        """
+        Return the time of the next event, or None if there are no events.
+        """
+        if len(self.events) == 0:
+            return None
+        return self.events[0][0]
+
+    def pop_due(self, now: int):
+        """
+        Remove and return the next event as (time, kind, payload) if it is due by now, otherwise None.
+        """
+        if len(self.events) == 0 or self.events[0][0] > now:
+            return None
+        when, _, kind, payload = heapq.heappop(self.events)
+        return when, kind, payload
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+class Renderer:
+    """
+    Collects everything the game prints for one screen (a frame) and writes it out all at once.
+
+    clear() starts a new frame instead of clearing the screen straight away, and flush() writes the frame
+    in a single write, clearing the screen with ANSI escape codes rather than running the clear command.
+    With diff set, a frame that started with clear() only redraws the lines that changed since the last frame.
+    """
+    CLEAR_SCREEN = "\033[2J\033[H"
+
+    def __init__(self, output = None, diff: bool = False):
+        # Where to write to, if not the terminal (any object with a write() method)
+        self.output = output
+        self.diff = diff
+        self.buffer = io.StringIO()
+        # Whether the frame being built started with clear()
+        self.cleared = False
+        # The lines of the last frame, if the screen is known to still show them
+        self.previous = None
+        self.escapes_enabled = False
+
+    def write(self, text: str):
+        self.buffer.write(text)
+
+    def clear(self):
+        """
+        Throw away anything not yet written and start a new frame on a blank screen.
+        """
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        self.cleared = True
+
+    def flush(self):
+        """
+        Write the frame built since the last flush, if there is one.
+        """
+        text = self.buffer.getvalue()
+        if not text and not self.cleared:
+            return
+        self.buffer.seek(0)
+        self.buffer.truncate()
+
+        output = self.output
+        if output is None:
+            output = sys.stdout
+            if os.name == "nt" and not self.escapes_enabled:
+                # Running any command once turns on escape codes in the Windows console
+                os.system("")
+                self.escapes_enabled = True
+
+        if not self.cleared:
+            # Added on below whatever is already on the screen, so the next frame can't be diffed
+            self.previous = None
+            output.write(text)
+        else:
+            lines = text.split("\n")
+            if self.diff and self.previous is not None and self.fits(lines):
+                output.write(self.changed_lines(lines))
+            else:
+                output.write(self.CLEAR_SCREEN + text)
+
+            # Whatever the player types goes on the last line, so that line always has to be redrawn
+            self.previous = lines[:-1] + [None] if self.diff else None
+            self.cleared = False
+
+        if hasattr(output, "flush"):
+            output.flush()
+
+    def fits(self, lines: list[str]) -> bool:
+        """
+        Return whether the frame fits on the terminal without scrolling or wrapping,
+        which diffing needs so each line stays on the same row.
+        """
+        columns, rows = shutil.get_terminal_size()
+        return len(lines) < rows and all(len(line) < columns for line in lines)
+
+    def changed_lines(self, lines: list[str]) -> str:
+        """
+        Return the escape codes and text that turn the last frame into this one.
+        Each changed line is redrawn in place, then everything below the frame is cleared.
+        """
+        parts = []
+        for i, line in enumerate(lines):
+            if i >= len(self.previous) or self.previous[i] != line:
+                parts.append(f"\033[{i+1};1H{line}\033[K")
+        parts.append(f"\033[{len(lines)};{len(lines[-1])+1}H\033[J")
+        return "".join(parts)
+
+class Metrics:
+    """
+    Timing histograms and counters for the game, turned on with enable_metrics().
+
+    Histograms count how long something took in buckets (in seconds, like Prometheus), and counters count how
+    often something happened. Either can have labels, e.g. {"command": "next"}.
+    If a dump file is given the metrics are written to it at most every dump_seconds, and when the program exits,
+    as JSON if the file name ends in .json and in the Prometheus text format otherwise.
+    """
+    BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+    def __init__(self, dump_file: str = None, dump_seconds: float = 60.0):
+        # (name, labels) to [count in each bucket (the last one for anything slower), total seconds, count]
+        self.histograms = {}
+        # (name, labels) to count
+        self.counters = {}
+        self.dump_file = dump_file
+        self.dump_seconds = dump_seconds
+        self.next_dump = time.monotonic() + dump_seconds
+        # Total seconds spent waiting for the player to type (see GameManager.ask())
+        self.waiting_seconds = 0.0
+
+    def observe(self, name: str, seconds: float, labels: tuple = ()):
+        """
+        Add one timing in seconds to a histogram. labels is a tuple of (label, value) pairs.
+        """
+        histogram = self.histograms.get((name, labels))
+        if histogram is None:
+            histogram = [[0] * (len(self.BUCKETS) + 1), 0.0, 0]
+            self.histograms[(name, labels)] = histogram
+        histogram[0][bisect.bisect_left(self.BUCKETS, seconds)] += 1
+        histogram[1] += seconds
+        histogram[2] += 1
+        self.dump_if_due()
+
+    def count(self, name: str, amount: int = 1, labels: tuple = ()):
+        self.counters[(name, labels)] = self.counters.get((name, labels), 0) + amount
+
+    def dump_if_due(self):
+        # Checked whenever something is timed, so the file is only ever written between game steps
+        if self.dump_file is not None and time.monotonic() >= self.next_dump:
+            self.dump()
+
+    def to_dict(self) -> dict:
+        histograms = []
+        for (name, labels), (buckets, total, count) in self.histograms.items():
+            cumulative = 0
+            bounds = []
+            for bound, bucket_count in zip(self.BUCKETS + (float("inf"),), buckets):
+                cumulative += bucket_count
+                bounds.append([bound if bound != float("inf") else "+Inf", cumulative])
+            histograms.append({"name": name, "labels": dict(labels), "buckets": bounds, "sum": total, "count": count})
+        counters = [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in self.counters.items()]
+        return {"histograms": histograms, "counters": counters}
+
+    def to_prometheus(self) -> str:
+        """
+        Return the metrics in the Prometheus text exposition format, with every name starting with duty_.
+        """
+        def label_text(labels: dict) -> str:
+            if not labels:
+                return ""
+            return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+        metrics = self.to_dict()
+        lines = []
+        typed = set()
+        for histogram in metrics["histograms"]:
+            name = f"duty_{histogram['name']}_seconds"
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            for bound, count in histogram["buckets"]:
+                lines.append(f"{name}_bucket{label_text({**histogram['labels'], 'le': bound})} {count}")
+            lines.append(f"{name}_sum{label_text(histogram['labels'])} {histogram['sum']}")
+            lines.append(f"{name}_count{label_text(histogram['labels'])} {histogram['count']}")
+        for counter in metrics["counters"]:
+            name = f"duty_{counter['name']}_total"
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{label_text(counter['labels'])} {counter['value']}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, file_name: str = None):
+        """
+        Write the metrics to file_name (default the dump file), replacing the file in one step so a scraper never reads half of it.
+        """
+        if file_name is None:
+            file_name = self.dump_file
+        self.next_dump = time.monotonic() + self.dump_seconds
+
+        if file_name.endswith(".json"):
+            text = json.dumps(self.to_dict(), indent=2)
+        else:
+            text = self.to_prometheus()
+        temporary_name = f"{file_name}.{os.getpid()}.tmp"
+        with open(temporary_name, "w") as file:
+            file.write(text)
+        os.replace(temporary_name, file_name)
+
+class CameraIndex:
+    """
+    Which cameras are working, stored as a Fenwick tree (binary indexed tree) over 1 for working and 0 for broken.
+    Finding the next or previous working camera, and marking a camera broken or fixed, all take O(log n),
+    so moving between cameras stays fast however many of them are broken.
+    """
+    def __init__(self, working=()):
+        self.working = bytearray(1 if camera_working else 0 for camera_working in working)
+        self.count = sum(self.working)
+
+        # tree[i] (counting from 1) holds the number of working cameras in the i & -i cameras ending at camera i.
+        # Built in one pass by passing each total up to the next entry that covers it.
+        self.tree = [0] + list(self.working)
+        for i in range(1, len(self.tree)):
+            parent = i + (i & -i)
+            if parent < len(self.tree):
+                self.tree[parent] += self.tree[i]
+
+    def __len__(self) -> int:
+        return len(self.working)
+
+    def append(self, camera_working: bool):
+        value = 1 if camera_working else 0
+        self.working.append(value)
+        self.count += value
+        n = len(self.working)
+        self.tree.append(self.prefix(n - 1) - self.prefix(n - (n & -n)) + value)
+
+    def extend(self, working):
+        """
+        Add many cameras at once, rebuilding the tree in one pass instead of appending them one by one.
+        """
+        rebuilt = CameraIndex(chain(self.working, working))
+        self.working, self.count, self.tree = rebuilt.working, rebuilt.count, rebuilt.tree
+
+    def set(self, index: int, camera_working: bool):
+        value = 1 if camera_working else 0
+        change = value - self.working[index]
+        if change == 0:
+            return
+        self.working[index] = value
+        self.count += change
+
+        i = index + 1
+        while i < len(self.tree):
+            self.tree[i] += change
+            i += i & -i
+
+    def prefix(self, n: int) -> int:
+        """
+        Return the number of working cameras among the first n.
+        """
+        total = 0
+        while n > 0:
+            total += self.tree[n]
+            n -= n & -n
+        return total
+
+    def find(self, k: int) -> int:
+        """
+        Return the index of the working camera with k working cameras before it.
+        """
+        position = 0
+        step = 1 << (len(self.working).bit_length() - 1)
+        while step > 0:
+            if position + step < len(self.tree) and self.tree[position + step] <= k:
+                position += step
+                k -= self.tree[position]
+            step //= 2
+        return position
+
+    def next_working(self, index: int, reverse: bool = False) -> int:
+        """
+        Return the index of the first working camera after index (or before it, if reverse), looping around.
+        Return -1 if every camera is broken.
+        """
+        if self.count == 0:
+            return -1
+        if reverse:
+            before = self.prefix(index)
+            return self.find(before - 1 if before > 0 else self.count - 1)
+        up_to = self.prefix(index + 1)
+        return self.find(up_to if up_to < self.count else 0)
+
+class GameManager:
+    def __init__(self, clock: Callable[[], float] = None, headless: bool = False, output = None, compact: bool = False, seed: int = None):
+        # The clock returns the current real-world time in seconds.
+        # It can be swapped for a VirtualClock to simulate a shift without waiting.
+        self.clock = clock if clock is not None else time.monotonic
+        # Headless games never print or clear the screen
+        self.headless = headless
+        # Where to print to, if not the terminal (any object with a write() method)
+        self.output = output
+        # Everything printed is collected here and written one screen at a time, see flush()
+        self.renderer = Renderer(output)
+
+        # All of the game's randomness comes from its own generator, so the same seed and commands
+        # always play out the same way. A seed is picked if none is given, so every shift can be replayed.
+        self.seed = seed if seed is not None else random.randrange(2**63)
+        self.random = random.Random(self.seed)
+        # When set, every command and tick is written to this log so the shift can be replayed (see Replay.py)
+        self.recorder = None
+        # When set, called after every tick so the game can be saved in the background (see Snapshot.Checkpointer)
+        self.checkpoint = None
+        # Whether the end of the shift and the first anomaly have been scheduled, see start_timeline()
+        self.timeline_started = False
+
+        # Compact games keep the rooms in parallel arrays instead of one object per room, see RoomTable
+        self.rooms = RoomTable() if compact else []
         self.anomalies = []
 
+        # Registered anomaly names as a set for quick checks, and the generator for each anomaly
+        # that has one, stored as (generator, applies) where applies says which rooms it can be used in
+        self.anomaly_names = set()
+        self.generators = {}
+
+        # Maps each room name to its position in self.rooms so lookups don't scan the list
+        self.room_index = {}
+        # Goes up whenever rooms are added or removed, so anything worked out from the rooms knows when to redo it
+        self.layout_version = 0
+
+        # Reports that are still being checked, each with the in-game time it will be finished,
+        # and the results of finished reports that haven't been shown to the player yet
+        self.pending_reports = []
+        self.report_messages = []
+
+        # Future events: anomaly spawns, finished reports and the end of the shift
+        self.scheduler = Scheduler()
+        # When set, anomalies are created by the game itself at the right time, see set_spawner()
+        self.spawner = None
+        # Increases whenever the next spawn is rescheduled, so the old spawn event can be ignored when it comes up
+        self.spawn_generation = 0
+
+        # Indices of rooms without an anomaly, stored so a random one can be picked in O(1).
+        # free_room_positions maps a room index to where it sits in free_rooms, which lets us
+        # remove from the middle by swapping with the last element.
+        self.free_rooms = []
+        self.free_room_positions = {}
+        # Indices of rooms with an anomaly, the rest of the rooms
+        self.changed_rooms = set()
+
+        # Which rooms have a working camera, so broken cameras can be skipped without checking every room
+        self.working_cameras = CameraIndex()
+
         self.data = {
             "camera": 0,
             "time": 0,
@@ -59,7 +815,8 @@ class GameManager:
             "max_anomalies": 4.0,
             "anomaly_report_time": 5.0,
             "max_seconds": 60*60*5.0,
-            "min_seconds_between_anomalies": 20*60.0 # **in-game** seconds
+            "min_seconds_between_anomalies": 20*60.0, # **in-game** seconds
+            "diff_frames": False # Only redraw the lines of the screen that changed (terminals only)
         }
 
         self.gameover = {
@@ -73,16 +830,136 @@ class GameManager:
             warn("Tried to add a room that already exists.")
             return False
         else:
-            self.rooms.append(Room(name.upper(), items))
+            self.room_index[name.upper()] = len(self.rooms)
+            self.mark_room_free(len(self.rooms))
+            # The same item names come up in many rooms (e.g. "Oak Wooden Chair"), so intern them
+            # to keep only one copy of each string no matter how many rooms use it
+            self.rooms.append(Room(name.upper(), [sys.intern(item) for item in items]))
+            self.working_cameras.append(True)
+            self.layout_version += 1
             return True
 
+    def add_rooms_bulk(self, rooms) -> int:
+        """
+        Add many rooms at once from an iterable of (room name, items), e.g. from RoomFile.load_rooms().
+        The whole batch is checked first in one pass: rooms that already exist, or that come up twice in
+        the batch, are skipped with a single warning listing them. Then every new room is added in one step.
+
+        Return the number of rooms that were added.
+        """
+        new_rooms = []
+        new_names = set()
+        duplicates = []
+        for name, items in rooms:
+            name = name.upper()
+            if name in self.room_index or name in new_names:
+                duplicates.append(name)
+                continue
+            new_names.add(name)
+            new_rooms.append(Room(name, list(map(sys.intern, items))))
+
+        if len(duplicates) > 0:
+            shown = ", ".join(duplicates[:5]) + (", ..." if len(duplicates) > 5 else "")
+            warn(f"Tried to add {len(duplicates)} rooms that already exist: {shown}")
+
+        # Every new room starts without an anomaly, so they all go on the end of the free pool
+        first = len(self.rooms)
+        last = first + len(new_rooms)
+        self.rooms.extend(new_rooms)
+        self.room_index.update(zip((room.name for room in new_rooms), range(first, last)))
+        self.free_room_positions.update(zip(range(first, last), range(len(self.free_rooms), len(self.free_rooms) + len(new_rooms))))
+        self.free_rooms.extend(range(first, last))
+        self.working_cameras.extend([True] * len(new_rooms))
+        self.layout_version += 1
+        return len(new_rooms)
+
+    def remove_room(self, name: str) -> bool:
+        """
+        Remove a room from the game, keeping the room index consistent.
+        Rooms after the removed one shift down by one position.
+
+        Return True if the room was removed, False if it did not exist.
+        """
+        name = name.upper()
+        if not self.room_exists(name):
+            warn(f"Room {name} not found.")
+            return False
+
+        index = self.room_index[name]
+        room = self.rooms.pop(index)
+        if room.get_anomaly():
+            self.set_data("active_anomalies", self.get_data("active_anomalies") - 1)
+
+        # Keep the current camera pointing at the same room where possible
+        if self.get_data("camera") > index or self.get_data("camera") >= len(self.rooms):
+            self.set_data("camera", max(0, self.get_data("camera") - 1))
+
+        self.layout_version += 1
+        self.reindex_rooms()
+        return True
+
+    def reindex_rooms(self):
+        """
+        Rebuild every lookup structure derived from self.rooms.
+        Only needed when rooms are removed or reordered; adding rooms keeps them up to date.
+        """
+        self.room_index = {room.name: i for i, room in enumerate(self.rooms)}
+
+        self.free_rooms = []
+        self.free_room_positions = {}
+        self.changed_rooms = set()
+        for i, room in enumerate(self.rooms):
+            if not room.get_anomaly():
+                self.mark_room_free(i)
+            else:
+                self.changed_rooms.add(i)
+
+        self.working_cameras = CameraIndex(room.camera_working() for room in self.rooms)
+
+    def mark_room_free(self, index: int):
+        """
+        Add the room at index to the pool of rooms without anomalies.
+        """
+        if index in self.free_room_positions:
+            return
+        self.free_room_positions[index] = len(self.free_rooms)
+        self.free_rooms.append(index)
+        self.changed_rooms.discard(index)
+
+    def mark_room_changed(self, index: int):
+        """
+        Remove the room at index from the pool of rooms without anomalies.
+        The last room in the pool takes its place so nothing has to shift.
+        """
+        if index not in self.free_room_positions:
+            return
+        self.changed_rooms.add(index)
+        position = self.free_room_positions.pop(index)
+        last = self.free_rooms.pop()
+        if last != index:
+            self.free_rooms[position] = last
+            self.free_room_positions[last] = position
+
+    def count_unchanged_rooms(self) -> int:
+        """
+        Return the number of rooms without an anomaly.
+        """
+        return len(self.free_rooms)
+
+    def get_random_unchanged_room(self) -> Room:
+        """
+        Return a random room without an anomaly, or None if every room has one.
+        """
+        if len(self.free_rooms) == 0:
+            return None
+        return self.rooms[self.random.choice(self.free_rooms)]
+
     def get_room(self, room: Union[int, str]) -> Room:
         if isinstance(room, int):
             return self.rooms[room]
         elif isinstance(room, str):
-            for room_obj in self.rooms:
-                if room_obj.name == room:
-                    return room_obj
+            if room in self.room_index:
+                return self.rooms[self.room_index[room]]
             warn(f"Room {room} not found.")
             return None
         else:
@@ -90,12 +967,19 @@ class GameManager:
     
     def get_rooms(self) -> list[Room]:
         return self.rooms
+
+    def room_digest(self, room: Union[int, str]) -> int:
+        """
+        Return the digest of the room as the camera shows it (see Room.visible_digest()), or None if there is no such room.
+        Compare it to an earlier digest to tell whether the room has changed without looking at its items.
+        """
+        room = self.get_room(room)
+        if room is None:
+            return None
+        return room.visible_digest()
     
     def room_exists(self, name: str) -> bool:
-        for room in self.rooms:
-            if room.name == name:
-                return True
-        return False
+        return name in self.room_index
 
     def get_data(self, key: str):
         if key in self.data:
@@ -132,6 +1016,13 @@ class GameManager:
                 
         self.settings[setting] = value
 
+    def set_settings(self, settings: dict):
+        """
+        Set many settings at once, converting each value the same way as set_setting().
+        """
+        for setting, value in settings.items():
+            self.set_setting(setting, value)
+
     def end_game(self, reason: str):
         """
         Stores that the game should quit for the provided reason.
@@ -156,24 +1047,131 @@ class GameManager:
         """
         # Create a "static" variable to store the previous timestamp within this function
         # This is because no other function needs to know about this variable
-        if not self.get_data("prev_tick"):
-            self.set_data("prev_tick", datetime.now())
+        if self.get_data("prev_tick") is None:
+            self.set_data("prev_tick", self.clock())
 
-        current_time = datetime.now()
-        time_delta = current_time - self.get_data("prev_tick")
+        current_time = self.clock()
+        seconds_passed = current_time - self.get_data("prev_tick")
         self.set_data("prev_tick", current_time)
-        seconds_passed = time_delta.total_seconds()
         scaled_seconds = int(seconds_passed * self.get_setting("timescale"))
 
-        new_time = self.get_data("time") + scaled_seconds
-        self.set_data("time", new_time)
-
-        # And update anomaly timers
-        self.set_data("seconds_since_last_anomaly_check", self.get_data("seconds_since_last_anomaly_check") + scaled_seconds)
-        self.set_data("seconds_since_last_anomaly", self.get_data("seconds_since_last_anomaly") + scaled_seconds)
+        self.advance_tick(scaled_seconds)
 
         return scaled_seconds
 
+    def advance_tick(self, seconds: int):
+        """
+        Move the game forward by one tick of the given number of in-game seconds, starting the timeline on the first tick.
+        tick_time() works out the seconds from the real-world clock; replays pass in the recorded ones.
+        """
+        if not self.timeline_started:
+            self.timeline_started = True
+            self.start_timeline()
+
+        self.advance_time(seconds)
+
+        if self.recorder is not None:
+            self.recorder.tick(self.get_data("time"))
+        if self.checkpoint is not None:
+            self.checkpoint()
+
+    def move_clock(self, seconds: int):
+        """
+        Move the in-game clock and the anomaly timers forward, without running any events.
+        """
+        self.set_data("time", self.get_data("time") + seconds)
+        self.set_data("seconds_since_last_anomaly_check", self.get_data("seconds_since_last_anomaly_check") + seconds)
+        self.set_data("seconds_since_last_anomaly", self.get_data("seconds_since_last_anomaly") + seconds)
+
+    def advance_time(self, seconds: int):
+        """
+        Move the in-game clock forward, running every event that falls in that time at the moment it happens.
+        Stops running events once the game has ended.
+        """
+        target = self.get_data("time") + seconds
+        while not self.should_end_game():
+            event = self.scheduler.pop_due(target)
+            if event is None:
+                break
+            when, kind, payload = event
+            self.move_clock(max(0, when - self.get_data("time")))
+            self.handle_event(kind, payload)
+
+        self.move_clock(target - self.get_data("time"))
+
+    def start_timeline(self):
+        """
+        Schedule the end of the shift and the first anomaly, when the clock first starts.
+        """
+        self.scheduler.schedule(math.ceil(self.get_setting("max_seconds")), "end")
+        self.schedule_spawn()
+
+    def handle_event(self, kind: str, payload):
+        if kind == "spawn":
+            # Spawns that were rescheduled since this event was added are out of date
+            if payload == self.spawn_generation:
+                self.spawn_scheduled_anomaly()
+        elif kind == "report":
+            self.resolve_report(payload)
+        elif kind == "end":
+            self.end_game("timeup")
+
+    def set_spawner(self, spawner: Callable[[], bool]):
+        """
+        Have the game create anomalies by itself at the moment they are due, by calling spawner().
+        The spawner is called with this game as the current game (see use_game()) and returns True if it created an anomaly.
+        Once set, number_of_anomalies_to_create() always returns 0.
+        """
+        self.spawner = spawner
+        if self.timeline_started:
+            self.schedule_spawn()
+
+    def schedule_spawn(self):
+        """
+        Work out when the next anomaly will appear and add it to the timeline, replacing any spawn already scheduled.
+
+        Anomalies can only appear on a check every SECONDS_BETWEEN_CHECKS in-game seconds, at least
+        min_seconds_between_anomalies after the last one, and each check succeeds with the anomaly probability.
+        Rather than scheduling every check, we jump straight to the one that succeeds.
+        Nothing is scheduled while spawning isn't possible; adding or fixing an anomaly schedules again.
+        """
+        self.spawn_generation += 1
+        if self.spawner is None:
+            return
+        if self.too_many_anomalies() or self.count_unchanged_rooms() == 0:
+            return
+        p = self.get_setting("probability")
+        if p <= 0:
+            return
+
+        now = self.get_data("time")
+        last_anomaly_time = now - self.get_data("seconds_since_last_anomaly")
+        earliest = max(now + 1, last_anomaly_time + self.get_setting("min_seconds_between_anomalies"))
+        first_check = math.ceil(earliest / SECONDS_BETWEEN_CHECKS) * SECONDS_BETWEEN_CHECKS
+        when = first_check + self.failed_checks_before_spawn(p) * SECONDS_BETWEEN_CHECKS
+
+        # No point scheduling anything after the shift is over
+        if when > self.get_setting("max_seconds"):
+            return
+        self.scheduler.schedule(when, "spawn", self.spawn_generation)
+
+    def spawn_scheduled_anomaly(self):
+        """
+        Create the anomaly that is due now, and schedule the next one.
+        """
+        with use_game(self):
+            for attempt in range(SPAWN_ATTEMPTS):
+                if self.spawner():
+                    if METRICS is not None:
+                        METRICS.count("spawns")
+                    break
+        if METRICS is not None:
+            METRICS.count("spawn_attempts", attempt + 1)
+
+        if self.too_many_anomalies():
+            self.end_game("anomalies")
+        self.schedule_spawn()
+
     def over_time(self) -> bool:
         """
         Return whether the game is over the time limit.
@@ -192,8 +1190,11 @@ class GameManager:
         and time since the last anomaly check. Only creates one per time
         specified in the settings, but can create more than one if the time
         since the last anomaly check is greater than the time specified in the settings.
+
+        Always returns 0 if the game creates its own anomalies (see set_spawner()).
         """
-        SECONDS_BETWEEN_CHECKS = 60
+        if self.spawner is not None:
+            return 0
 
         # Raise an error if the number of rooms is fewer than the max number of anomlies
         if len(self.get_rooms()) < self.get_setting("max_anomalies"):
@@ -207,7 +1208,7 @@ class GameManager:
         p = self.get_setting("probability")
         n_active = self.get_data("active_anomalies")
         n_max = self.get_setting("max_anomalies")
-        n_rooms = len( [r for r in self.get_rooms() if not r.get_anomaly()] )
+        n_rooms = self.count_unchanged_rooms()
 
         n_checks = last_check // SECONDS_BETWEEN_CHECKS # e.g., if 120 seconds have passed, and checking every 60 seconds, we should check twice
         
@@ -220,78 +1221,191 @@ class GameManager:
 
         num_to_spawn = 0
 
-        for _ in range(n_checks):
+        # Rather than rolling the dice once per check, jump straight to the next check that succeeds.
+        # Each loop iteration here is one spawned anomaly, so a long idle gap costs nothing extra.
+        checks_left = n_checks
+        while checks_left > 0:
             spawning_is_valid = n_active < n_max and n_rooms > 0
-            last_anomaly += SECONDS_BETWEEN_CHECKS
             if not spawning_is_valid:
-                continue # Skip to continue simulating time passing
+                break
+
+            # Checks before the minimum gap has passed can never spawn, so skip over them
+            first_check = max(1, math.ceil((min_between - last_anomaly) / SECONDS_BETWEEN_CHECKS))
+            if first_check > checks_left:
+                break
+
+            # Every check from first_check onwards succeeds with probability p
+            spawn_check = first_check + self.failed_checks_before_spawn(p)
+            if spawn_check > checks_left:
+                break
 
-            try_to_spawn = random.random() < p
+            checks_left -= spawn_check
+            n_active += 1
+            num_to_spawn += 1
+            n_rooms -= 1
+            last_anomaly = 0
 
-            if last_anomaly >= min_between and try_to_spawn:
-                n_active += 1
-                num_to_spawn += 1
-                n_rooms -= 1
-                last_anomaly = 0
+        # Any checks that didn't spawn anything still count as time passing
+        last_anomaly += checks_left * SECONDS_BETWEEN_CHECKS
         
         self.set_data("seconds_since_last_anomaly_check", last_check % SECONDS_BETWEEN_CHECKS)
         self.set_data("seconds_since_last_anomaly", last_anomaly)
         
         return num_to_spawn
 
-    def register(self, name: str):
+    def failed_checks_before_spawn(self, p: float) -> int:
+        """
+        Return how many anomaly checks fail before one succeeds, when each check succeeds with probability p.
+        This is a geometric distribution, so it can be sampled with a single random number.
+        Returns a very large number if p is 0 or less, since no check can ever succeed.
+        """
+        if p >= 1:
+            return 0
+        if p <= 0:
+            return sys.maxsize
+        # 1 - random() is in (0, 1], which avoids taking log(0)
+        return int(math.log(1.0 - self.random.random()) / math.log(1.0 - p))
+
+    def register(self, name: str, generator: Callable[[str], bool] = None, applies: Callable[[list[str]], bool] = None):
         """
         Register an anomaly.
+        generator(room_name) creates the anomaly in the room and returns True if it worked.
+        applies(items) returns whether the anomaly can be created in a room with those items; if not given it can be used anywhere.
+        Registering a name again replaces its generator.
+        """
+        name = name.upper()
+        if name not in self.anomaly_names:
+            self.anomaly_names.add(name)
+            self.anomalies.append(name)
+        if generator is not None:
+            self.generators[name] = (generator, applies)
+
+    def register_bulk(self, anomalies) -> int:
         """
-        self.anomalies.append(name.upper())
+        Register many anomalies at once. Each one is either a name, or a tuple of (name, generator)
+        or (name, generator, applies) with the same meaning as in register().
+
+        Return the number of anomalies that were registered for the first time.
+        """
+        before = len(self.anomalies)
+        for anomaly in anomalies:
+            if isinstance(anomaly, str):
+                self.register(anomaly)
+            elif isinstance(anomaly, tuple) and 1 <= len(anomaly) <= 3:
+                self.register(*anomaly)
+            else:
+                raise ValueError(f"Invalid anomaly {anomaly!r}, expected a name or (name, generator, applies).")
+        return len(self.anomalies) - before
 
     def is_registered_anomaly(self, name: str) -> bool:
         """
         Return whether the name is a registered anomaly.
         """
-        return name.upper() in self.anomalies
+        return name.upper() in self.anomaly_names
+
+    def anomalies_for_room(self, room: Room) -> list[str]:
+        """
+        Return the names of the anomalies with generators that can be created in the room.
+        """
+        names = []
+        for name, (generator, applies) in self.generators.items():
+            if applies is None or applies(room.items):
+                names.append(name)
+        return names
+
+    def create_anomaly(self) -> bool:
+        """
+        Create a random anomaly in a random room without one, choosing only from the anomalies that suit that room.
+        The generator is called with this game as the current game (see use_game()).
+
+        Return True if an anomaly was created, False otherwise.
+        """
+        room = self.get_random_unchanged_room()
+        if room is None:
+            return False
+
+        names = self.anomalies_for_room(room)
+        if len(names) == 0:
+            return False
+
+        generator, _ = self.generators[self.random.choice(names)]
+        with use_game(self):
+            return generator(room.name)
 
     def add_anomaly(self, name: str, room: Room, modified_item_list: list[str]) -> bool:
         """
         Add an anomaly to the list of anomalies, unless there is already an active anomaly in the room.
         Adds the name to the list of active anomalies and modifies the list of items in the room.
 
+        Return True if the anomaly was added, False otherwise.
+        """
+        return self.add_anomaly_change(name, room, ("items", modified_item_list))
+
+    def add_anomaly_change(self, name: str, room: Room, change: tuple) -> bool:
+        """
+        Add an anomaly that changes the room's items in one small way (see ItemView), without copying the items.
+        Works the same as add_anomaly() otherwise.
+
         Return True if the anomaly was added, False otherwise.
         """
         if room.get_anomaly():
             if self.get_setting("debug"):
-                print(f"Anomaly {name} not added to room {room.name} because there is already an anomaly in it.")
+                self.say(f"Anomaly {name} not added to room {room.name} because there is already an anomaly in it.")
             return False
         
         name = name.upper()
         if not self.is_registered_anomaly(name):
             raise ValueError(f"Anomaly {name} not registered.")
         
-        added = room.add_anomaly(name, modified_item_list)
+        added = room.add_anomaly_change(name, change)
         
         if added:
+            index = self.room_index[room.name]
+            self.mark_room_changed(index)
+            self.working_cameras.set(index, room.camera_working())
+            room.anomaly_time = self.get_data("time")
             self.set_data("active_anomalies", self.get_data("active_anomalies") + 1)                
             self.set_data("seconds_since_last_anomaly", 0)
+            self.schedule_spawn()
             if self.get_setting("debug"):
-                print(f"Anomaly {name} added to room {room.name} with updated items {room.anomaly_items}.")
+                self.say(f"Anomaly {name} added to room {room.name} with updated items {room.anomaly_items}.")
             return True
         else:
             if self.get_setting("debug"):
-                print(f"Anomaly {name} not added to room {room.name} because the modified items {modified_item_list} are the same as the current items {room.items}.")
+                self.say(f"Anomaly {name} not added to room {room.name} because the change {change} leaves the items looking the same as the current items {room.items}.")
             return False
  
 
     def print_warning(self):
         if self.get_data("active_anomalies") >= self.get_setting("max_anomalies")-1:
-            print(f"{'='*40}\n!! WARNING !!: Too many anomalies active at one time. Report anomalies soon or you will fail your shift.\n{'='*40}\n")
+            self.say(f"{'='*40}\n!! WARNING !!: Too many anomalies active at one time. Report anomalies soon or you will fail your shift.\n{'='*40}\n")
+
+    def print_welcome(self):
+        """
+        Print the instructions shown at the start of a shift.
+        """
+        self.say("Welcome to 'I Am On Duty Watching Changes to Rooms'!")
+        self.say("Your Mission:")
+        self.say(" - Watch cameras for changes to the rooms.")
+        self.say(" - Type 'n' or 'p' to go to the next or previous camera.")
+        self.say(" - Report anomalies to the control room by typing r and selecting the room and anomaly.")
+        self.say("    - You will be asked to input a room number, then an anomaly number.")
+        self.say("    - The only penalty for reporting incorrect anomalies is the time it took to report, so try it out!")
+        self.say(f" - You have {self.get_setting('max_seconds')/3600:.2f} hours in-game to complete your shift.")
+        self.say(f" - For every second that passes in real life, {self.get_setting('timescale')} seconds will pass in-game.")
+        self.say(f" - You can only have {self.get_setting('max_anomalies')} anomalies active at one time before losing the game.")
+        self.say(f" - Changes will begin after {self.get_setting('min_seconds_between_anomalies')/60:.2f} in-game minutes.")
+        self.say("Type 'help' for a list of commands.")
+        self.say("Good luck!")
 
     def print_help(self):
-        print("COMMANDS:")
-        print("  next   (n) or <enter>: Go to the next camera")
-        print("  prev   (p): Go to the previous camera")
-        print("  report (r) : Report an anomaly, will prompt for additional details.")
-        print("  quit   (q): Quit the game")
-        print("  help   (h, ?): Print this help message")
+        self.say("COMMANDS:")
+        self.say("  next   (n) or <enter>: Go to the next camera")
+        self.say("  prev   (p): Go to the previous camera")
+        self.say("  report (r) : Report an anomaly, will prompt for additional details.")
+        self.say("  report (r) <room> <anomaly>: Report an anomaly using the room and anomaly numbers directly.")
+        self.say("  quit   (q): Quit the game")
+        self.say("  help   (h, ?): Print this help message")
     
     def print_ingame_time(self):
         """
@@ -301,9 +1415,14 @@ class GameManager:
         hours = time // 3600
         minutes = (time % 3600) // 60
         time = f"{hours:02}:{minutes:02}"
-        print(f"TIME: {time}")
+        self.say(f"TIME: {time}")
 
-    def print_camera(self, index: int = None):
+    def camera_view(self, index: int = None) -> tuple[int, Sequence]:
+        """
+        Return what the camera shows as (index of the room shown, items shown).
+        If the camera is broken this skips to the next working camera, the same as print_camera().
+        Return (-1, []) if every camera is offline.
+        """
         if index is None:
             index = self.get_data("camera")
         if len(self.rooms) == 0:
@@ -312,26 +1431,44 @@ class GameManager:
         room = self.get_rooms()[index]
 
         if room.get_anomaly():
-            if "CAMERA MALFUNCTION" in room.get_anomaly():
+            if not room.camera_working():
                 # Skip to the next camera without a malfunction
-                next_index = self.next_camera()
-                if next_index == -1:
-                    print("ALL CAMERAS OFFLINE")
-                    return
-                
-                room = self.get_rooms()[next_index]
+                index = self.next_camera()
+                if index == -1:
+                    return -1, []
+
+                room = self.get_rooms()[index]
                 if room.get_anomaly():
-                    items = room.anomaly_items[:]
-                else:
-                    items = room.items[:]
-            else:
-                items = room.anomaly_items[:]
-        else:
-            items = room.items[:]
-        
-        print(f"CAMERA {index+1:02}: {room.name.upper()}")
+                    return index, room.anomaly_items
+                return index, room.items
+            return index, room.anomaly_items
+        return index, room.items
+
+    def print_camera(self, index: int = None):
+        index, items = self.camera_view(index)
+        if index == -1:
+            self.say("ALL CAMERAS OFFLINE")
+            return
+
+        room = self.get_rooms()[index]
+        self.say(f"CAMERA {index+1:02}: {room.name.upper()}")
         for item_index, item in enumerate(items):
-            print(f"  [{item_index}] {item}")
+            self.say(f"  [{item_index}] {item}")
+
+    def display(self):
+        """
+        Print the current camera, time and any warnings, or the game over screen if the game has ended.
+        """
+        if self.should_end_game():
+            self.print_gameover()
+        else:
+            if self.get_setting("debug"):
+                self.say(f"(DEBUG) Active Anomalies: {self.get_data('active_anomalies')}")
+
+            self.print_warning()
+            self.print_reports()
+            self.print_ingame_time()
+            self.print_camera()
 
     def print_gameover(self):
         """
@@ -343,20 +1480,20 @@ class GameManager:
         time = self.get_time_string()
 
         if self.gameover["anomalies"]:
-            print("GAME OVER\nYou have failed your shift. Too many anomalies active at one time.")
-            print("Active Anomalies:")
+            self.say("GAME OVER\nYou have failed your shift. Too many anomalies active at one time.")
+            self.say("Active Anomalies:")
             for room in self.get_rooms():
                 if room.get_anomaly():
-                    print(f"  {room.name.upper()}: {room.get_anomaly()}")
+                    self.say(f"  {room.name.upper()}: {room.get_anomaly()}")
 
         elif self.gameover["timeup"]:
-            print("GAME OVER\nCongratulations! You have completed your shift.")
+            self.say("GAME OVER\nCongratulations! You have completed your shift.")
         elif self.gameover["quit"]:
-            print("GAME OVER\nYou have quit your shift.")
+            self.say("GAME OVER\nYou have quit your shift.")
         
-        print(f"Time: {time}")
-        print(f"FOUND: {found_count} out of {total_count} total anomalies.")
-        print(f"\n")
+        self.say(f"Time: {time}")
+        self.say(f"FOUND: {found_count} out of {total_count} total anomalies.")
+        self.say(f"\n")
 
     def get_report(self) -> tuple[int, int]:
         """
@@ -365,30 +1502,30 @@ class GameManager:
         Return a tuple of the room index and the anomaly index, or -1 -1 if the user cancelled.
         """
 
-        print(f"REPORTING ANOMALY\n{'-'*20}")
-        print("  Which room is the anomaly in?")
+        self.say(f"REPORTING ANOMALY\n{'-'*20}")
+        self.say("  Which room is the anomaly in?")
         for i, room in enumerate(self.get_rooms()):
-            print(f"    [{i+1:02}] {room.name.upper()}")
+            self.say(f"    [{i+1:02}] {room.name.upper()}")
         while True:
-            room_index = int(input("Enter a Room Number (-1 to cancel)\n>> "))
+            room_index = int(self.ask("Enter a Room Number (-1 to cancel)\n>> "))
             if room_index < -1 or room_index > len(self.get_rooms()):
-                print(f"Invalid room number {room_index}. Please enter a number between 1 and {len(self.get_rooms())} or -1 to cancel.")
+                self.say(f"Invalid room number {room_index}. Please enter a number between 1 and {len(self.get_rooms())} or -1 to cancel.")
             elif room_index == -1:
-                print("Cancelling report.")
+                self.say("Cancelling report.")
                 return -1, -1
             else:
                 break
 
-        print(f"  What is the anomaly?")
+        self.say(f"  What is the anomaly?")
         for i, anomaly_name in enumerate(self.anomalies):
-            print(f"    [{i+1:02}] {anomaly_name.upper()}")
+            self.say(f"    [{i+1:02}] {anomaly_name.upper()}")
         while True:
-            anomaly_index = int(input("Enter an Anomaly Number (-1 to cancel)\n>> "))
+            anomaly_index = int(self.ask("Enter an Anomaly Number (-1 to cancel)\n>> "))
             if anomaly_index == -1:
-                print("Cancelling report.")
+                self.say("Cancelling report.")
                 return -1, -1
             elif anomaly_index < 1 or anomaly_index > len(self.anomalies):
-                print(f"Invalid anomaly number {anomaly_index}. Please enter a number between 1 and {len(self.anomalies)} or -1 to cancel.")
+                self.say(f"Invalid anomaly number {anomaly_index}. Please enter a number between 1 and {len(self.anomalies)} or -1 to cancel.")
             else:
                 break
 
@@ -397,38 +1534,81 @@ class GameManager:
     
     def report(self, room_index, anomaly_index) -> bool:
         """
-        Sleeps for a few seconds and if the anomaly is active in the room, it fixes it and returns True.
+        Sends a report to be checked. The player can keep watching the cameras while it is checked,
+        and once anomaly_report_time (plus a second to fix it) has passed the anomaly is fixed if it is in the room.
+        See resolve_report().
+
+        Return True if the report was sent, False if the room or anomaly was invalid.
         """
-        self.clear()
         if anomaly_index < 0 or anomaly_index >= len(self.anomalies):
-            print(f"Invalid anomaly index.")
+            self.say(f"Invalid anomaly index.")
             return False
         if room_index < 0 or room_index >= len(self.get_rooms()):
-            print(f"Invalid room index.")
+            self.say(f"Invalid room index.")
             return False
         
         anomaly = self.anomalies[anomaly_index]
         room = self.get_rooms()[room_index]
 
-        print(f"Checking for anomaly {anomaly} in room {room.name}", end="", flush=True)
-        for _ in range(int(self.get_setting("anomaly_report_time"))):
-            print(".", end="", flush=True)
-            time.sleep(1)
-        
-        if room.get_anomaly() == anomaly.upper():
-            print(f"\nAnomaly [{anomaly}] found in room [{room.name}]!")
-            print(f"Fixing anomaly...")
-            time.sleep(1)
-            room.anomaly = ""
-            room.anomaly_items = []
+        # Checking takes anomaly_report_time real seconds and fixing takes one more, so convert that to in-game time
+        report_seconds = int((int(self.get_setting("anomaly_report_time")) + 1) * self.get_setting("timescale"))
+        report = {
+            "room": room.name,
+            "anomaly": anomaly,
+            "due": self.get_data("time") + report_seconds
+        }
+        self.pending_reports.append(report)
+        self.scheduler.schedule(report["due"], "report", report)
+        self.say(f"Checking for anomaly {anomaly} in room {room.name}...")
+        return True
+
+    def report_pending(self, room_index: int) -> bool:
+        """
+        Return whether a report for the room is still being checked.
+        """
+        name = self.get_rooms()[room_index].name
+        return any(report["room"] == name for report in self.pending_reports)
+
+    def resolve_report(self, report: dict) -> bool:
+        """
+        Finish a report once its check is due, fixing the anomaly if it was reported correctly.
+        The result is stored in report_messages to be shown on the next display().
+
+        Return True if an anomaly was fixed.
+        """
+        self.pending_reports.remove(report)
+
+        anomaly = report["anomaly"]
+        room = self.get_room(report["room"])
+        if room is not None and room.get_anomaly() == anomaly.upper():
+            room.clear_anomaly()
+            index = self.room_index[room.name]
+            self.mark_room_free(index)
+            self.working_cameras.set(index, True)
             self.set_data("active_anomalies", self.get_data("active_anomalies") - 1)
             self.set_data("found_anomalies", self.get_data("found_anomalies") + 1)
-            print(f"Anomaly fixed.")
+            self.report_messages.append(f"Anomaly [{anomaly}] found in room [{report['room']}]! Anomaly fixed.")
+            self.schedule_spawn()
             return True
         else:
-            time.sleep(1)
-            print(f"\nAnomaly [{anomaly}] not found in room [{room.name}].")
+            self.report_messages.append(f"Anomaly [{anomaly}] not found in room [{report['room']}].")
             return False
+
+    def print_reports(self):
+        """
+        Print the results of finished reports since the last call, and the reports still being checked.
+        """
+        if not self.report_messages and not self.pending_reports:
+            return
+
+        for message in self.report_messages:
+            self.say(message)
+        self.report_messages = []
+
+        for report in self.pending_reports:
+            due = report["due"]
+            self.say(f"Checking: {report['anomaly']} in {report['room']} (done at {due//3600:02}:{(due%3600)//60:02})")
+        self.say()
         
     def next_camera(self, reverse=False) -> int:
         """
@@ -438,29 +1618,128 @@ class GameManager:
         """
         if len(self.get_rooms()) == 0:
             raise ValueError("No rooms added to the game.")
-        
-        next_index = self.get_data("camera")
-        inc = 1 if not reverse else -1
-
-        for _ in range(0, len(self.get_rooms())):
-            next_index = (next_index + inc) % len(self.get_rooms())
-            room = self.get_room(next_index)
-            if "CAMERA MALFUNCTION" in room.get_anomaly():
-                continue
-            else:
-                self.set_data("camera", next_index)
-                return next_index
 
-        return -1
+        current = self.get_data("camera")
+        next_index = self.working_cameras.next_working(current, reverse)
+        if next_index != -1:
+            self.set_data("camera", next_index)
+            if METRICS is not None:
+                # Broken cameras passed over on the way, counting round to the same camera as skipping every other one
+                step = -1 if reverse else 1
+                METRICS.count("camera_skips", ((next_index - current) * step - 1) % len(self.get_rooms()))
+        return next_index
     
+    def run_command(self, cmd: list[str]):
+        """
+        Run a single command that has already been split into words, e.g. ["next"] or ["report", "2", "1"].
+        A report with no room and anomaly numbers asks the player for them.
+        """
+        if self.recorder is not None and cmd not in (["report"], ["r"]):
+            self.recorder.command(cmd)
+
+        match cmd:
+            case ['next'| 'n']:
+                self.next_camera(reverse=False)
+            case ["prev" | "p"]:
+                self.next_camera(reverse=True)
+            case ["report" | "r"]:
+                room, anomaly = self.get_report()
+                if room != -1 and anomaly != -1:
+                    # Record the answers as the short form of the command, so replays don't have to ask
+                    if self.recorder is not None:
+                        self.recorder.command(["report", str(room+1), str(anomaly+1)])
+                    self.report(room, anomaly)
+            case ["report" | "r", room, anomaly]:
+                # Room and anomaly numbers start at 1, the same as in the report prompt
+                try:
+                    self.report(int(room)-1, int(anomaly)-1)
+                except ValueError:
+                    self.say(f"Invalid report \"{cmd}\". Room and anomaly must be numbers.")
+            case ["quit" | "q"]:
+                self.end_game("quit")
+            case ["help" | "h" | "?"]:
+                self.print_help()
+            case _:
+                self.say(f"Invalid command \"{cmd}\". Type \"help\" for a list of commands.")
+
+    def say(self, *args, **kwargs):
+        """
+        Print to the screen, unless the game is headless.
+        Nothing shows up until flush() is called, so a whole screen is written at once.
+        """
+        if not self.headless:
+            print(*args, file=self.renderer, **kwargs)
+
     def clear(self):
         """
-        Clear the screen.
+        Clear the screen. The screen is actually cleared when the next frame is written by flush().
+        """
+        if self.headless:
+            return
+        self.renderer.clear()
+
+    def flush(self):
+        """
+        Write everything printed since the last flush to the screen in one go.
         """
-        os.system('cls' if os.name == 'nt' else 'clear')
+        if self.headless:
+            return
+        self.renderer.diff = bool(self.get_setting("diff_frames"))
+        self.renderer.flush()
+
+    def ask(self, prompt: str = "") -> str:
+        """
+        Show everything printed so far, then wait for the player to type a line and return it.
+        Time spent waiting is left out of every timing (see timed()), so it only measures the game.
+        """
+        self.flush()
+        if METRICS is None:
+            return input(prompt)
+        start = time.perf_counter()
+        try:
+            return input(prompt)
+        finally:
+            METRICS.waiting_seconds += time.perf_counter() - start
 
 GAME_DATA = GameManager()
 
+def get_game() -> GameManager:
+    """
+    Return the GameManager every function in this module is working on.
+    """
+    global GAME_DATA
+
+    return GAME_DATA
+
+def set_game(game: GameManager):
+    """
+    Point every function in this module at a different GameManager from now on,
+    e.g. one restored from a checkpoint (see Snapshot.resume()).
+    """
+    global GAME_DATA
+
+    GAME_DATA = game
+
+@contextmanager
+def use_game(game: GameManager):
+    """
+    Temporarily point every function in this module at a different GameManager.
+    This lets code written against the module functions (like the anomaly helpers in Game.py)
+    work on games other than GAME_DATA, e.g. headless simulations.
+
+    Usage:
+        with use_game(game):
+            add_room("Kitchen", ["Gas Stove"])
+    """
+    global GAME_DATA
+
+    previous = GAME_DATA
+    GAME_DATA = game
+    try:
+        yield game
+    finally:
+        GAME_DATA = previous
+
 def init(anomalies: list[str] = None, rooms: list[str] = None, room_items: list[str] = None, **settings) -> None:
     """
     Sets up a new game with the given timescale, rooms, and room items.
@@ -474,50 +1753,35 @@ def init(anomalies: list[str] = None, rooms: list[str] = None, room_items: list[
 
     # **kwargs is a special parameter that allows us to pass in any number of keyword arguments
     # and they will be stored in a dictionary called kwargs; 
-    for key, value in settings.items():
-        GAME_DATA.set_setting(key, value)
+    GAME_DATA.set_settings(settings)
 
     if rooms is not None and room_items is not None:
         # Zip is a cool function which takes two lists and combines them into a list of tuples
-        # Then we can loop over this with a single loop!
-        for room, items in zip(rooms, room_items):
-            GAME_DATA.add_room(room, items)
+        # Then all of the rooms can be added in a single pass!
+        GAME_DATA.add_rooms_bulk(zip(rooms, room_items))
 
     if anomalies is not None:
-        for anomaly in anomalies:
-            GAME_DATA.register(anomaly)
+        GAME_DATA.register_bulk(anomalies)
 
     if GAME_DATA.get_setting("debug"):
-        print("=== DEBUG INFORMATION ===")
-        print(f"Registered Anomalies: {GAME_DATA.anomalies}")
-        print(f"Rooms: ")
+        GAME_DATA.say("=== DEBUG INFORMATION ===")
+        GAME_DATA.say(f"Registered Anomalies: {GAME_DATA.anomalies}")
+        GAME_DATA.say(f"Rooms: ")
         for room in GAME_DATA.get_rooms():
-            print(f"  {room.name}: {len(room.items)} items")
-        print(f"Settings (when init() was called): ")
+            GAME_DATA.say(f"  {room.name}: {len(room.items)} items")
+        GAME_DATA.say(f"Settings (when init() was called): ")
         for key, value in GAME_DATA.settings.items():
-            print(f"  {key}: {value}")
-        print("========================\n")
+            GAME_DATA.say(f"  {key}: {value}")
+        GAME_DATA.say("========================\n")
 
     
 
-    print("Welcome to 'I Am On Duty Watching Changes to Rooms'!")
-    print("Your Mission:")
-    print(" - Watch cameras for changes to the rooms.")
-    print(" - Type 'n' or 'p' to go to the next or previous camera.")
-    print(" - Report anomalies to the control room by typing r and selecting the room and anomaly.")
-    print("    - You will be asked to input a room number, then an anomaly number.")
-    print("    - The only penalty for reporting incorrect anomalies is the time it took to report, so try it out!")
-    print(f" - You have {GAME_DATA.get_setting('max_seconds')/3600:.2f} hours in-game to complete your shift.")
-    print(f" - For every second that passes in real life, {GAME_DATA.get_setting('timescale')} seconds will pass in-game.")
-    print(f" - You can only have {GAME_DATA.get_setting('max_anomalies')} anomalies active at one time before losing the game.")
-    print(f" - Changes will begin after {GAME_DATA.get_setting('min_seconds_between_anomalies')/60:.2f} in-game minutes.")
-    print("Type 'help' for a list of commands.")
-    print("Good luck!")
-    response = input("Press enter to begin or `help` to see a list of commands.\n>> ")
+    GAME_DATA.print_welcome()
+    response = GAME_DATA.ask("Press enter to begin or `help` to see a list of commands.\n>> ")
 
     if response.lower() == "help":
         GAME_DATA.print_help()
-        input("Press enter to begin.")
+        GAME_DATA.ask("Press enter to begin.")
 
     
     GAME_DATA.tick_time()
@@ -530,15 +1794,7 @@ def display() -> None:
     """
     global GAME_DATA
 
-    if GAME_DATA.should_end_game():
-        GAME_DATA.print_gameover()
-    else:
-        if GAME_DATA.get_setting("debug"):
-            print(f"(DEBUG) Active Anomalies: {GAME_DATA.get_data('active_anomalies')}")
-
-        GAME_DATA.print_warning()
-        GAME_DATA.print_ingame_time()
-        GAME_DATA.print_camera()
+    GAME_DATA.display()
 
 def handle_input(clear=True) -> None:
     """
@@ -554,10 +1810,10 @@ def handle_input(clear=True) -> None:
      
 
     if GAME_DATA.should_end_game():
-        input("Press enter to exit.")
+        GAME_DATA.ask("Press enter to exit.")
         quit()
     
-    cmd = input(">> ").lower().strip().split()
+    cmd = GAME_DATA.ask(">> ").lower().strip().split()
 
     if len(cmd) == 0:
         cmd = ["next"]
@@ -565,21 +1821,7 @@ def handle_input(clear=True) -> None:
     if clear:
         GAME_DATA.clear()
 
-    match cmd:
-        case ['next'| 'n']:
-            GAME_DATA.next_camera(reverse=False)
-        case ["prev" | "p"]:
-            GAME_DATA.next_camera(reverse=True)
-        case ["report" | "r"]:
-            room, anomaly = GAME_DATA.get_report()
-            if room != -1 and anomaly != -1:
-                GAME_DATA.report(room, anomaly)
-        case ["quit" | "q"]:
-            GAME_DATA.end_game("quit")
-        case ["help" | "h" | "?"]:
-            GAME_DATA.print_help()
-        case _:
-            print(f"Invalid command \"{cmd}\". Type \"help\" for a list of commands.")
+    GAME_DATA.run_command(cmd)
 
     GAME_DATA.tick_time()  
 
@@ -611,6 +1853,14 @@ def rooms_without_anomalies() -> list[str]:
             rooms.append(room.name)
     return rooms
 
+def set_spawner(spawner) -> None:
+    """
+    Have the game create anomalies by itself at the moment they are due, by calling spawner().
+    spawner() should create one anomaly and return True if it worked.
+    """
+    global GAME_DATA
+    GAME_DATA.set_spawner(spawner)
+
 def number_of_anomalies_to_create() -> int:
     """
     Return the number of anomalies to spawn based on the anomaly probability
@@ -619,12 +1869,36 @@ def number_of_anomalies_to_create() -> int:
     global GAME_DATA
     return GAME_DATA.number_of_anomalies_to_create()
 
-def register_anomaly(name: str):
+def register_anomaly(name: str, generator=None, applies=None):
     """
     Adds the name to the list of registered anomalies.
+
+    If a generator is given, create_anomaly() can create this anomaly by calling generator(room_name),
+    which should return True if it created the anomaly.
+    applies(room_items) can be given to say which rooms the anomaly works in, e.g. lambda items: len(items) >= 2.
+    """
+    global GAME_DATA
+    GAME_DATA.register(name, generator, applies)
+
+def register_anomalies_bulk(anomalies) -> int:
+    """
+    Register many anomalies at once. Each one is either a name, or a tuple of (name, generator, applies)
+    with the same meaning as in register_anomaly().
+
+    Return the number of anomalies that were registered for the first time.
+    """
+    global GAME_DATA
+    return GAME_DATA.register_bulk(anomalies)
+
+def create_anomaly() -> bool:
+    """
+    Create a random registered anomaly in a random room without one.
+    Only anomalies registered with a generator that applies to the chosen room are used.
+
+    Return True if an anomaly was created, False otherwise.
     """
     global GAME_DATA
-    GAME_DATA.register(name)
+    return GAME_DATA.create_anomaly()
 
 def add_anomaly(name: str, room: Union[str, int], modified_item_list: list[str]) -> bool:
     """
@@ -654,11 +1928,11 @@ def get_random_unchanged_room() -> str:
     """
     global GAME_DATA
 
-    rooms = rooms_without_anomalies()
-    if len(rooms) == 0:
+    room = GAME_DATA.get_random_unchanged_room()
+    if room is None:
         return None
     else:
-        return random.choice(rooms)
+        return room.name
 
 def add_room(room_name: str, room_items: list[str]) -> bool:
     """
@@ -670,9 +1944,30 @@ def add_room(room_name: str, room_items: list[str]) -> bool:
 
     return GAME_DATA.add_room(room_name, room_items)
 
-def get_room_items(room: Union[str, int]) -> list[str]:
+def add_rooms_bulk(rooms) -> int:
+    """
+    Add many rooms at once from an iterable of (room name, items); does not add duplicates.
+    Much faster than calling add_room() for each room, and warns once about every duplicate instead of once each.
+
+    Return the number of rooms that were added.
+    """
+    global GAME_DATA
+
+    return GAME_DATA.add_rooms_bulk(rooms)
+
+def remove_room(room_name: str) -> bool:
+    """
+    Remove a room from the list of rooms to observe.
+
+    Return True if the room was removed, False otherwise.
+    """
+    global GAME_DATA
+
+    return GAME_DATA.remove_room(room_name)
+
+def get_room_items(room: Union[str, int]) -> Sequence:
     """
-    Return a copy of the list of items in the room.
+    Return a read-only view of the items in the room. Use items[:] to get a copy that can be changed.
     """
     global GAME_DATA
 
@@ -680,13 +1975,81 @@ def get_room_items(room: Union[str, int]) -> list[str]:
     if room is None:
         return []
     else:
-        return room.items[:]
+        return ItemView(room.items)
+
+def get_room_digest(room: Union[str, int]) -> int:
+    """
+    Return a number that changes whenever the room's items, as the camera shows them, change.
+    Keep it and compare it to a later one to see whether the room changed, without comparing the items.
+
+    Return None if the room doesn't exist.
+    """
+    global GAME_DATA
+
+    return GAME_DATA.room_digest(room)
+
+def add_anomaly_change(name: str, room: Union[str, int], change: tuple) -> bool:
+    """
+    Add an anomaly that changes the room's items in one small way (see ItemView).
+    The helpers below are easier to use.
+
+    Return True if the anomaly was added, False otherwise.
+    """
+    global GAME_DATA
+
+    room = GAME_DATA.get_room(room)
+
+    if room is None:
+        return False
+    else:
+        return GAME_DATA.add_anomaly_change(name, room, change)
+
+def add_missing_item(name: str, room: Union[str, int], index: int) -> bool:
+    """
+    Add an anomaly where the item at index is missing, without copying the room's items.
+
+    Return True if the anomaly was added, False otherwise.
+    """
+    return add_anomaly_change(name, room, ("remove", index))
+
+def add_swapped_items(name: str, room: Union[str, int], index_a: int, index_b: int) -> bool:
+    """
+    Add an anomaly where the items at index_a and index_b have swapped places, without copying the room's items.
+
+    Return True if the anomaly was added, False otherwise.
+    """
+    return add_anomaly_change(name, room, ("swap", index_a, index_b))
+
+def add_replaced_item(name: str, room: Union[str, int], index: int, new_item: str) -> bool:
+    """
+    Add an anomaly where the item at index is shown as new_item, without copying the room's items.
+
+    Return True if the anomaly was added, False otherwise.
+    """
+    return add_anomaly_change(name, room, ("replace", index, new_item))
+
+def add_hidden_items(name: str, room: Union[str, int]) -> bool:
+    """
+    Add an anomaly where none of the room's items are shown.
+
+    Return True if the anomaly was added, False otherwise.
+    """
+    return add_anomaly_change(name, room, ("hide",))
     
+def get_random() -> random.Random:
+    """
+    Return the game's random number generator.
+    Use it instead of the random module (e.g. Duty.get_random().randint(0, 3)) so shifts can be replayed exactly.
+    """
+    global GAME_DATA
+
+    return GAME_DATA.random
+
 def get_random_anomaly() -> str:
     """
     Return a random registered anomaly.
     """
-    return random.choice(GAME_DATA.anomalies)
+    return GAME_DATA.random.choice(GAME_DATA.anomalies)
 
 def set_setting(setting: str, value):
 
@@ -696,3 +2059,109 @@ def set_setting(setting: str, value):
     global GAME_DATA
 
     GAME_DATA.set_setting(setting, value)
+
+def set_settings(settings: dict):
+    """
+    Set many game settings at once from a dictionary of setting name to value.
+    """
+    global GAME_DATA
+
+    GAME_DATA.set_settings(settings)
+
+# Set by enable_metrics(). While it is None nothing is timed or counted.
+METRICS = None
+
+# Command words and their short forms, so command timings are labelled by command rather than by whatever was typed
+COMMAND_NAMES = {
+    "next": "next", "n": "next",
+    "prev": "prev", "p": "prev",
+    "report": "report", "r": "report",
+    "quit": "quit", "q": "quit",
+    "help": "help", "h": "help", "?": "help"
+}
+
+def command_labels(game: GameManager, cmd: list[str]) -> tuple:
+    return (("command", COMMAND_NAMES.get(cmd[0] if cmd else "", "invalid")),)
+
+# What is timed when metrics are on, as (class or module, function name, histogram name, labels).
+# labels is called with the same arguments as the function and returns the histogram's labels.
+INSTRUMENTED = [
+    (GameManager, "run_command", "command", command_labels),
+    (GameManager, "display", "display", None),
+    (GameManager, "number_of_anomalies_to_create", "number_of_anomalies_to_create", None),
+    (GameManager, "spawn_scheduled_anomaly", "anomaly_generation", None),
+    (GameManager, "create_anomaly", "create_anomaly", None),
+    (GameManager, "report", "report", None),
+    (sys.modules[__name__], "update", "update", None)
+]
+
+# The functions from INSTRUMENTED as they were before timing was added
+UNINSTRUMENTED = {}
+
+def timed(function: Callable, name: str, labels: Callable = None) -> Callable:
+    """
+    Return a version of function that adds how long each call takes to the histogram name.
+    Any time spent waiting for the player during the call, e.g. for the room and anomaly of a report, is left out.
+    """
+    @functools.wraps(function)
+    def timed_function(*args, **kwargs):
+        metrics = METRICS
+        waited = metrics.waiting_seconds if metrics is not None else 0.0
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            if metrics is not None and metrics is METRICS:
+                seconds = time.perf_counter() - start - (metrics.waiting_seconds - waited)
+                metrics.observe(name, seconds, labels(*args, **kwargs) if labels is not None else ())
+    return timed_function
+
+def enable_metrics(dump_file: str = None, dump_seconds: float = 60.0) -> Metrics:
+    """
+    Start timing and counting the game's hot paths, and return the Metrics they are recorded in.
+    If dump_file is given the metrics are written to it every dump_seconds and when the program exits
+    (as JSON if it ends in .json, in the Prometheus text format otherwise).
+
+    The timed versions of the functions are only swapped in while metrics are on, so there is no cost when they are off.
+    If metrics are already on and writing to the same file, they carry on and are returned. Otherwise the old ones
+    stop being written (including at exit), and new metrics are started.
+    """
+    global METRICS
+
+    if METRICS is None:
+        for owner, attribute, name, labels in INSTRUMENTED:
+            UNINSTRUMENTED[(owner, attribute)] = getattr(owner, attribute)
+            setattr(owner, attribute, timed(getattr(owner, attribute), name, labels))
+    elif METRICS.dump_file == dump_file:
+        METRICS.dump_seconds = dump_seconds
+        METRICS.next_dump = time.monotonic() + dump_seconds
+        return METRICS
+    elif METRICS.dump_file is not None:
+        # Otherwise the old metrics would be written over the file at exit
+        atexit.unregister(METRICS.dump)
+
+    METRICS = Metrics(dump_file, dump_seconds)
+    if dump_file is not None:
+        atexit.register(METRICS.dump)
+    return METRICS
+
+def disable_metrics():
+    """
+    Stop timing and counting, and put the original functions back.
+    """
+    global METRICS
+
+    if METRICS is None:
+        return
+    if METRICS.dump_file is not None:
+        atexit.unregister(METRICS.dump)
+    for (owner, attribute), function in UNINSTRUMENTED.items():
+        setattr(owner, attribute, function)
+    UNINSTRUMENTED.clear()
+    METRICS = None
+
+def get_metrics() -> Metrics:
+    """
+    Return the metrics being recorded, or None if metrics are off.
+    """
+    return METRICS
@@ -1,7 +1,17 @@
 
 import Duty
-import random
-import sys
+import Replay
+import RoomFile
+import Snapshot
+import argparse
+import weakref
+
+#reference dictionary of look-alike letters, used by typo() to replace a letter
+TYPO_REPLACEMENTS = {'B':'P','C':'(','D':'O','E':'F','F':'E','G':'O','L':'[','M':'W',
+                     'N':'H','O':'0','P':'B','Q':'O','R':'B','S':'$','T':'I','V':'U',
+                     'W':'V','a':'o','b':'d','c':'o','d':'b','e':'o','f':'t','g':'q',
+                     'h':'k','i':'!','k':'h','l':'|','m':'n','n':'u','o':'0','p':'q',
+                     'r':'n','s':'z','t':'f','u':'v','v':'u','w':'v','y':'v','z':'s'}
 
 def main():
     """
@@ -15,9 +25,27 @@ def main():
     # This could have been done using the init() function's optional parameters,
     # but this should make it easier for you to modify it later.
 
+    # The command line can give a room file to read the rooms from, and a file to record the shift to.
+    parser = argparse.ArgumentParser(description="I Am On Duty Watching Changes to Rooms")
+    parser.add_argument("rooms", nargs="?", default=None, help="room file, defaults to the rooms in add_rooms()")
+    parser.add_argument("--record", default=None, help="record the shift to this file so it can be replayed (see Replay.py)")
+    parser.add_argument("--checkpoint", default=None, help="keep saving the shift to this file as it is played, so it can be carried on after a crash")
+    parser.add_argument("--resume", action="store_true", help="carry on the unfinished shift in the checkpoint file, if there is one")
+    args = parser.parse_args()
+    if args.resume and args.checkpoint is None:
+        parser.error("--resume needs --checkpoint")
+
+    # If the last shift crashed part way through, carry on from its checkpoint instead of starting a new one.
+    if args.resume and Snapshot.resume(args.checkpoint) is not None:
+        if args.record is not None:
+            parser.error("a resumed shift can't be recorded, since the recording has to start with the shift")
+        play(None, args.checkpoint)
+        return
+
     # These 'helper functions' just clean up the main function and make it more readable.
     # We need to add rooms to the game and we need to register what anomalies are possible.
-    add_rooms()
+    # If a file name was given on the command line, the rooms are read from that file.
+    add_rooms(args.rooms)
     register_anomalies()
 
     # It might be cleaner to put all of these into their own helper function. Feel free to do that if you think it would be better!
@@ -26,179 +54,189 @@ def main():
     Duty.set_setting("probability", 0.1)
     Duty.set_setting("min_seconds_between_anomalies", 10*60)
 
-    # Initialize the game with all of the data we've just set up.
-    Duty.init()
-
-    # This is the main game loop. It will run until the game_running variable is set to False.
-    game_running = True
-    while game_running:
-        # The game keeps track of time while the player is idle, so it is possible we will need
-        # to create multiple anomalies at a time the next time the player types a command.
-        # `number_of_anomalies_to_create` also takes our probability setting into account.
-        n_anomalies = Duty.number_of_anomalies_to_create()
+    # The game keeps track of time while the player is idle, and calls create_anomaly() at the exact
+    # in-game time each anomaly is due. It takes our probability setting into account, and tries again if creating one fails.
+    Duty.set_spawner(Duty.create_anomaly)
 
-        # We create one anomaly at a time, and we'll write a small helper function to clean up the main function.
-        for _ in range(n_anomalies):
-            # Keep looping until we can create the anomaly, just in case one of them fails
-            anomaly_created = False
-            while not anomaly_created:
-                anomaly_created = create_anomaly()
-            
+    # Recording has to start before the clock does, which happens in init().
+    recorder = None
+    if args.record is not None:
+        recorder = Replay.record(Duty.get_game(), args.record, args.rooms)
 
-        # This will update the game status to check if we've lost the game or reached the end.
-        # Update returns True if the game should keep going or False if it should end after this loop.
-        game_running = Duty.update()
+    # Initialize the game with all of the data we've just set up.
+    Duty.init()
 
-        # Display shows all of the game data. If update() determined the game should end, display() will show the end screen.
-        Duty.display()
+    play(recorder, args.checkpoint)
 
-        # This will pause the loop and wait for the user to type something, running the appropriate commands
-        # to handle their actions.
-        Duty.handle_input()
+def play(recorder=None, checkpoint_file: str = None):
+    """
+    Run the game until the shift is over, finishing the recording and checkpoints (if there are any) at the end.
+    """
+    # Checkpoints are written in the background, so saving never slows down the game
+    checkpointer = None
+    if checkpoint_file is not None:
+        checkpointer = Snapshot.checkpoint(Duty.get_game(), checkpoint_file)
 
-def add_rooms():    
+    # This is the main game loop. It will run until the game_running variable is set to False.
+    game_running = True
+    try:
+        while game_running:
+            # This will update the game status to check if we've lost the game or reached the end.
+            # Update returns True if the game should keep going or False if it should end after this loop.
+            game_running = Duty.update()
+
+            # Display shows all of the game data. If update() determined the game should end, display() will show the end screen.
+            Duty.display()
+
+            # This will pause the loop and wait for the user to type something, running the appropriate commands
+            # to handle their actions.
+            Duty.handle_input()
+    finally:
+        # handle_input() quits the program once the game is over, so the recording is finished here
+        if recorder is not None:
+            recorder.close(Duty.get_game())
+        # One last checkpoint with how the shift ended, so it isn't resumed
+        if checkpointer is not None:
+            checkpointer.unwatch(Duty.get_game(), checkpoint_file)
+            checkpointer.close()
+
+def add_rooms(file_name: str = None):    
     """
     Adds all of the rooms to the game. 
     Duty.add_room() takes a string for the name of a room and a list of strings for the items in the room.
+    If file_name is given, each line of the file is a room name followed by its items, separated by commas.
+    Wrap a name in double quotes if it has a comma in it.
     """
 
-    # If there is no command line argument then the following default rooms and items are added
-    if len(sys.argv) == 1:
+    # If there is no file then the following default rooms and items are added
+    if file_name is None:
         
         Duty.add_room("Living Room", ["42\" TV Playing Golf", "Black Leather Sofa", "Circular Metal Coffee Table", "Wooden Bookshelf with 3 Shelves"])
         Duty.add_room("Kitchen", ["Gas Stove", "Retro Red Metal Refrigerator", "Oak Wooden Table", "4 Wooden Chairs"])
         Duty.add_room("Bedroom", ["Queen Size Bed", "Oak Wooden Nightstand", "Oak Wooden Dresser", "Oak Wooden Desk", "Oak Wooden Chair"])
         Duty.add_room("Bathroom", ["Toilet with Oak Seat", "Chrome Sink", "Shower with Blue Tiles", "Medicine Cabinet"])
 
-    # If there is a command line argument the following operations take place
+    # If there is a file, every room in it is added at once
     else:
-    
-        # Accepts a command line argument from the player
-        file_name = sys.argv[1]
-        
-        # Opens the given text file in reading mode
-        file_hndl = open(file_name,"r")
-                
-        while True:
-
-            # Reads the data in the file
-            file_data = file_hndl.readline()
 
-            if file_data=="":
-                break
-
-            # Splits the file data into a List   
-            file_data=file_data.split(",")
-            
-            # removes the newline character from each line
-            file_data[-1] = file_data[-1].strip()
-
-            # Adds the new room and items
-            Duty.add_room(file_data[0],file_data[1:])
+        # RoomFile reads the whole file as (room name, items) pairs, or reuses the rooms it
+        # saved last time if the file hasn't changed since
+        Duty.add_rooms_bulk(RoomFile.load_rooms(file_name))
 
 def register_anomalies():
     """
     Each anomaly we want to add to the game must be "Registered". 
     This is so the game knows what anomalies are possible.
     They will all be stored in UPPERCASE to make it easier to compare them later.
+
+    Each anomaly is registered with the function that creates it, and a check for which rooms it works in,
+    so the game never tries to create an anomaly that can't work in the room it picked.
     """
-    Duty.register_anomaly("CAMERA MALFUNCTION")
-    Duty.register_anomaly("MISSING ITEM")
-    Duty.register_anomaly("ITEM MOVEMENT")
-    Duty.register_anomaly("TYPO")
-
-def create_anomaly() -> bool:
-    """
-    This little helper function handles the control flow for three steps:
-    1. Choose a random room that does not have an anomaly, because rooms can only have one anomaly.
-    2. Choose a random anomaly from the list of registered anomalies.
-    3. Create the anomaly in the room.
-
-    Return True if an anomaly was created, False if no anomaly was created.
-    """
-
-    # Choose a random room that does not have an anomaly
-    room = Duty.get_random_unchanged_room()
-
-    # Pick a random anomaly from the list of registered anomalies
-    # Note: It is possible that some anomalies you create can't work in every room.
-    # Maybe you will need additional logic to make sure the anomaly makes sense in the room.
-    anomaly = Duty.get_random_anomaly()
-
-    # Camera Malfunction is actually a special one.
-    # It will not show this camera when clicking through if 
-    # It sees CAMERA MALFUNCTION as the anomaly name
-    if anomaly == "CAMERA MALFUNCTION":
-        # All anomalies are stores as all uppercase
-        # Since a camera malfunction means no items are shown, we pass an empty list
-        return Duty.add_anomaly("CAMERA MALFUNCTION", room, [])
-    elif anomaly == "MISSING ITEM":
-        # We pass the name of the room to these functions to separate out the logic
-        return missing_item(room)
-    elif anomaly == "ITEM MOVEMENT":
-        return item_movement(room)
-    elif anomaly == "TYPO":
-        return typo(room)
-    else:
-        print(f"ERROR: Anomaly {anomaly} not found")
-        return False
+    Duty.register_anomaly("CAMERA MALFUNCTION", camera_malfunction, has_items)
+    Duty.register_anomaly("MISSING ITEM", missing_item, has_items)
+    Duty.register_anomaly("ITEM MOVEMENT", item_movement, has_two_items)
+    Duty.register_anomaly("TYPO", typo, can_typo)
+
+def has_items(items: list[str]) -> bool:
+    return len(items) > 0
+
+def has_two_items(items: list[str]) -> bool:
+    return len(items) >= 2
+
+def can_typo(items: list[str]) -> bool:
+    # Stops at the first letter, which is almost always in the first item
+    return any(letter.isalpha() for item in items for letter in item)
+
+def camera_malfunction(room: str) -> bool:
+    """
+    Camera Malfunction is actually a special one.
+    It will not show this camera when clicking through if it sees CAMERA MALFUNCTION as the anomaly name.
+    """
+    # Since a camera malfunction means no items are shown, we hide all of them
+    return Duty.add_hidden_items("CAMERA MALFUNCTION", room)
 
 def missing_item(room: str) -> bool:
     """
     Removes a random item from the room. This is a pretty straightforward one.
     1. Get the list of items in the room. (Duty.get_room_items())
-    2. Choose a random item to remove. (random.randint())
-    3. Make a copy of the list of items and remove the item from the copy. (list slicing)
-    4. Create the anomaly with the new list of items. (Duty.add_anomaly())
+    2. Choose a random item to remove. (Duty.get_random().randint())
+    3. Create the anomaly with that item missing. (Duty.add_missing_item())
     """
     items = Duty.get_room_items(room)
-    item_index_to_remove = random.randint(0, len(items)-1)
-    new_items = items[:]
-    new_items.pop(item_index_to_remove)
+    # The game's own random number generator is used instead of the random module, so shifts can be replayed
+    item_index_to_remove = Duty.get_random().randint(0, len(items)-1)
     
-    # add_anomaly returns True if the anomaly was created, False if it was not.
-    return Duty.add_anomaly("MISSING ITEM", room, new_items)
+    # add_missing_item returns True if the anomaly was created, False if it was not.
+    # Only the index is stored, so the list of items never has to be copied.
+    return Duty.add_missing_item("MISSING ITEM", room, item_index_to_remove)
 
-def typo(room: str) -> bool:
+# Each game's typo positions by room, worked out the first time a room gets a typo.
+# A game's rooms only change when its layout_version goes up, so they are thrown away then.
+TYPO_POSITIONS = weakref.WeakKeyDictionary()
 
-    #reference dictionary
-    ref = {'B':'P','C':'(','D':'O','E':'F','F':'E','G':'O','L':'[','M':'W',
-           'N':'H','O':'0','P':'B','Q':'O','R':'B','S':'$','T':'I','V':'U',
-           'W':'V','a':'o','b':'d','c':'o','d':'b','e':'o','f':'t','g':'q',
-           'h':'k','i':'!','k':'h','l':'|','m':'n','n':'u','o':'0','p':'q',
-           'r':'n','s':'z','t':'f','u':'v','v':'u','w':'v','y':'v','z':'s'}
-    
+def typo_positions(room: str) -> tuple[tuple[int, tuple[int]]]:
+    """
+    Return the items in the room that can have a typo, as (item index, positions of its letters) pairs.
+    Any letter can be doubled, and letters in TYPO_REPLACEMENTS can also be replaced.
+    Items without letters are left out, so an empty result means a typo is not possible.
+    """
+    game = Duty.get_game()
+    layout_version, rooms = TYPO_POSITIONS.get(game, (None, None))
+    if layout_version != game.layout_version:
+        rooms = {}
+        TYPO_POSITIONS[game] = (game.layout_version, rooms)
+    if room not in rooms:
+        rooms[room] = find_typo_positions(Duty.get_room_items(room))
+    return rooms[room]
+
+def find_typo_positions(items: list[str]) -> tuple[tuple[int, tuple[int]]]:
+    """
+    Return the (item index, positions of its letters) pairs for typo_positions().
+    """
+    candidates = []
+    for item_index, item in enumerate(items):
+        positions = tuple(position for position, letter in enumerate(item) if letter.isalpha())
+        if positions:
+            candidates.append((item_index, positions))
+    return tuple(candidates)
+
+def typo(room: str) -> bool:
+    """
+    Doubles or replaces a random letter in a random item.
+    The letter positions are looked up in typo_positions(), so picking one never has to retry.
+    Return False if no item in the room has a letter.
+    """
     #get items in the room
     items = Duty.get_room_items(room)
-    new_items = items[:]
+    candidates = typo_positions(room)
+    if len(candidates) == 0:
+        return False
 
     #get random item and letter from room
-    random_item_index = random.randint(0, len(items)-1)
+    rng = Duty.get_random()
+    random_item_index, positions = rng.choice(candidates)
     random_item = items[random_item_index]
-    letter = random_item[random.randint(0, len(random_item)-1)]
-
-    #checking if letter is a letter
-    while not letter.isalpha():
-        letter = random_item[random.randint(0, len(random_item)-1)]
+    position = rng.choice(positions)
+    letter = random_item[position]
 
-    #get typo method
-    selection = random.choice(["double", "replace"])
+    #get typo method, only letters with a look-alike can be replaced
+    selection = "double"
+    if letter in TYPO_REPLACEMENTS:
+        selection = rng.choice(["double", "replace"])
     if selection == "double":
-        random_item = random_item.replace(letter,letter*2, 1)
+        random_item = random_item[:position] + letter + random_item[position:]
     else:
-        random_item = random_item.replace(letter, ref[letter], 1)
+        random_item = random_item[:position] + TYPO_REPLACEMENTS[letter] + random_item[position+1:]
 
-    #place new item back into item list and return
-    new_items[random_item_index] = random_item
-    return Duty.add_anomaly("TYPO", room, new_items)
+    #show the new item in place of the old one and return
+    return Duty.add_replaced_item("TYPO", room, random_item_index, random_item)
 
 def item_movement(room: str) -> bool:
     """
     Re-arranges two items in a room. This one is a little more complicated.
     1. Get the list of items in the room. (Duty.get_room_items())
-    2. Choose two random items to swap. (random.randint())
-    3. Make a copy of the list of items and swap the two items. (list slicing)
-    4. Create the anomaly with the new list of items. (Duty.add_anomaly())
+    2. Choose two random items to swap. (Duty.get_random().randint())
+    3. Create the anomaly with the two items swapped. (Duty.add_swapped_items())
     """
 
     items = Duty.get_room_items(room)
@@ -208,22 +246,16 @@ def item_movement(room: str) -> bool:
         return False
 
     # Find two random items to swap
-    item_to_move = random.randint(0, len(items)-1)
-    item_to_move_to = random.randint(0, len(items)-1)
+    rng = Duty.get_random()
+    item_to_move = rng.randint(0, len(items)-1)
+    item_to_move_to = rng.randint(0, len(items)-1)
 
     # Make sure the two items are not the same
     while item_to_move == item_to_move_to:
-        item_to_move_to = random.randint(0, len(items)-1)
-
-    # Make a copy to avoid accidentally modifying the original item list
-    new_items = items[:]
-
-    # The below swap is also possible with the line: new_items[item_to_move], new_items[item_to_move_to] = new_items[item_to_move_to], new_items[item_to_move]
-    item_a = new_items[item_to_move]
-    item_b = new_items[item_to_move_to]
-    new_items[item_to_move] = item_b
-    new_items[item_to_move_to] = item_a
+        item_to_move_to = rng.randint(0, len(items)-1)
 
-    return Duty.add_anomaly("ITEM MOVEMENT", room, new_items)
+    # Only the two positions are stored, so the original item list is never copied or modified
+    return Duty.add_swapped_items("ITEM MOVEMENT", room, item_to_move, item_to_move_to)
 
-main()
+if __name__ == "__main__":
+    main()
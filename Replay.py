@@ -0,0 +1,244 @@
+"""
+Records shifts and replays them.
+
+A log holds everything needed to play a shift again exactly: a header with the game's seed, settings and rooms,
+then every command the player ran and the in-game time after every tick of the clock, then the outcome.
+Replaying runs the same commands at the same in-game times on a headless GameManager with the same seed,
+so it plays out exactly the same way, as fast as the computer can go.
+
+Logs are written through a buffered file, in one of two formats:
+    JSON lines (any file ending in .jsonl): a header object, then one ["t", time], ["c", command]
+        or ["e", outcome] array per line. Easy to read and grep.
+    Binary (any other file name): MAGIC, the header as length-prefixed JSON, then one record per tick
+        (b"t" + 8-byte time) or command (b"c" + 4-byte length + text), and b"e" + length-prefixed JSON for the outcome.
+        Version 1 logs gave commands a 2-byte length, and can still be read.
+        Around 9 bytes per tick, for logging every production shift.
+
+Replays use the rooms and anomalies from Game.py, so a log can only be replayed with the same Game.py
+and room file it was recorded with. The room file's hash is kept in the header, and replaying with a changed room file is an error.
+
+Usage:
+    python Replay.py LOG [LOG ...]
+"""
+
+import argparse
+import json
+import struct
+
+import Duty
+import Game
+import RoomFile
+
+MAGIC = b"DUTYLOG1"
+FORMAT_VERSION = 2
+# Older versions that can still be replayed
+READABLE_VERSIONS = (1, 2)
+
+# Big enough that a whole shift is usually written in a handful of writes
+BUFFER_SIZE = 64*1024
+
+TICK = struct.Struct("<cq")
+COMMAND = struct.Struct("<cI")
+# Commands in version 1 logs, which couldn't be longer than 65535 bytes
+COMMAND_V1 = struct.Struct("<cH")
+LENGTH = struct.Struct("<I")
+
+def make_header(game: Duty.GameManager, room_file: str = None, rooms: list = None) -> dict:
+    """
+    Return the header for a log of the game: its seed, settings and anomalies, and where its rooms came from.
+    Give the room file the rooms were loaded from, or the rooms themselves as (room name, items) if they didn't come from a file.
+    A hash of the room file is kept too, so the log can't be replayed with a room file that has changed since.
+    Call this before the game's first tick so the settings are the ones the shift starts with.
+    """
+    header = {
+        "version": FORMAT_VERSION,
+        "seed": game.seed,
+        "settings": dict(game.settings),
+        "anomalies": list(game.anomalies),
+        "room_file": room_file,
+        "room_file_hash": None if room_file is None else RoomFile.file_hash(room_file)
+    }
+    if rooms is not None:
+        header["rooms"] = [[name, list(items)] for name, items in rooms]
+    return header
+
+def outcome(game: Duty.GameManager) -> dict:
+    """
+    Return what a shift ended with: why it ended, the in-game time and the anomaly counts.
+    """
+    reasons = [reason for reason, ended in game.gameover.items() if ended]
+    return {
+        "reason": reasons[0] if reasons else "",
+        "time": game.get_data("time"),
+        "found_anomalies": game.get_data("found_anomalies"),
+        "active_anomalies": game.get_data("active_anomalies")
+    }
+
+class ReplayWriter:
+    """
+    Writes a log as the game runs. Set it as a GameManager's recorder (see record())
+    and the game calls tick() and command() for you.
+    """
+    def __init__(self, file_name: str, header: dict):
+        self.binary = not file_name.endswith(".jsonl")
+        self.file = open(file_name, "wb", buffering=BUFFER_SIZE)
+
+        if self.binary:
+            self.file.write(MAGIC)
+            self.write_json(header)
+        else:
+            self.write_line(header)
+
+    def write_json(self, value):
+        data = json.dumps(value, separators=(",", ":")).encode()
+        self.file.write(LENGTH.pack(len(data)))
+        self.file.write(data)
+
+    def write_line(self, value):
+        self.file.write(json.dumps(value, separators=(",", ":")).encode())
+        self.file.write(b"\n")
+
+    def tick(self, time: int):
+        if self.binary:
+            self.file.write(TICK.pack(b"t", time))
+        else:
+            self.write_line(["t", time])
+
+    def command(self, cmd: list[str]):
+        text = " ".join(cmd)
+        if self.binary:
+            data = text.encode()
+            self.file.write(COMMAND.pack(b"c", len(data)))
+            self.file.write(data)
+        else:
+            self.write_line(["c", text])
+
+    def close(self, game: Duty.GameManager = None):
+        """
+        Write the outcome of the game, if given, and close the log.
+        """
+        if self.file.closed:
+            return
+        if game is not None:
+            if self.binary:
+                self.file.write(b"e")
+                self.write_json(outcome(game))
+            else:
+                self.write_line(["e", outcome(game)])
+        self.file.close()
+
+def record(game: Duty.GameManager, file_name: str, room_file: str = None, rooms: list = None) -> ReplayWriter:
+    """
+    Start logging the game to file_name. Call it after the rooms, anomalies and settings are set up,
+    and before the first tick. Close the returned writer with the game when the shift ends.
+    """
+    game.recorder = ReplayWriter(file_name, make_header(game, room_file, rooms))
+    return game.recorder
+
+def read_log(file_name: str) -> tuple[dict, list[tuple[str, object]], dict]:
+    """
+    Return the header, the records as ("t", time) or ("c", command), and the outcome (None if the log has no outcome).
+    """
+    with open(file_name, "rb") as file:
+        data = file.read()
+
+    records = []
+    result = None
+    if data.startswith(MAGIC):
+        position = len(MAGIC)
+
+        def read_json():
+            nonlocal position
+            (length,) = LENGTH.unpack_from(data, position)
+            position += LENGTH.size
+            value = json.loads(data[position:position + length])
+            position += length
+            return value
+
+        header = read_json()
+        command = COMMAND_V1 if header.get("version") == 1 else COMMAND
+        while position < len(data):
+            kind = data[position:position + 1]
+            if kind == b"t":
+                _, time = TICK.unpack_from(data, position)
+                position += TICK.size
+                records.append(("t", time))
+            elif kind == b"c":
+                _, length = command.unpack_from(data, position)
+                position += command.size
+                records.append(("c", data[position:position + length].decode()))
+                position += length
+            elif kind == b"e":
+                position += 1
+                result = read_json()
+            else:
+                raise ValueError(f"Unknown record {kind!r} at byte {position} of {file_name}.")
+    else:
+        lines = data.decode().splitlines()
+        header = json.loads(lines[0])
+        for line in lines[1:]:
+            if not line:
+                continue
+            kind, value = json.loads(line)
+            if kind == "e":
+                result = value
+            else:
+                records.append((kind, value))
+
+    if header.get("version") not in READABLE_VERSIONS:
+        raise ValueError(f"{file_name} is version {header.get('version')} but only versions {', '.join(map(str, READABLE_VERSIONS))} can be replayed.")
+    return header, records, result
+
+def replay_game(header: dict, records: list[tuple[str, object]]) -> Duty.GameManager:
+    """
+    Play the recorded shift again on a headless game, and return the game once every record has been played.
+    """
+    game = Duty.GameManager(headless=True, seed=header["seed"])
+    with Duty.use_game(game):
+        if header.get("rooms") is not None:
+            Duty.add_rooms_bulk(header["rooms"])
+        else:
+            room_file = header.get("room_file")
+            # Logs from before the hash was kept can't be checked
+            if room_file is not None and header.get("room_file_hash") is not None and RoomFile.file_hash(room_file) != header["room_file_hash"]:
+                raise ValueError(f"{room_file} has changed since the shift was recorded, so replaying it would use different rooms.")
+            Game.add_rooms(room_file)
+        Game.register_anomalies()
+    game.set_settings(header["settings"])
+    game.set_spawner(game.create_anomaly)
+
+    if game.anomalies != header["anomalies"]:
+        raise ValueError(f"The log was recorded with anomalies {header['anomalies']} but Game.py registers {game.anomalies}.")
+
+    for kind, value in records:
+        if kind == "t":
+            game.advance_tick(value - game.get_data("time"))
+        else:
+            # The game checks whether the shift has ended before every command, the same as the main loop
+            with Duty.use_game(game):
+                Duty.update()
+            game.run_command(value.split())
+
+    with Duty.use_game(game):
+        Duty.update()
+    return game
+
+def replay(file_name: str) -> tuple[dict, dict]:
+    """
+    Replay the log and return the recorded outcome (None if there isn't one) and the outcome of the replay.
+    """
+    header, records, recorded = read_log(file_name)
+    return recorded, outcome(replay_game(header, records))
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded shifts and check they end the same way.")
+    parser.add_argument("logs", nargs="+")
+    args = parser.parse_args()
+
+    for file_name in args.logs:
+        recorded, replayed = replay(file_name)
+        status = "no outcome" if recorded is None else ("same" if recorded == replayed else "DIFFERENT")
+        print(f"{file_name}: {status} {replayed}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Reads room files.
+
+Each line of a room file is a room name followed by its items, separated by commas.
+Names and items can be wrapped in double quotes to use commas inside them, e.g.
+    Living Room,"Sofa, Black Leather",Coffee Table
+
+Huge layouts are slow to parse, so the parsed rooms are saved next to the file as a binary cache
+(e.g. rooms.txt.cache). The cache is used until the room file's modification time or size changes.
+The cache only holds numbers and strings, never anything that could run code when it is read:
+    CACHE_MAGIC, then CACHE_KEY (the file_key() it was made from), then the rooms' layout (see encode_layout()).
+"""
+
+import csv
+import gc
+import hashlib
+import itertools
+import os
+import struct
+import sys
+from array import array
+from collections import defaultdict
+from collections.abc import Sequence
+from contextlib import contextmanager
+
+# Read the file in big chunks instead of line by line
+BUFFER_SIZE = 1024*1024
+
+# Change this whenever the layout of the cache changes, so old caches are ignored
+CACHE_VERSION = 2
+
+CACHE_MAGIC = b"DUTYROM1"
+# The cache version and the room file's modification time and size
+CACHE_KEY = struct.Struct("<qqq")
+# Number of strings, rooms and items in a layout
+LAYOUT_COUNTS = struct.Struct("<QQQ")
+
+def read_rooms(file_name: str):
+    """
+    Yield (room name, items) for each line of the room file, one at a time. Blank lines are skipped.
+    Item names are interned, so an item that appears in many rooms is only stored once (in memory and in the cache).
+    """
+    with open(file_name, "r", newline="", encoding="utf-8", buffering=BUFFER_SIZE) as file:
+        for row in csv.reader(file):
+            if len(row) == 0:
+                continue
+            yield row[0], [sys.intern(item) for item in row[1:]]
+
+@contextmanager
+def gc_paused():
+    """
+    Turn off the garbage collector inside the with block.
+    Loading a huge layout makes hundreds of thousands of lists, and the garbage collector would otherwise
+    keep stopping to scan them even though none of them are garbage.
+    """
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
+
+def cache_file_name(file_name: str) -> str:
+    return file_name + ".cache"
+
+def file_key(file_name: str) -> tuple:
+    """
+    Return what the cache is checked against: the cache version and the room file's modification time and size.
+    """
+    stat = os.stat(file_name)
+    return (CACHE_VERSION, stat.st_mtime_ns, stat.st_size)
+
+# Room file name to (file_key(), hash), so a file that hasn't changed is only hashed once
+HASHES = {}
+
+def file_hash(file_name: str) -> str:
+    """
+    Return a hash of the room file's contents, e.g. to check a recorded shift is replayed with the same rooms.
+    """
+    key = file_key(file_name)
+    cached = HASHES.get(file_name)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    digest = hashlib.sha256()
+    with open(file_name, "rb") as file:
+        while chunk := file.read(BUFFER_SIZE):
+            digest.update(chunk)
+    HASHES[file_name] = (key, digest.hexdigest())
+    return digest.hexdigest()
+
+def little_endian(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+def encode_layout(names: Sequence, all_items: Sequence) -> bytes:
+    """
+    Return rooms with the given names and items as a string table and string ids, the way the cache and snapshots store them:
+        LAYOUT_COUNTS, then the string offsets, each room's item offsets, each room's name id and the item ids,
+        then every distinct string (room and item names) once, one after another.
+    """
+    # Hands out the next string id the first time each string is seen
+    string_ids = defaultdict(itertools.count().__next__)
+    name_ids = array("I", map(string_ids.__getitem__, names))
+    item_offsets = array("Q", [0])
+    item_ids = array("I")
+    for items in all_items:
+        item_ids.extend(map(string_ids.__getitem__, items))
+        item_offsets.append(len(item_ids))
+
+    # Dictionaries keep their order, so the strings come out in the order of their ids
+    encoded = [string.encode() for string in string_ids]
+    string_offsets = array("Q", [0])
+    string_offsets.extend(itertools.accumulate(map(len, encoded)))
+
+    return b"".join([
+        LAYOUT_COUNTS.pack(len(encoded), len(name_ids), len(item_ids)),
+        little_endian(string_offsets),
+        little_endian(item_offsets),
+        little_endian(name_ids),
+        little_endian(item_ids),
+        *encoded
+    ])
+
+def read_array(data: memoryview, typecode: str, start: int, count: int) -> array:
+    """
+    Return count numbers of the given type starting at byte start of data.
+    """
+    size = array(typecode).itemsize
+    if start + count * size > len(data):
+        raise ValueError("The layout is cut short.")
+    values = array(typecode)
+    values.frombytes(data[start:start + count * size])
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+def decode_layout(data: memoryview) -> list[tuple[str, list[str]]]:
+    """
+    Return the (room name, items) of every room in a layout made by encode_layout().
+    Raises ValueError if the layout is cut short or doesn't make sense.
+    """
+    n_strings, n_rooms, n_items = LAYOUT_COUNTS.unpack_from(data)
+    position = LAYOUT_COUNTS.size
+    string_offsets = read_array(data, "Q", position, n_strings + 1)
+    position += 8 * (n_strings + 1)
+    item_offsets = read_array(data, "Q", position, n_rooms + 1)
+    position += 8 * (n_rooms + 1)
+    name_ids = read_array(data, "I", position, n_rooms)
+    position += 4 * n_rooms
+    item_ids = read_array(data, "I", position, n_items)
+    position += 4 * n_items
+
+    blob = bytes(data[position:])
+    if string_offsets[-1] != len(blob) or item_offsets[-1] != n_items:
+        raise ValueError("The layout's offsets don't match its contents.")
+    strings = [sys.intern(blob[start:end].decode()) for start, end in zip(string_offsets, string_offsets[1:])]
+    return [(strings[name_id], list(map(strings.__getitem__, item_ids[start:end])))
+            for name_id, start, end in zip(name_ids, item_offsets, item_offsets[1:])]
+
+def read_cache(file_name: str) -> list[tuple[str, list[str]]]:
+    """
+    Return the cached rooms for the room file, or None if there is no cache or it is out of date.
+    """
+    try:
+        with open(cache_file_name(file_name), "rb") as cache:
+            data = memoryview(cache.read())
+    except OSError:
+        return None
+
+    try:
+        if bytes(data[:len(CACHE_MAGIC)]) != CACHE_MAGIC:
+            return None
+        if CACHE_KEY.unpack_from(data, len(CACHE_MAGIC)) != file_key(file_name):
+            return None
+        return decode_layout(data[len(CACHE_MAGIC) + CACHE_KEY.size:])
+    except (struct.error, ValueError, IndexError):
+        return None
+
+def write_cache(file_name: str, rooms: list[tuple[str, list[str]]], key: tuple):
+    """
+    Save the parsed rooms next to the room file, along with the file_key() taken before it was read.
+    Nothing happens if the cache can't be written.
+    """
+    cache_name = cache_file_name(file_name)
+    temporary_name = f"{cache_name}.{os.getpid()}.tmp"
+    try:
+        with open(temporary_name, "wb") as cache:
+            cache.write(CACHE_MAGIC)
+            cache.write(CACHE_KEY.pack(*key))
+            cache.write(encode_layout([name for name, _ in rooms], [items for _, items in rooms]))
+        # Replace the old cache in one step, so nothing ever reads a half-written cache
+        os.replace(temporary_name, cache_name)
+    except OSError:
+        try:
+            os.remove(temporary_name)
+        except OSError:
+            pass
+
+def load_rooms(file_name: str, use_cache: bool = True) -> list[tuple[str, list[str]]]:
+    """
+    Return every room in the room file as a list of (room name, items).
+    If use_cache is True, the rooms come from the cache when it is up to date, and the cache is updated otherwise.
+    """
+    with gc_paused():
+        if use_cache:
+            rooms = read_cache(file_name)
+            if rooms is not None:
+                return rooms
+
+        # Take the key before reading, so a change made while the file is being read makes the cache out of date
+        key = file_key(file_name)
+        rooms = list(read_rooms(file_name))
+        if use_cache:
+            write_cache(file_name, rooms, key)
+        return rooms
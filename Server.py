@@ -0,0 +1,356 @@
+"""
+Multi-player game server.
+
+Players connect over TCP (e.g. with telnet or nc) and each connection plays its own shift with its own GameManager.
+Everything runs on one asyncio event loop, so one process can host thousands of shifts at once.
+Reports are checked in the background on each game's own clock, so one player reporting never holds up the others.
+
+Every shift can be recorded to its own log with --record, so it can be replayed later (see Replay.py),
+and checkpointed in the background with --checkpoint, so it can be restored after a crash (see Snapshot.py).
+With --resume as well, players are asked for the name of an unfinished shift when they connect, and carry on from its checkpoint.
+Timings and counters for every shift can be written to a file for scraping with --metrics (see Duty.enable_metrics()).
+
+Usage:
+    python Server.py [--rooms FILE] [--host HOST] [--port PORT] [--record DIRECTORY] [--checkpoint DIRECTORY [--resume]] [--metrics FILE]
+"""
+
+import argparse
+import asyncio
+import io
+import itertools
+import os
+import re
+import secrets
+import time
+from warnings import warn
+
+import Duty
+import Game
+import Replay
+import Snapshot
+
+PROMPT = ">> "
+
+# Shift names end in a random token of this many bytes, so they can't be guessed
+SHIFT_TOKEN_BYTES = 12
+# What every shift name looks like: the time the server started, the shift's number and the token
+SHIFT_NAME = r"shift-\d+-\d+-[A-Za-z0-9_-]{16}"
+
+# The same settings Game.main() uses
+DEFAULT_SETTINGS = {
+    "debug": False,
+    "timescale": 60,
+    "probability": 0.1,
+    "min_seconds_between_anomalies": 10*60
+}
+
+class Session:
+    """
+    One player's shift. Everything the game prints is collected so it can be sent over the connection.
+    If resume is True, the shift carries on from the checkpoint in checkpoint_file, unless there isn't an unfinished one.
+    """
+    def __init__(self, rooms: list[tuple[str, list[str]]], anomalies: list[tuple], settings: dict, record_file: str = None, room_file: str = None,
+                 checkpointer: Snapshot.Checkpointer = None, checkpoint_file: str = None, resume: bool = False):
+        self.buffer = io.StringIO()
+        self.record_file = record_file
+        self.room_file = room_file
+        # Every session's checkpoints are written by the same background thread
+        self.checkpointer = checkpointer
+        self.checkpoint_file = checkpoint_file
+
+        self.resumed = False
+        if resume:
+            self.resumed = self.restore(anomalies)
+        if self.resumed:
+            return
+
+        self.game = Duty.GameManager(output=self.buffer)
+        self.game.set_spawner(self.game.create_anomaly)
+
+        self.game.add_rooms_bulk(rooms)
+        self.game.register_bulk(anomalies)
+        self.game.set_settings(settings)
+
+    def restore(self, anomalies: list[tuple]) -> bool:
+        """
+        Carry on from the checkpoint.
+        Return True if it was restored, or False if there is no checkpoint, it can't be read, or its shift had already ended.
+        """
+        if not os.path.exists(self.checkpoint_file):
+            return False
+        try:
+            game = Snapshot.restore(self.checkpoint_file, anomalies, output=self.buffer)
+        except ValueError as error:
+            warn(f"Couldn't resume {self.checkpoint_file}: {error}")
+            return False
+        if game.should_end_game():
+            return False
+
+        self.game = game
+        return True
+
+    def take_output(self) -> str:
+        """
+        Return everything printed since the last call, and forget it.
+        """
+        self.game.flush()
+        text = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return text
+
+    def start(self):
+        # A log has to start with the shift, so a resumed shift isn't recorded
+        if self.record_file is not None and not self.resumed:
+            Replay.record(self.game, self.record_file, self.room_file)
+        if self.checkpointer is not None:
+            self.checkpointer.watch(self.game, self.checkpoint_file)
+        self.game.clear()
+        if not self.resumed:
+            self.game.print_welcome()
+        self.game.tick_time()
+
+    def update(self) -> bool:
+        """
+        Check whether the shift has ended and show the screen, like one pass of Game.main().
+        Return True if the game should continue, False otherwise.
+        """
+        with Duty.use_game(self.game):
+            running = Duty.update()
+        self.game.display()
+        return running
+
+    def print_report_options(self):
+        """
+        Show the room and anomaly numbers, since the server can't prompt for them one at a time.
+        """
+        self.game.say(f"REPORTING ANOMALY\n{'-'*20}")
+        self.game.say("  Rooms:")
+        for i, room in enumerate(self.game.get_rooms()):
+            self.game.say(f"    [{i+1:02}] {room.name.upper()}")
+        self.game.say("  Anomalies:")
+        for i, anomaly_name in enumerate(self.game.anomalies):
+            self.game.say(f"    [{i+1:02}] {anomaly_name.upper()}")
+        self.game.say("Type \"report <room number> <anomaly number>\" to report an anomaly.")
+
+    def handle(self, line: str):
+        """
+        Run one line of input from the player, the same way Duty.handle_input() does.
+        """
+        cmd = line.lower().strip().split()
+        if len(cmd) == 0:
+            cmd = ["next"]
+
+        self.game.clear()
+        if cmd in (["report"], ["r"]):
+            self.print_report_options()
+        else:
+            self.game.run_command(cmd)
+
+    def tick(self):
+        self.game.tick_time()
+
+    def close(self):
+        """
+        Finish the shift's log and checkpoints, if there are any.
+        """
+        if self.game.recorder is not None:
+            self.game.recorder.close(self.game)
+        if self.game.checkpoint is not None:
+            self.checkpointer.unwatch(self.game, self.checkpoint_file)
+
+def load_rooms(room_file: str = None) -> tuple[list[tuple[str, list[str]]], list[tuple]]:
+    """
+    Load the rooms and anomalies once, so each new session doesn't have to read the room file again.
+    Return a list of (room name, items) and a list of (anomaly name, generator, applies).
+    """
+    template = Duty.GameManager(headless=True)
+    with Duty.use_game(template):
+        Game.add_rooms(room_file)
+        Game.register_anomalies()
+
+    anomalies = []
+    for name in template.anomalies:
+        generator, applies = template.generators.get(name, (None, None))
+        anomalies.append((name, generator, applies))
+    return [(room.name, room.items) for room in template.get_rooms()], anomalies
+
+async def play(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, rooms: list, anomalies: list[str], settings: dict, record_file: str = None, room_file: str = None,
+               checkpointer: Snapshot.Checkpointer = None, checkpoint_file: str = None, resume: bool = False):
+    """
+    Run one shift over a connection until it ends or the player disconnects.
+    """
+    session = Session(rooms, anomalies, settings, record_file, room_file, checkpointer, checkpoint_file, resume)
+    try:
+        session.start()
+        while True:
+            running = session.update()
+            writer.write((session.take_output() + (PROMPT if running else "")).encode())
+            await writer.drain()
+            if not running:
+                break
+
+            line = await reader.readline()
+            if not line:
+                break
+
+            session.handle(line.decode(errors="replace"))
+            session.tick()
+    except ConnectionError:
+        pass
+    finally:
+        session.close()
+        writer.close()
+
+async def ask_shift(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> str:
+    """
+    Ask the player for the name of a shift to carry on.
+    Return what they typed, which is empty if they want a new shift.
+    """
+    writer.write(f"Type the name of an unfinished shift to carry on, or press enter for a new shift.\n{PROMPT}".encode())
+    await writer.drain()
+    return (await reader.readline()).decode(errors="replace").strip()
+
+async def start_server(host: str = "127.0.0.1", port: int = 8023, room_file: str = None, settings: dict = None, record_dir: str = None,
+                       checkpoint_dir: str = None, resume: bool = False) -> asyncio.Server:
+    """
+    Start listening for players. Use port 0 to pick any free port.
+    If record_dir is given, each shift is recorded to its own log in that directory.
+    If checkpoint_dir is given, each shift is checkpointed to its own snapshot in that directory.
+    If resume is True as well, players are asked for the name of a shift when they connect, and carry on from its checkpoint.
+    Return the asyncio server, which is already accepting connections.
+    """
+    if resume and checkpoint_dir is None:
+        raise ValueError("Shifts can only be resumed from checkpoints, so resuming needs a checkpoint directory.")
+
+    rooms, anomalies = load_rooms(room_file)
+    full_settings = dict(DEFAULT_SETTINGS)
+    if settings is not None:
+        full_settings.update(settings)
+
+    if record_dir is not None:
+        os.makedirs(record_dir, exist_ok=True)
+    checkpointer = None
+    if checkpoint_dir is not None:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        checkpointer = Snapshot.Checkpointer()
+    shift_numbers = itertools.count()
+    started = int(time.time())
+    # Shifts being played right now, so two players can't carry on the same one
+    active_shifts = set()
+
+    async def handle_connection(reader, writer):
+        shift = None
+        if resume:
+            try:
+                name = await ask_shift(reader, writer)
+            except ConnectionError:
+                writer.close()
+                return
+            # The name becomes part of a file name, so only take names the server could have given out, exactly
+            if re.fullmatch(SHIFT_NAME, name) and name not in active_shifts and os.path.exists(os.path.join(checkpoint_dir, f"{name}.snap")):
+                shift = name
+            elif name:
+                writer.write(f"There is no unfinished shift called {name} to carry on, so here is a new one.\n".encode())
+        resuming = shift is not None
+        if shift is None:
+            # The random part means only the player who was given the name can carry the shift on
+            shift = f"shift-{started}-{next(shift_numbers):06}-{secrets.token_urlsafe(SHIFT_TOKEN_BYTES)}"
+
+        record_file = None
+        if record_dir is not None:
+            record_file = os.path.join(record_dir, f"{shift}.dutylog")
+        checkpoint_file = None
+        if checkpoint_dir is not None:
+            checkpoint_file = os.path.join(checkpoint_dir, f"{shift}.snap")
+            if resume:
+                writer.write(f"This is {shift}. If you're disconnected, type its name when you reconnect to carry on.\n".encode())
+
+        active_shifts.add(shift)
+        try:
+            await play(reader, writer, rooms, anomalies, full_settings, record_file, room_file, checkpointer, checkpoint_file, resuming)
+        finally:
+            active_shifts.discard(shift)
+
+    # Thousands of players can connect at once, so allow a long queue of waiting connections
+    return await asyncio.start_server(handle_connection, host, port, backlog=4096)
+
+class LocalClient:
+    """
+    A stand-in for a player connecting with telnet, used for testing and load testing the server.
+    """
+    def __init__(self):
+        self.reader = None
+        self.writer = None
+
+    async def connect(self, host: str, port: int) -> str:
+        """
+        Connect to the server and return the first screen.
+        """
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        return await self.read_screen()
+
+    async def read_screen(self) -> str:
+        """
+        Return everything up to the next prompt, or up to the end of the connection once the game is over.
+        """
+        try:
+            data = await self.reader.readuntil(PROMPT.encode())
+        except asyncio.IncompleteReadError as error:
+            data = error.partial
+        return data.decode()
+
+    async def send(self, command: str) -> str:
+        """
+        Type a command and return the screen that comes back.
+        """
+        self.writer.write((command + "\n").encode())
+        await self.writer.drain()
+        return await self.read_screen()
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+async def load_test(n_clients: int, commands: list[str], host: str = "127.0.0.1", port: int = 8023) -> list[str]:
+    """
+    Connect n_clients at once, have each of them type the commands, then disconnect.
+    Return the last screen each client saw.
+    """
+    async def run_client() -> str:
+        client = LocalClient()
+        screen = await client.connect(host, port)
+        for command in commands:
+            screen = await client.send(command)
+        await client.close()
+        return screen
+
+    return await asyncio.gather(*(run_client() for _ in range(n_clients)))
+
+async def serve_forever(host: str, port: int, room_file: str = None, record_dir: str = None, checkpoint_dir: str = None, resume: bool = False):
+    server = await start_server(host, port, room_file, record_dir=record_dir, checkpoint_dir=checkpoint_dir, resume=resume)
+    print(f"Serving on {', '.join(str(sock.getsockname()) for sock in server.sockets)}")
+    async with server:
+        await server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description="Host many shifts at once over TCP.")
+    parser.add_argument("--rooms", default=None, help="room file, defaults to the default rooms")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8023)
+    parser.add_argument("--record", default=None, help="directory to record every shift to, for replaying later")
+    parser.add_argument("--checkpoint", default=None, help="directory to checkpoint every shift to, for restoring after a crash")
+    parser.add_argument("--resume", action="store_true", help="let players carry on unfinished shifts from their checkpoints")
+    parser.add_argument("--metrics", default=None, help="file to write timings and counters to, as JSON if it ends in .json or Prometheus text otherwise")
+    parser.add_argument("--metrics-seconds", type=float, default=15.0, help="how often to rewrite the metrics file")
+    args = parser.parse_args()
+    if args.resume and args.checkpoint is None:
+        parser.error("--resume needs --checkpoint")
+
+    if args.metrics is not None:
+        Duty.enable_metrics(args.metrics, args.metrics_seconds)
+
+    asyncio.run(serve_forever(args.host, args.port, args.rooms, args.record, args.checkpoint, args.resume))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Runs shifts without a terminal.
+
+A HeadlessShift drives a GameManager against a VirtualClock, so nothing ever waits in real time,
+prints to the screen or asks for input. Instead of a person typing, a "player" decides what to do next.
+A whole 5 hour shift takes milliseconds, which makes this useful for load testing and balancing settings.
+"""
+
+import random
+
+import Duty
+import Game
+import Replay
+
+class ScriptedPlayer:
+    """
+    A player that plays back a list of (seconds, command) pairs in order.
+    seconds is how long (in real-world seconds) the player waits before typing the command,
+    and command is the text they would have typed, e.g. "n" or "r 2 1".
+    Once the script runs out the player quits.
+    """
+    def __init__(self, script: list[tuple[float, str]]):
+        self.script = list(script)
+        self.position = 0
+
+    def __call__(self, game: Duty.GameManager) -> tuple[float, str]:
+        if self.position >= len(self.script):
+            return 0.0, "quit"
+        seconds, command = self.script[self.position]
+        self.position += 1
+        return seconds, command
+
+class IdlePlayer:
+    """
+    A player that presses <enter> every few seconds and never reports anything.
+    """
+    def __init__(self, seconds_between_commands: float = 5.0):
+        self.seconds_between_commands = seconds_between_commands
+
+    def __call__(self, game: Duty.GameManager) -> tuple[float, str]:
+        return self.seconds_between_commands, ""
+
+class CheatingPlayer:
+    """
+    A player that can see which rooms have anomalies, used as a stand-in for a skilled player.
+    Every command, if there is an active anomaly that hasn't been reported yet they report it
+    with probability report_chance, otherwise they go to the next camera.
+    The player's choices come from the game's seed, so a seeded shift always plays out the same way.
+    """
+    def __init__(self, seconds_between_commands: float = 5.0, report_chance: float = 0.5):
+        self.seconds_between_commands = seconds_between_commands
+        self.report_chance = report_chance
+        # The player's own generator and the seed of the game it was made for
+        self.random = None
+        self.seed = None
+
+    def __call__(self, game: Duty.GameManager) -> tuple[float, str]:
+        # Not the game's generator itself: a replay doesn't have the player, so it would draw different anomalies
+        if self.random is None or self.seed != game.seed:
+            self.random = random.Random(f"{game.seed}:player")
+            self.seed = game.seed
+        if game.get_data("active_anomalies") > 0 and self.random.random() < self.report_chance:
+            for i, room in enumerate(game.get_rooms()):
+                if room.get_anomaly() and not game.report_pending(i):
+                    anomaly = game.anomalies.index(room.get_anomaly())
+                    return self.seconds_between_commands, f"report {i+1} {anomaly+1}"
+        return self.seconds_between_commands, ""
+
+class HeadlessShift:
+    """
+    A single shift running on a virtual clock.
+
+    Rooms are given as a dictionary of room name to item list, or as the name of a room file.
+    If neither is given, the default rooms from Game.py are used.
+    If no anomalies are given, the anomalies from Game.py are registered along with their generators;
+    anomaly names given here are registered without generators, so they need a custom create_anomaly function.
+    Anomalies are created with GameManager.create_anomaly() unless a different create_anomaly function is given.
+    Give a seed to play the same shift every time, and a log file name to record the shift so it can be replayed (see Replay.py).
+    """
+    def __init__(self, rooms: dict[str, list[str]] = None, anomalies: list[str] = None, settings: dict = None, create_anomaly=None, room_file: str = None, seed: int = None, record: str = None):
+        self.clock = Duty.VirtualClock()
+        self.game = Duty.GameManager(clock=self.clock.now, headless=True, seed=seed)
+        self.game.set_spawner(create_anomaly if create_anomaly is not None else self.game.create_anomaly)
+        self.commands = 0
+
+        with Duty.use_game(self.game):
+            if rooms is None:
+                Game.add_rooms(room_file)
+            else:
+                Duty.add_rooms_bulk(rooms.items())
+
+            if anomalies is None:
+                Game.register_anomalies()
+            else:
+                Duty.register_anomalies_bulk(anomalies)
+
+        if settings is not None:
+            self.game.set_settings(settings)
+
+        if record is not None:
+            Replay.record(self.game, record, room_file, None if rooms is None else rooms.items())
+
+        # Start the in-game clock, the same as Duty.init() does
+        self.game.tick_time()
+
+    def update(self) -> bool:
+        """
+        Check whether the shift has ended.
+        Return True if the game should continue, False otherwise.
+        """
+        with Duty.use_game(self.game):
+            return Duty.update()
+
+    def step(self, seconds: float, command: str):
+        """
+        Wait for the given number of real-world seconds, then run the command.
+        """
+        self.clock.advance(seconds)
+        cmd = command.lower().strip().split()
+        if len(cmd) == 0:
+            cmd = ["next"]
+        self.game.run_command(cmd)
+        self.game.tick_time()
+        self.commands += 1
+
+    def run(self, player, max_commands: int = None) -> dict:
+        """
+        Play the shift until it ends, asking the player for each command.
+        The player is called with the GameManager and must return (seconds, command).
+
+        Return the result of the shift (see result()).
+        """
+        while True:
+            if not self.update():
+                break
+            if max_commands is not None and self.commands >= max_commands:
+                break
+
+            seconds, command = player(self.game)
+            self.step(seconds, command)
+
+        if self.game.recorder is not None:
+            self.game.recorder.close(self.game)
+        return self.result()
+
+    def result(self) -> dict:
+        """
+        Return a summary of the shift: why it ended, the in-game time, and the anomaly counts.
+        """
+        found = self.game.get_data("found_anomalies")
+        active = self.game.get_data("active_anomalies")
+        reasons = [reason for reason, ended in self.game.gameover.items() if ended]
+        return {
+            "reason": reasons[0] if reasons else "",
+            "time": self.game.get_data("time"),
+            "found_anomalies": found,
+            "active_anomalies": active,
+            "total_anomalies": found + active,
+            "commands": self.commands
+        }
+
+def run_shift(player=None, **kwargs) -> dict:
+    """
+    Simulate one shift and return its result.
+    Any keyword arguments are passed to HeadlessShift. Defaults to a player who never reports anything.
+    """
+    if player is None:
+        player = IdlePlayer()
+    return HeadlessShift(**kwargs).run(player)
+
+if __name__ == "__main__":
+    print(run_shift(settings={"timescale": 60, "probability": 0.1, "min_seconds_between_anomalies": 10*60}))
@@ -0,0 +1,596 @@
+"""
+Saves a game part way through a shift and restores it later.
+
+A snapshot holds everything needed to carry on a shift exactly where it left off: the rooms and their anomalies,
+the game's data, settings and game over state, pending reports, the timeline of future events and the random
+generator's state. Generators can't be saved, so the anomalies are registered again on restore (see restore()).
+
+Snapshots are binary, little-endian and versioned:
+    MAGIC, then SECTIONS (the length of each section below), then each section padded to a multiple of 8 bytes:
+    state: the small parts of the game as JSON (data, settings, reports, events, ...)
+    layout: the rooms. Every distinct string (room and item names) is stored once in a string table,
+        and each room is a string id for its name plus a run of string ids for its items (see RoomFile.encode_layout()).
+    free rooms: the pool of rooms without an anomaly, in order, as 4-byte room positions
+    anomalies: one ANOMALY record per room with an anomaly (room, anomaly, time and change)
+    random: the random generator's internal state
+
+The layout only changes when rooms are added or removed, so it is encoded once per game and reused, and saving
+a 100k room game again only packs the anomalies and the small state. On restore the layout can be memory-mapped
+instead of read (lazy=True), so a room's items are only read from the file when the room is first looked at.
+
+To keep a running shift safe from crashes, checkpoint() saves it after every tick on a background thread
+(see Checkpointer), and restore() carries on from the last checkpoint. resume() does the same for the game every Duty
+function works on, which is how Game.py --resume and Server.py --resume carry on a shift that crashed.
+
+Usage:
+    python Snapshot.py SNAPSHOT [SNAPSHOT ...]
+"""
+
+import argparse
+import atexit
+import functools
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import weakref
+from array import array
+from collections.abc import Sequence
+from warnings import warn
+
+import Duty
+import Game
+import RoomFile
+
+MAGIC = b"DUTYSNP1"
+FORMAT_VERSION = 1
+
+# Lengths of the state, layout, free rooms, anomalies and random sections
+SECTIONS = struct.Struct("<QQQQQ")
+# Room position, anomaly (position in the state's "room_anomalies"), time (-1 for none), change kind, then two numbers for the change
+ANOMALY = struct.Struct("<IHqBqq")
+COUNT = struct.Struct("<I")
+
+# Change kinds (see Duty.ItemView) by the number stored in ANOMALY
+CHANGE_KINDS = ["remove", "swap", "replace", "hide", "items"]
+
+# The last layout encoded for each game, as (layout_version, layout), so it is only encoded again when the rooms change
+LAYOUTS = weakref.WeakKeyDictionary()
+
+def padding(length: int) -> bytes:
+    return bytes(-length % 8)
+
+def copy_state(game: Duty.GameManager) -> dict:
+    """
+    Return a copy of everything in the game that a snapshot needs, ready for encode().
+    Only the small, changing parts of the game are copied, and nothing in the copy is changed by the game
+    afterwards, so it can be encoded and written on another thread while the game carries on.
+    The rooms' layout is shared with the last snapshot if no rooms have been added or removed since.
+    """
+    rooms = game.get_rooms()
+    anomalies = []
+    for index in sorted(game.changed_rooms):
+        room = rooms[index]
+        change = room.anomaly_change
+        if change[0] == "items":
+            change = ("items", list(change[1]))
+        anomalies.append((index, room.anomaly, room.anomaly_time, change))
+
+    copied = {
+        "state": {
+            "version": FORMAT_VERSION,
+            "seed": game.seed,
+            "compact": isinstance(rooms, Duty.RoomTable),
+            "anomalies": list(game.anomalies),
+            "data": dict(game.data),
+            "settings": dict(game.settings),
+            "gameover": dict(game.gameover),
+            "timeline_started": game.timeline_started,
+            "spawner": game.spawner is not None,
+            "spawn_generation": game.spawn_generation,
+            # Reports aren't changed once they are made, so the lists only need copying, not the reports in them
+            "pending_reports": list(game.pending_reports),
+            "report_messages": list(game.report_messages),
+            "events": list(game.scheduler.events),
+            "event_count": game.scheduler.count
+        },
+        "anomalies": anomalies,
+        "free_rooms": list(game.free_rooms),
+        "random": game.random.getstate(),
+        "layout": None
+    }
+
+    cached = LAYOUTS.get(game)
+    if cached is not None and cached[0] == game.layout_version:
+        copied["layout"] = cached[1]
+    else:
+        # Room names and item lists never change once a room is added, so the lists of them are enough
+        if isinstance(rooms, Duty.RoomTable):
+            copied["rooms"] = (list(rooms.names), list(rooms.items))
+        else:
+            copied["rooms"] = ([room.name for room in rooms], [room.items for room in rooms])
+        # Lets encode() keep the layout it works out for the next snapshot
+        copied["layout_key"] = (game, game.layout_version)
+    return copied
+
+def encode(copied: dict) -> list[bytes]:
+    """
+    Return the snapshot of a game copied by copy_state(), as a list of parts to be written one after another (see write()).
+    """
+    layout = copied["layout"]
+    if layout is None:
+        layout = RoomFile.encode_layout(*copied["rooms"])
+        game, layout_version = copied["layout_key"]
+        LAYOUTS[game] = (layout_version, layout)
+
+    room_anomalies = []
+    anomaly_ids = {}
+    change_values = []
+    records = []
+    for index, anomaly, anomaly_time, change in copied["anomalies"]:
+        if anomaly not in anomaly_ids:
+            anomaly_ids[anomaly] = len(room_anomalies)
+            room_anomalies.append(anomaly)
+
+        kind = change[0]
+        if kind in ("remove", "hide"):
+            a, b = (change[1], 0) if kind == "remove" else (0, 0)
+        elif kind == "swap":
+            a, b = change[1], change[2]
+        elif kind == "replace":
+            a, b = change[1], len(change_values)
+            change_values.append(change[2])
+        else:
+            a, b = len(change_values), 0
+            change_values.append(change[1])
+
+        anomaly_time = -1 if anomaly_time is None else anomaly_time
+        records.append(ANOMALY.pack(index, anomaly_ids[anomaly], anomaly_time, CHANGE_KINDS.index(kind), a, b))
+
+    random_version, random_internal, gauss_next = copied["random"]
+    state = dict(copied["state"], random=[random_version, gauss_next], room_anomalies=room_anomalies, change_values=change_values)
+
+    sections = [
+        json.dumps(state, separators=(",", ":")).encode(),
+        layout,
+        RoomFile.little_endian(array("I", copied["free_rooms"])),
+        COUNT.pack(len(records)) + b"".join(records),
+        RoomFile.little_endian(array("I", random_internal))
+    ]
+    parts = [MAGIC, SECTIONS.pack(*map(len, sections))]
+    for section in sections:
+        parts.append(section)
+        parts.append(padding(len(section)))
+    return parts
+
+def capture(game: Duty.GameManager) -> list[bytes]:
+    """
+    Return the game's snapshot as a list of parts to be written one after another (see write()).
+    """
+    return encode(copy_state(game))
+
+def write(parts: list[bytes], file_name: str, sync: bool = False):
+    """
+    Write a captured snapshot to file_name. The snapshot is written next to it first and then put in place in
+    one step, so the file always holds a whole snapshot, the old one or the new one.
+    With sync, the snapshot is flushed to disk before it replaces the old one, and the directory is flushed
+    afterwards so the replacement itself is on disk too, so it survives a power cut.
+    """
+    temporary_name = f"{file_name}.{os.getpid()}.tmp"
+    try:
+        with open(temporary_name, "wb") as file:
+            file.writelines(parts)
+            if sync:
+                file.flush()
+                os.fsync(file.fileno())
+        os.replace(temporary_name, file_name)
+        if sync:
+            sync_directory(file_name)
+    except BaseException:
+        try:
+            os.remove(temporary_name)
+        except OSError:
+            pass
+        raise
+
+def sync_directory(file_name: str):
+    """
+    Flush the directory holding file_name to disk, so a file that was just renamed into it stays there after a crash.
+    Only POSIX systems can open a directory to flush it; elsewhere the rename is left to the file system.
+    """
+    if os.name != "posix":
+        return
+    directory = os.open(os.path.dirname(os.path.abspath(file_name)), os.O_RDONLY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
+
+def save(game: Duty.GameManager, file_name: str, sync: bool = False):
+    """
+    Save the game to file_name, replacing any snapshot already there.
+    """
+    write(capture(game), file_name, sync)
+
+class Checkpointer:
+    """
+    Saves games in the background while they are played, so a crash loses at most the last few commands.
+
+    Give it a game with watch() and the game asks for a checkpoint after every tick. Asking only copies the
+    game's state (see copy_state()), which is quick; a single background thread does the encoding, writing and
+    syncing to disk. Checkpoints for the same file are merged: if the thread is still busy when a game asks again,
+    the waiting checkpoint is swapped for the newer one, so however fast commands come in there is at most one
+    checkpoint waiting per file and the thread never falls behind. One checkpointer can look after many games.
+    """
+    def __init__(self, sync: bool = True):
+        # Flush each checkpoint to disk before it replaces the last one (see write())
+        self.sync = sync
+        # File name to the newest copied state not yet picked up by the thread. Dictionaries keep their order,
+        # so files are written in the order they first asked.
+        self.pending = {}
+        # Whether the thread is in the middle of writing a checkpoint
+        self.writing = False
+        self.closed = False
+        self.condition = threading.Condition()
+
+        # How many checkpoints were written, and how many were dropped for a newer one before they could be
+        self.written = 0
+        self.merged = 0
+        # The last error from writing a checkpoint, if any
+        self.error = None
+
+        self.thread = threading.Thread(target=self.run, name="checkpointer", daemon=True)
+        self.thread.start()
+        # Write whatever is still waiting if the program exits without closing the checkpointer
+        atexit.register(self.close)
+
+    def watch(self, game: Duty.GameManager, file_name: str):
+        """
+        Checkpoint the game to file_name after every tick, starting now.
+        """
+        game.checkpoint = functools.partial(self.request, game, file_name)
+        self.request(game, file_name)
+
+    def unwatch(self, game: Duty.GameManager, file_name: str):
+        """
+        Stop checkpointing the game, after one last checkpoint of how it ended.
+        """
+        game.checkpoint = None
+        self.request(game, file_name)
+
+    def request(self, game: Duty.GameManager, file_name: str):
+        """
+        Copy the game's state now and write it to file_name in the background.
+        """
+        copied = copy_state(game)
+        with self.condition:
+            if self.closed:
+                raise ValueError("Checkpoint requested after the checkpointer was closed.")
+            # Replacing a waiting checkpoint keeps its place in the queue, so a game that asks often can't hold up the others
+            if file_name in self.pending:
+                self.merged += 1
+            self.pending[file_name] = copied
+            self.condition.notify_all()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.closed:
+                    self.condition.wait()
+                if not self.pending:
+                    return
+                file_name = next(iter(self.pending))
+                copied = self.pending.pop(file_name)
+                self.writing = True
+
+            try:
+                write(encode(copied), file_name, self.sync)
+                self.written += 1
+            except Exception as error:
+                # Keep the shift going; the next checkpoint may well work (e.g. once the disk has space)
+                if self.error is None:
+                    warn(f"Could not write checkpoint {file_name}: {error}")
+                self.error = error
+            finally:
+                with self.condition:
+                    self.writing = False
+                    self.condition.notify_all()
+
+    def flush(self):
+        """
+        Wait until every checkpoint asked for so far has been written.
+        """
+        with self.condition:
+            while self.pending or self.writing:
+                self.condition.wait()
+
+    def close(self):
+        """
+        Write any checkpoints still waiting, then stop the background thread.
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()
+        atexit.unregister(self.close)
+
+def checkpoint(game: Duty.GameManager, file_name: str, sync: bool = True) -> Checkpointer:
+    """
+    Start checkpointing the game to file_name in the background, on its own checkpointer.
+    Close the returned checkpointer when the shift ends; restore() carries on from the last checkpoint after a crash.
+    """
+    checkpointer = Checkpointer(sync)
+    checkpointer.watch(game, file_name)
+    return checkpointer
+
+class StringTable(Sequence):
+    """
+    The strings in a snapshot's string table, each decoded the first time it is used.
+    """
+    def __init__(self, offsets: Sequence, data: memoryview):
+        self.offsets = offsets
+        self.data = data
+        self.strings = [None] * (len(offsets) - 1)
+
+    def __len__(self) -> int:
+        return len(self.strings)
+
+    def __getitem__(self, index: int) -> str:
+        string = self.strings[index]
+        if string is None:
+            string = self.strings[index] = sys.intern(str(self.data[self.offsets[index]:self.offsets[index + 1]], "utf-8"))
+        return string
+
+class MappedItems(Sequence):
+    """
+    Every room's items in a lazily restored game, read out of the snapshot the first time each room's items are needed.
+    Used as the items of a RoomTable, so it can also have rooms added and removed.
+    """
+    def __init__(self, strings: StringTable, offsets: Sequence, item_ids: Sequence):
+        self.strings = strings
+        self.offsets = offsets
+        self.item_ids = item_ids
+        # Each room's items once they have been read, or None. Rooms added after the restore are always here.
+        self.loaded = [None] * (len(offsets) - 1)
+
+    def __len__(self) -> int:
+        return len(self.loaded)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        items = self.loaded[index]
+        if items is None:
+            if index < 0:
+                index += len(self)
+            ids = self.item_ids[self.offsets[index]:self.offsets[index + 1]]
+            items = self.loaded[index] = list(map(self.strings.__getitem__, ids))
+        return items
+
+    def append(self, items: list[str]):
+        self.loaded.append(items)
+
+    def extend(self, all_items):
+        self.loaded.extend(all_items)
+
+    def __delitem__(self, index: int):
+        # Rooms after it move down a place, so read every room first while the positions still match the file
+        for i in range(len(self)):
+            self[i]
+        del self.loaded[index]
+
+class SnapshotReader:
+    """
+    Reads the sections of a snapshot out of bytes or a memory-mapped file.
+    With mapped set, arrays are views straight into the data instead of copies.
+    """
+    def __init__(self, data, file_name: str, mapped: bool = False):
+        self.data = memoryview(data)
+        self.file_name = file_name
+        # Views only work when the numbers in the file are in this computer's byte order
+        self.mapped = mapped and sys.byteorder == "little"
+
+        if bytes(self.data[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{file_name} is not a snapshot.")
+        lengths = SECTIONS.unpack_from(self.data, len(MAGIC))
+
+        self.sections = []
+        position = len(MAGIC) + SECTIONS.size
+        for length in lengths:
+            self.sections.append(self.data[position:position + length])
+            position += length + -length % 8
+        if position > len(self.data):
+            raise ValueError(f"{file_name} is cut short, it may not have finished saving.")
+
+        self.state = json.loads(bytes(self.sections[0]))
+        if self.state.get("version") != FORMAT_VERSION:
+            raise ValueError(f"{file_name} is version {self.state.get('version')} but only version {FORMAT_VERSION} can be restored.")
+
+    def array(self, data: memoryview, typecode: str, start: int, count: int) -> Sequence:
+        """
+        Return count numbers of the given type starting at byte start of data.
+        """
+        size = array(typecode).itemsize
+        data = data[start:start + count * size]
+        if self.mapped:
+            return data.cast(typecode)
+        values = array(typecode)
+        values.frombytes(data)
+        if sys.byteorder == "big":
+            values.byteswap()
+        return values
+
+    def layout(self) -> tuple[StringTable, Sequence, Sequence, Sequence]:
+        """
+        Return the string table, each room's name id, and the item offsets and item ids of every room.
+        """
+        data = self.sections[1]
+        n_strings, n_rooms, n_items = RoomFile.LAYOUT_COUNTS.unpack_from(data)
+        position = RoomFile.LAYOUT_COUNTS.size
+        string_offsets = self.array(data, "Q", position, n_strings + 1)
+        position += 8 * (n_strings + 1)
+        item_offsets = self.array(data, "Q", position, n_rooms + 1)
+        position += 8 * (n_rooms + 1)
+        name_ids = self.array(data, "I", position, n_rooms)
+        position += 4 * n_rooms
+        item_ids = self.array(data, "I", position, n_items)
+        position += 4 * n_items
+        return StringTable(string_offsets, data[position:]), name_ids, item_offsets, item_ids
+
+    def free_rooms(self) -> list[int]:
+        return list(self.array(self.sections[2], "I", 0, len(self.sections[2]) // 4))
+
+    def anomalies(self) -> list[tuple[int, str, int, tuple]]:
+        """
+        Return (room position, anomaly, anomaly time, change) for every room with an anomaly.
+        """
+        data = self.sections[3]
+        (count,) = COUNT.unpack_from(data)
+        change_values = self.state["change_values"]
+        anomalies = []
+        for index, anomaly_id, anomaly_time, kind_id, a, b in ANOMALY.iter_unpack(data[COUNT.size:COUNT.size + count * ANOMALY.size]):
+            kind = CHANGE_KINDS[kind_id]
+            if kind == "remove":
+                change = (kind, a)
+            elif kind == "swap":
+                change = (kind, a, b)
+            elif kind == "replace":
+                change = (kind, a, change_values[b])
+            elif kind == "hide":
+                change = (kind,)
+            else:
+                change = (kind, change_values[a])
+            anomalies.append((index, self.state["room_anomalies"][anomaly_id], None if anomaly_time < 0 else anomaly_time, change))
+        return anomalies
+
+    def random_state(self) -> tuple:
+        version, gauss_next = self.state["random"]
+        internal = self.array(self.sections[4], "I", 0, len(self.sections[4]) // 4)
+        return version, tuple(internal), gauss_next
+
+def restore(file_name: str, anomalies: list = None, lazy: bool = False, **options) -> Duty.GameManager:
+    """
+    Return a new game that carries on from the snapshot in file_name.
+
+    The anomalies are registered the same way as HeadlessShift (see Simulation.py): the anomalies from Game.py
+    if none are given, or else names or (name, generator, applies) tuples. They have to match the saved game's.
+    If the saved game created its own anomalies, the restored one does too with create_anomaly(); set game.spawner
+    afterwards to use a different spawner. Any other keyword arguments (clock, headless, output) go to the GameManager.
+
+    With lazy set, the snapshot is memory-mapped and each room's items are only read when they are first needed,
+    so even a huge layout restores quickly. Lazily restored games always use a compact RoomTable, and keep the
+    file open, so on Windows a new snapshot can't be saved over it while the game is running.
+    """
+    with open(file_name, "rb") as file:
+        if lazy:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            data = file.read()
+    reader = SnapshotReader(data, file_name, mapped=lazy)
+    state = reader.state
+
+    compact = state["compact"] or lazy
+    game = Duty.GameManager(compact=compact, seed=state["seed"], **options)
+
+    with Duty.use_game(game):
+        if anomalies is None:
+            Game.register_anomalies()
+        else:
+            Duty.register_anomalies_bulk(anomalies)
+    if game.anomalies != state["anomalies"]:
+        raise ValueError(f"The snapshot was saved with anomalies {state['anomalies']} but {game.anomalies} were registered.")
+
+    # The rooms
+    strings, name_ids, item_offsets, item_ids = reader.layout()
+    names = [strings[i] for i in name_ids]
+    if lazy:
+        all_items = MappedItems(strings, item_offsets, item_ids)
+    else:
+        all_items = [[strings[i] for i in item_ids[item_offsets[room]:item_offsets[room + 1]]] for room in range(len(names))]
+
+    if compact:
+        table = game.rooms
+        table.names = names
+        table.items = all_items
+        table.anomaly_ids = array("H", bytes(2 * len(names)))
+        table.anomaly_times = array("q", [-1]) * len(names)
+        # Worked out the first time each one is needed, see TableRoom.digest
+        table.digests = array("q", [-1]) * len(names)
+    else:
+        game.rooms = [Duty.Room(name, items) for name, items in zip(names, all_items)]
+    rooms = game.get_rooms()
+
+    working = bytearray(b"\x01") * len(names)
+    anomalies = reader.anomalies()
+    for index, anomaly, anomaly_time, change in anomalies:
+        room = rooms[index]
+        room.anomaly = anomaly
+        room.anomaly_change = change
+        room.anomaly_time = anomaly_time
+        room.anomaly_digest = Duty.change_digest(room.items, room.digest, change)
+        working[index] = room.camera_working()
+
+    game.room_index = dict(zip(names, range(len(names))))
+    game.free_rooms = reader.free_rooms()
+    game.free_room_positions = dict(zip(game.free_rooms, range(len(game.free_rooms))))
+    game.changed_rooms = {index for index, _, _, _ in anomalies}
+    game.working_cameras = Duty.CameraIndex(working)
+    # The restored layout is the one in the file, so saving again doesn't have to encode it
+    LAYOUTS[game] = (game.layout_version, reader.sections[1])
+
+    # Everything else
+    game.data = state["data"]
+    # The real-world clock starts again from the restore
+    game.data["prev_tick"] = None
+    game.settings = state["settings"]
+    game.gameover = state["gameover"]
+    game.timeline_started = state["timeline_started"]
+    game.spawn_generation = state["spawn_generation"]
+    if state["spawner"]:
+        game.spawner = game.create_anomaly
+
+    # Report events share their report with the pending list, the same as when they were scheduled
+    game.pending_reports = state["pending_reports"]
+    game.report_messages = state["report_messages"]
+    for when, count, kind, payload in state["events"]:
+        if kind == "report":
+            payload = game.pending_reports[game.pending_reports.index(payload)]
+        game.scheduler.events.append((when, count, kind, payload))
+    game.scheduler.count = state["event_count"]
+
+    game.random.setstate(reader.random_state())
+    return game
+
+def resume(file_name: str, anomalies: list = None, **options) -> Duty.GameManager:
+    """
+    Carry on the shift checkpointed to file_name, making it the game every Duty function works on (see Duty.set_game()).
+    The arguments are the same as restore().
+
+    Return the game, or None if there is no checkpoint or its shift had already ended.
+    """
+    if not os.path.exists(file_name):
+        return None
+    game = restore(file_name, anomalies, **options)
+    if game.should_end_game():
+        return None
+    Duty.set_game(game)
+    return game
+
+def main():
+    parser = argparse.ArgumentParser(description="Show what is in saved games.")
+    parser.add_argument("snapshots", nargs="+")
+    args = parser.parse_args()
+
+    for file_name in args.snapshots:
+        with open(file_name, "rb") as file:
+            reader = SnapshotReader(file.read(), file_name)
+        data = reader.state["data"]
+        n_strings, n_rooms, n_items = RoomFile.LAYOUT_COUNTS.unpack_from(reader.sections[1])
+        print(f"{file_name}: seed {reader.state['seed']}, time {data['time']}, {n_rooms} rooms ({n_items} items, {n_strings} strings), "
+              f"{data['active_anomalies']} active and {data['found_anomalies']} found anomalies")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Parameter sweep over difficulty settings.
+
+Every combination of probability, minimum gap between anomalies, max anomalies and room file
+is simulated with HeadlessShift. The shifts for each combination are split into chunks that run across
+all CPU cores, and each combination is written to the output file as soon as all of its chunks finish.
+
+Every chunk seeds its own random number generator from the base seed, the combination and the chunk number,
+so the results are the same no matter how many workers there are or which order the chunks finish in.
+
+Usage:
+    python Sweep.py --probability 0.05 0.1 --min-gap 300 600 --max-anomalies 3 4 --rooms default rooms.txt
+"""
+
+import argparse
+import itertools
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import Simulation
+
+COLUMNS = ["probability", "min_seconds_between_anomalies", "max_anomalies", "rooms", "shifts", "loss_rate", "timeup_rate", "quit_rate", "mean_found", "mean_total", "mean_time"]
+
+def make_grid(probabilities: list[float], min_gaps: list[float], max_anomalies: list[float], room_files: list[str]) -> list[dict]:
+    """
+    Return every combination of the given settings as a list of dictionaries.
+    A room file of "default" uses the default rooms from Game.py.
+    """
+    grid = []
+    for p, gap, n_max, rooms in itertools.product(probabilities, min_gaps, max_anomalies, room_files):
+        grid.append({
+            "probability": p,
+            "min_seconds_between_anomalies": gap,
+            "max_anomalies": n_max,
+            "rooms": rooms
+        })
+    return grid
+
+def run_chunk(config_index: int, chunk_index: int, config: dict, n_shifts: int, base_settings: dict, player_settings: dict, seed: int) -> tuple[int, dict]:
+    """
+    Simulate n_shifts shifts with one combination of settings, inside a worker process.
+
+    Return the config index and the summed results of the chunk.
+    """
+    # String seeds are hashed the same way in every process, unlike hash() of a tuple
+    random.seed(f"{seed}:{config_index}:{chunk_index}")
+
+    settings = dict(base_settings)
+    settings.update({key: value for key, value in config.items() if key != "rooms"})
+    room_file = None if config["rooms"] == "default" else config["rooms"]
+
+    totals = {"shifts": 0, "anomalies": 0, "timeup": 0, "quit": 0, "found": 0, "total": 0, "time": 0}
+    for _ in range(n_shifts):
+        player = Simulation.CheatingPlayer(**player_settings)
+        result = Simulation.HeadlessShift(settings=settings, room_file=room_file).run(player)
+        totals["shifts"] += 1
+        if result["reason"]:
+            totals[result["reason"]] += 1
+        totals["found"] += result["found_anomalies"]
+        totals["total"] += result["total_anomalies"]
+        totals["time"] += result["time"]
+
+    return config_index, totals
+
+def summary_row(config: dict, totals: dict) -> list:
+    """
+    Return one output row for a combination of settings, in the order of COLUMNS.
+    """
+    n = totals["shifts"]
+    return [
+        config["probability"],
+        config["min_seconds_between_anomalies"],
+        config["max_anomalies"],
+        config["rooms"],
+        n,
+        f"{totals['anomalies']/n:.4f}",
+        f"{totals['timeup']/n:.4f}",
+        f"{totals['quit']/n:.4f}",
+        f"{totals['found']/n:.3f}",
+        f"{totals['total']/n:.3f}",
+        f"{totals['time']/n:.1f}"
+    ]
+
+def sweep(grid: list[dict], output_file: str, shifts: int = 1000, chunk_size: int = 100, workers: int = None, seed: int = 0, base_settings: dict = None, player_settings: dict = None):
+    """
+    Simulate every combination in the grid and write one tab-separated row per combination to output_file.
+    Rows are written in the order their combinations finish, not the order of the grid.
+    """
+    if base_settings is None:
+        base_settings = {}
+    if player_settings is None:
+        player_settings = {}
+
+    chunks_left = []
+    totals = []
+    with ProcessPoolExecutor(max_workers=workers) as executor, open(output_file, "w") as output:
+        output.write("\t".join(COLUMNS) + "\n")
+        output.flush()
+
+        futures = []
+        for config_index, config in enumerate(grid):
+            chunk_sizes = [chunk_size] * (shifts // chunk_size)
+            if shifts % chunk_size:
+                chunk_sizes.append(shifts % chunk_size)
+            chunks_left.append(len(chunk_sizes))
+            totals.append({})
+
+            for chunk_index, n_shifts in enumerate(chunk_sizes):
+                futures.append(executor.submit(run_chunk, config_index, chunk_index, config, n_shifts, base_settings, player_settings, seed))
+
+        for future in as_completed(futures):
+            config_index, chunk_totals = future.result()
+            for key, value in chunk_totals.items():
+                totals[config_index][key] = totals[config_index].get(key, 0) + value
+
+            chunks_left[config_index] -= 1
+            if chunks_left[config_index] == 0:
+                row = summary_row(grid[config_index], totals[config_index])
+                output.write("\t".join(str(value) for value in row) + "\n")
+                output.flush()
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate shifts for every combination of difficulty settings.")
+    parser.add_argument("--probability", type=float, nargs="+", default=[0.1])
+    parser.add_argument("--min-gap", type=float, nargs="+", default=[10*60], help="min_seconds_between_anomalies (in-game seconds)")
+    parser.add_argument("--max-anomalies", type=float, nargs="+", default=[4])
+    parser.add_argument("--rooms", nargs="+", default=["default"], help="room files, or 'default' for the default rooms")
+    parser.add_argument("--timescale", type=float, default=60)
+    parser.add_argument("--shifts", type=int, default=1000, help="shifts per combination")
+    parser.add_argument("--chunk-size", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=None, help="defaults to the number of CPU cores")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--command-seconds", type=float, default=5.0)
+    parser.add_argument("--report-chance", type=float, default=0.5)
+    parser.add_argument("--output", default="sweep.tsv")
+    args = parser.parse_args()
+
+    grid = make_grid(args.probability, args.min_gap, args.max_anomalies, args.rooms)
+    player_settings = {"seconds_between_commands": args.command_seconds, "report_chance": args.report_chance}
+    sweep(grid, args.output, args.shifts, args.chunk_size, args.workers, args.seed, {"timescale": args.timescale}, player_settings)
+
+if __name__ == "__main__":
+    main()
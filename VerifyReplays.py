@@ -0,0 +1,140 @@
+"""
+Checks that recorded shifts still play out the same way.
+
+Every log (see Replay.py) is replayed headlessly and its found anomalies, active anomalies and
+game over reason are compared to the outcome that was recorded. The logs are split into batches that
+run across all CPU cores, and each log's result is written as soon as its batch finishes, so a run over
+hundreds of thousands of logs shows progress straight away and never holds them all in memory.
+
+Run it after changing the engine to make sure no archived shift ends differently.
+
+Usage:
+    python VerifyReplays.py LOG_OR_DIRECTORY [...] [--workers N] [--batch-size N] [--output FILE]
+"""
+
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import Replay
+
+# What has to match between the recorded and replayed outcomes
+COMPARED = ["reason", "found_anomalies", "active_anomalies"]
+
+COLUMNS = ["log", "status", "recorded", "replayed"]
+
+LOG_EXTENSIONS = (".dutylog", ".jsonl")
+
+def find_logs(paths: list[str]):
+    """
+    Yield every log file in the given paths. Directories are searched (including subdirectories)
+    for files ending in .dutylog or .jsonl; files are used as they are.
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, _, file_names in os.walk(path):
+                for file_name in sorted(file_names):
+                    if file_name.endswith(LOG_EXTENSIONS):
+                        yield os.path.join(directory, file_name)
+        else:
+            yield path
+
+def batches(logs, batch_size: int):
+    """
+    Yield lists of up to batch_size logs.
+    """
+    batch = []
+    for log in logs:
+        batch.append(log)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def summarise(outcome: dict) -> str:
+    if outcome is None:
+        return "-"
+    return " ".join(f"{key}={outcome[key]}" for key in COMPARED)
+
+def verify_log(file_name: str) -> list[str]:
+    """
+    Replay one log and return its output row, in the order of COLUMNS.
+    The status is "same", "different", "no outcome" (the log was never finished) or "error".
+    """
+    try:
+        recorded, replayed = Replay.replay(file_name)
+    except Exception as error:
+        return [file_name, "error", "-", f"{type(error).__name__}: {error}"]
+
+    if recorded is None:
+        status = "no outcome"
+    elif all(recorded[key] == replayed[key] for key in COMPARED):
+        status = "same"
+    else:
+        status = "different"
+    return [file_name, status, summarise(recorded), summarise(replayed)]
+
+def verify_batch(logs: list[str]) -> list[list[str]]:
+    """
+    Replay a batch of logs inside a worker process, and return one row per log.
+    """
+    return [verify_log(file_name) for file_name in logs]
+
+def verify(paths: list[str], output, workers: int = None, batch_size: int = 100) -> dict:
+    """
+    Replay every log in the paths and write one tab-separated row per log to output.
+    Rows are written in the order their batches finish, not the order of the logs.
+
+    Return how many logs had each status.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    counts = {"same": 0, "different": 0, "no outcome": 0, "error": 0}
+
+    output.write("\t".join(COLUMNS) + "\n")
+    output.flush()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Only keep a few batches per worker waiting, so the list of logs is read as it is needed
+        pending = set()
+        for batch in batches(find_logs(paths), batch_size):
+            pending.add(executor.submit(verify_batch, batch))
+            if len(pending) >= workers * 4:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                write_results(done, output, counts)
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            write_results(done, output, counts)
+
+    return counts
+
+def write_results(futures, output, counts: dict):
+    for future in futures:
+        for row in future.result():
+            counts[row[1]] += 1
+            output.write("\t".join(row) + "\n")
+    output.flush()
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded shifts and check they end the same way as when they were recorded.")
+    parser.add_argument("paths", nargs="+", help="log files, or directories to search for logs")
+    parser.add_argument("--workers", type=int, default=None, help="defaults to the number of CPU cores")
+    parser.add_argument("--batch-size", type=int, default=100, help="logs replayed per task")
+    parser.add_argument("--output", default=None, help="defaults to printing the results")
+    args = parser.parse_args()
+
+    if args.output is None:
+        counts = verify(args.paths, sys.stdout, args.workers, args.batch_size)
+    else:
+        with open(args.output, "w") as output:
+            counts = verify(args.paths, output, args.workers, args.batch_size)
+
+    print(", ".join(f"{status}: {count}" for status, count in counts.items()), file=sys.stderr)
+    # Fail if any shift ended differently, so this can be used as a check before merging engine changes
+    sys.exit(1 if counts["different"] or counts["error"] else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+import Benchmark
+
+def test_results_report_the_rooms_really_used():
+    assert Benchmark.time_benchmark("print_camera", 5000, repeat=1)["rooms"] == 1000
+    assert Benchmark.time_benchmark("get_room", 10, repeat=1)["rooms"] == 10
+
+    results = Benchmark.run_all([1, 3, 10], ["number_of_anomalies_to_create"], repeat=1)
+    assert [result["rooms"] for result in results] == [4, 10]
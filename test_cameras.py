@@ -0,0 +1,56 @@
+import random
+
+import Duty
+
+def linear_next(working: list[bool], index: int, reverse: bool = False) -> int:
+    """
+    Step through the cameras one at a time, the way next_camera() used to, looping around back to index.
+    """
+    step = -1 if reverse else 1
+    for distance in range(1, len(working) + 1):
+        candidate = (index + step * distance) % len(working)
+        if working[candidate]:
+            return candidate
+    return -1
+
+def test_next_working_matches_a_linear_scan():
+    rng = random.Random(16)
+    for n in list(range(1, 34)) + [100, 257]:
+        for broken_chance in (0.0, 0.5, 0.9, 1.0):
+            working = [rng.random() >= broken_chance for _ in range(n)]
+            cameras = Duty.CameraIndex(working)
+            # Break and fix a few cameras after building, so the tree's updates are checked too
+            for _ in range(n // 3):
+                index = rng.randrange(n)
+                working[index] = not working[index]
+                cameras.set(index, working[index])
+            for index in range(n):
+                for reverse in (False, True):
+                    assert cameras.next_working(index, reverse) == linear_next(working, index, reverse), (working, index, reverse)
+
+def test_appending_cameras_matches_building_them_at_once():
+    rng = random.Random(3)
+    working = [rng.random() < 0.4 for _ in range(70)]
+    appended = Duty.CameraIndex()
+    for camera_working in working[:40]:
+        appended.append(camera_working)
+    appended.extend(working[40:])
+    assert appended.tree == Duty.CameraIndex(working).tree
+    assert appended.count == sum(working)
+
+def test_next_camera_skips_broken_cameras_and_wraps_around():
+    game = Duty.GameManager(headless=True, seed=1)
+    game.add_rooms_bulk([(f"Room {i}", ["Chair"]) for i in range(6)])
+    game.register_bulk(["CAMERA MALFUNCTION"])
+    for index in (1, 2, 5):
+        assert game.add_anomaly_change("CAMERA MALFUNCTION", game.get_rooms()[index], ("hide",))
+
+    assert [game.next_camera() for _ in range(4)] == [3, 4, 0, 3]
+    assert [game.next_camera(reverse=True) for _ in range(4)] == [0, 4, 3, 0]
+
+    # With every camera offline there is nothing to show, and the camera stays where it was
+    for index in (0, 3, 4):
+        game.add_anomaly_change("CAMERA MALFUNCTION", game.get_rooms()[index], ("hide",))
+    assert game.next_camera() == -1
+    assert game.next_camera(reverse=True) == -1
+    assert game.get_data("camera") == 0
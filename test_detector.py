@@ -0,0 +1,45 @@
+import Detector
+import Duty
+
+ITEMS = ["Gas Stove", "Oak Wooden Table", "Sink", "Kettle"]
+
+def shown(change: tuple) -> list[str]:
+    return list(Duty.ItemView(ITEMS, change))
+
+def test_classify_finds_each_anomaly():
+    assert Detector.classify(ITEMS, shown(("remove", 0))) == "MISSING ITEM"
+    assert Detector.classify(ITEMS, shown(("remove", 3))) == "MISSING ITEM"
+    assert Detector.classify(ITEMS, shown(("swap", 1, 3))) == "ITEM MOVEMENT"
+    assert Detector.classify(ITEMS, shown(("replace", 2, "Sinnk"))) == "TYPO"
+    assert Detector.classify(ITEMS, shown(("replace", 2, "Sisk"))) == "TYPO"
+    assert Detector.classify(ITEMS, shown(("hide",))) == "CAMERA MALFUNCTION"
+
+def test_classify_leaves_other_changes_alone():
+    assert Detector.classify(ITEMS, ITEMS) is None
+    assert Detector.classify(ITEMS, shown(("replace", 2, "Bathtub"))) is None
+    assert Detector.classify(ITEMS, ["Gas Stove", "Sink"]) is None
+    assert Detector.classify(ITEMS, ITEMS + ["Chair"]) is None
+    assert Detector.classify(ITEMS, ["Sink", "Gas Stove", "Kettle", "Oak Wooden Table"]) is None
+
+def test_bot_reports_every_kind_of_anomaly():
+    game = Duty.GameManager(headless=True, seed=22)
+    game.add_rooms_bulk([(f"Room {i}", ITEMS) for i in range(6)])
+    game.register_bulk(["CAMERA MALFUNCTION", "MISSING ITEM", "ITEM MOVEMENT", "TYPO"])
+    bot = Detector.DetectorBot()
+    # The bot remembers the rooms before anything has changed
+    assert bot(game)[1] == "next"
+    game.run_command(["next"])
+
+    changes = {1: ("CAMERA MALFUNCTION", ("hide",)), 2: ("MISSING ITEM", ("remove", 1)),
+               3: ("ITEM MOVEMENT", ("swap", 0, 2)), 4: ("TYPO", ("replace", 3, "Kettlle"))}
+    for index, (anomaly, change) in changes.items():
+        assert game.add_anomaly_change(anomaly, game.get_rooms()[index], change)
+
+    reports = set()
+    for _ in range(20):
+        _, command = bot(game)
+        if command.startswith("report"):
+            _, room, anomaly = command.split()
+            reports.add((int(room) - 1, game.anomalies[int(anomaly) - 1]))
+        game.run_command(command.split())
+    assert reports == {(index, anomaly) for index, (anomaly, _) in changes.items()}
@@ -0,0 +1,34 @@
+import Duty
+
+def make_game(rooms: list[tuple[str, list[str]]]) -> Duty.GameManager:
+    game = Duty.GameManager(headless=True, seed=2)
+    game.add_rooms_bulk(rooms)
+    game.register_bulk(["MISSING ITEM", "CAMERA MALFUNCTION", "TYPO"])
+    return game
+
+def test_empty_items_change_the_digest():
+    assert Duty.items_digest(["Sofa", "Lamp", ""]) != Duty.items_digest(["Sofa", "Lamp"])
+    assert Duty.items_digest([""]) != Duty.items_digest([])
+    assert Duty.items_digest(["", "Sofa"]) != Duty.items_digest(["Sofa"])
+
+def test_removing_an_empty_item_changes_the_room_digest():
+    # A trailing comma in a room file gives the room an empty last item
+    game = make_game([("Living Room", ["Sofa", "Lamp", ""])])
+    before = game.room_digest(0)
+    assert game.add_anomaly_change("MISSING ITEM", game.get_rooms()[0], ("remove", 2))
+    assert game.room_digest(0) != before
+    assert game.room_digest(0) == Duty.items_digest(["Sofa", "Lamp"])
+
+def test_hidden_rooms_never_look_like_any_items():
+    game = make_game([("Closet", [""]), ("Hall", ["Coat"])])
+    for index in range(2):
+        before = game.room_digest(index)
+        assert game.add_anomaly_change("CAMERA MALFUNCTION", game.get_rooms()[index], ("hide",))
+        assert game.room_digest(index) != before
+        assert game.room_digest(index) not in (Duty.items_digest([]), Duty.items_digest([""]))
+
+def test_changes_give_the_digest_of_the_items_they_show():
+    items = ["Sofa", "", "Lamp", ""]
+    digest = Duty.items_digest(items)
+    for change in [("remove", 0), ("remove", 1), ("remove", 3), ("swap", 0, 1), ("replace", 3, "Rug"), ("replace", 0, ""), ("items", ["", ""])]:
+        assert Duty.change_digest(items, digest, change) == Duty.items_digest(list(Duty.ItemView(items, change)))
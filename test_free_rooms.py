@@ -0,0 +1,59 @@
+import random
+
+import pytest
+
+import Duty
+
+def check_pool(game: Duty.GameManager):
+    """
+    The pool of free rooms, its positions and the changed rooms have to match the rooms themselves.
+    """
+    rooms = game.get_rooms()
+    free = [i for i, room in enumerate(rooms) if not room.get_anomaly()]
+    assert sorted(game.free_rooms) == free
+    assert game.count_unchanged_rooms() == len(free)
+    assert game.free_room_positions == {index: position for position, index in enumerate(game.free_rooms)}
+    assert game.changed_rooms == set(range(len(rooms))) - set(free)
+
+# Reports can be resolved after their room has been removed, which warns that the room is gone
+@pytest.mark.filterwarnings("ignore:Room .* not found")
+def test_pool_follows_anomalies_and_reports():
+    game = Duty.GameManager(headless=True, seed=8)
+    game.add_rooms_bulk([(f"Room {i}", ["Chair", "Desk", "Lamp"]) for i in range(20)])
+    game.register_bulk(["MISSING ITEM", "ITEM MOVEMENT"])
+    rng = random.Random(8)
+    check_pool(game)
+
+    for step in range(200):
+        index = rng.randrange(len(game.get_rooms()))
+        room = game.get_rooms()[index]
+        action = rng.random()
+        if action < 0.5:
+            # Adding to a room that already has an anomaly fails, and must leave the pool alone
+            game.add_anomaly_change("MISSING ITEM", room, ("remove", rng.randrange(3)))
+        elif action < 0.8:
+            # Right and wrong reports, which are resolved when their check is due
+            game.report(index, rng.randrange(len(game.anomalies)))
+            game.advance_time(rng.randrange(0, 400))
+        elif action < 0.9:
+            game.remove_room(room.name)
+            game.add_room(f"New Room {step}", ["Chair", "Desk"])
+        else:
+            picked = game.get_random_unchanged_room()
+            assert picked is None or not picked.get_anomaly()
+        check_pool(game)
+
+    # Every report left gets resolved
+    game.advance_time(10000)
+    assert game.pending_reports == []
+    assert game.get_data("found_anomalies") > 0
+    check_pool(game)
+
+def test_full_pool_has_no_free_rooms():
+    game = Duty.GameManager(headless=True, seed=1)
+    game.add_rooms_bulk([("Kitchen", ["Stove"]), ("Hall", ["Coat"])])
+    game.register_bulk(["CAMERA MALFUNCTION"])
+    for room in game.get_rooms():
+        assert game.add_anomaly_change("CAMERA MALFUNCTION", room, ("hide",))
+    check_pool(game)
+    assert game.get_random_unchanged_room() is None
@@ -0,0 +1,23 @@
+import Duty
+import Game
+
+def test_typo_positions_follow_the_rooms():
+    game = Duty.GameManager(headless=True, seed=5)
+    game.add_rooms_bulk([("Kitchen", ["Gas Stove", "123"]), ("Bedroom", ["Bed"])])
+    game.register("TYPO", Game.typo, Game.can_typo)
+    with Duty.use_game(game):
+        assert Game.typo_positions("KITCHEN") == ((0, (0, 1, 2, 4, 5, 6, 7, 8)),)
+        assert Game.typo_positions("KITCHEN") is Game.typo_positions("KITCHEN")
+
+        # Replacing a room changes the layout, so its positions are worked out again
+        game.remove_room("KITCHEN")
+        game.add_room("KITCHEN", ["42", "Pan"])
+        assert Game.typo_positions("KITCHEN") == ((1, (0, 1, 2)),)
+
+        assert Game.typo("BEDROOM")
+        assert game.get_room("BEDROOM").get_anomaly() == "TYPO"
+
+def test_can_typo_needs_a_letter():
+    assert Game.can_typo(["123", "Pan"])
+    assert not Game.can_typo(["123", "4 5"])
+    assert not Game.can_typo([])
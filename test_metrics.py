@@ -0,0 +1,49 @@
+import json
+import time
+
+import Duty
+
+def test_enabling_metrics_again_keeps_one_dump(tmp_path, monkeypatch):
+    registered = []
+    monkeypatch.setattr(Duty.atexit, "register", registered.append)
+    monkeypatch.setattr(Duty.atexit, "unregister", registered.remove)
+    first_file = str(tmp_path / "first.json")
+    second_file = str(tmp_path / "second.json")
+    try:
+        metrics = Duty.enable_metrics(first_file)
+        metrics.count("spawns")
+        # The same file carries on with the same counts
+        assert Duty.enable_metrics(first_file) is metrics
+        assert registered == [metrics.dump]
+
+        # A different file starts again, and only the new metrics are written at exit
+        second = Duty.enable_metrics(second_file)
+        assert second is not metrics
+        assert registered == [second.dump]
+        for dump in registered:
+            dump()
+        assert not (tmp_path / "first.json").exists()
+        assert json.loads((tmp_path / "second.json").read_text())["counters"] == []
+    finally:
+        Duty.disable_metrics()
+    assert registered == []
+
+def test_command_timings_leave_out_the_player_typing(monkeypatch):
+    answers = iter(["1", "1"])
+    def slow_input(prompt: str = "") -> str:
+        time.sleep(0.2)
+        return next(answers)
+    monkeypatch.setattr("builtins.input", slow_input)
+
+    game = Duty.GameManager(headless=True, seed=1)
+    game.add_rooms_bulk([("Kitchen", ["Gas Stove"])])
+    game.register_bulk(["MISSING ITEM"])
+    try:
+        metrics = Duty.enable_metrics()
+        game.run_command(["r"])
+        _, seconds, count = metrics.histograms[("command", (("command", "report"),))]
+    finally:
+        Duty.disable_metrics()
+    assert count == 1
+    assert seconds < 0.1
+    assert metrics.waiting_seconds >= 0.4
@@ -0,0 +1,39 @@
+import json
+import random
+
+import Replay
+import Simulation
+
+def test_very_long_commands_are_recorded(tmp_path):
+    log = str(tmp_path / "shift.dutylog")
+    long_command = "x" * 70000
+    shift = Simulation.HeadlessShift(seed=7, record=log)
+    shift.run(Simulation.ScriptedPlayer([(1.0, long_command), (1.0, "n"), (1.0, "quit")]))
+
+    _, records, _ = Replay.read_log(log)
+    assert ("c", long_command) in records
+    recorded, replayed = Replay.replay(log)
+    assert replayed == recorded
+
+def test_version_1_logs_can_still_be_read(tmp_path):
+    log = tmp_path / "old.dutylog"
+    header = json.dumps({"version": 1, "seed": 1}).encode()
+    log.write_bytes(Replay.MAGIC + Replay.LENGTH.pack(len(header)) + header
+                    + Replay.COMMAND_V1.pack(b"c", 1) + b"n" + Replay.TICK.pack(b"t", 60))
+
+    header, records, result = Replay.read_log(str(log))
+    assert records == [("c", "n"), ("t", 60)]
+    assert result is None
+
+def test_cheating_player_only_depends_on_the_seed(tmp_path):
+    results = []
+    for global_seed in (1, 2):
+        random.seed(global_seed)
+        results.append(Simulation.HeadlessShift(seed=11).run(Simulation.CheatingPlayer(report_chance=0.3)))
+    assert results[0] == results[1]
+
+    # The player's choices don't use up the game's random numbers, so the shift replays the same
+    log = str(tmp_path / "cheat.dutylog")
+    Simulation.HeadlessShift(seed=11, record=log).run(Simulation.CheatingPlayer(report_chance=0.3))
+    recorded, replayed = Replay.replay(log)
+    assert replayed == recorded
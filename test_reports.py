@@ -0,0 +1,57 @@
+import Duty
+
+def make_game() -> Duty.GameManager:
+    game = Duty.GameManager(headless=True, seed=4)
+    game.add_rooms_bulk([("Kitchen", ["Gas Stove", "Sink"]), ("Hall", ["Coat", "Umbrella"])])
+    game.register_bulk(["MISSING ITEM", "ITEM MOVEMENT"])
+    assert game.add_anomaly_change("MISSING ITEM", game.get_rooms()[0], ("remove", 1))
+    return game
+
+def report_seconds(game: Duty.GameManager) -> int:
+    # anomaly_report_time real seconds to check and one more to fix, in in-game seconds
+    return int((game.get_setting("anomaly_report_time") + 1) * game.get_setting("timescale"))
+
+def test_report_resolves_when_due_and_not_before():
+    game = make_game()
+    game.advance_time(100)
+    assert game.report(0, 0)
+    assert game.report_pending(0)
+    assert game.pending_reports[0]["due"] == 100 + report_seconds(game)
+
+    # The player can carry on while the report is checked, and nothing is fixed yet
+    game.advance_time(report_seconds(game) - 1)
+    assert game.report_pending(0)
+    assert game.get_rooms()[0].get_anomaly() == "MISSING ITEM"
+    assert game.get_data("found_anomalies") == 0
+
+    game.advance_time(1)
+    assert not game.report_pending(0)
+    assert game.get_rooms()[0].get_anomaly() == ""
+    assert game.get_data("found_anomalies") == 1
+    assert game.get_data("active_anomalies") == 0
+    assert game.report_messages == ["Anomaly [MISSING ITEM] found in room [KITCHEN]! Anomaly fixed."]
+
+def test_wrong_reports_fix_nothing():
+    game = make_game()
+    game.report(0, 1)
+    game.report(1, 0)
+    game.advance_time(report_seconds(game))
+    assert game.pending_reports == []
+    assert game.get_rooms()[0].get_anomaly() == "MISSING ITEM"
+    assert game.get_data("found_anomalies") == 0
+    assert len(game.report_messages) == 2
+
+def test_reports_resolve_in_the_order_they_are_due():
+    game = make_game()
+    assert game.add_anomaly_change("ITEM MOVEMENT", game.get_rooms()[1], ("swap", 0, 1))
+    game.report(1, 1)
+    game.advance_time(30)
+    game.report(0, 0)
+
+    # The first report was due 30 seconds before the second
+    game.advance_time(report_seconds(game) - 1)
+    assert [report["room"] for report in game.pending_reports] == ["KITCHEN"]
+    assert game.get_rooms()[1].get_anomaly() == ""
+    game.advance_time(1)
+    assert game.pending_reports == []
+    assert game.get_data("found_anomalies") == 2
@@ -0,0 +1,41 @@
+import os
+
+import RoomFile
+
+def write_rooms(path, text: str) -> str:
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+def test_cache_round_trips_the_rooms(tmp_path):
+    file_name = write_rooms(tmp_path / "rooms.txt", 'Kitchen,Gas Stove,"Table, Oak"\nCafé,Gas Stove\n\nEmpty\n')
+    rooms = RoomFile.load_rooms(file_name)
+    assert rooms == [("Kitchen", ["Gas Stove", "Table, Oak"]), ("Café", ["Gas Stove"]), ("Empty", [])]
+    assert os.path.exists(RoomFile.cache_file_name(file_name))
+    assert RoomFile.read_cache(file_name) == rooms
+
+def test_cache_holds_no_pickles(tmp_path):
+    file_name = write_rooms(tmp_path / "rooms.txt", "Kitchen,Gas Stove\n")
+    RoomFile.load_rooms(file_name)
+    with open(RoomFile.cache_file_name(file_name), "rb") as cache:
+        assert cache.read(len(RoomFile.CACHE_MAGIC)) == RoomFile.CACHE_MAGIC
+
+def test_bad_caches_are_ignored(tmp_path):
+    file_name = write_rooms(tmp_path / "rooms.txt", "Kitchen,Gas Stove\nBedroom,Bed\n")
+    RoomFile.load_rooms(file_name)
+    cache_name = RoomFile.cache_file_name(file_name)
+    with open(cache_name, "rb") as cache:
+        data = cache.read()
+
+    # Cut short, scrambled, and anything else that isn't a cache (e.g. an old pickled one) are all read from the room file instead
+    for bad in [data[:-3], data[:len(data)//2], data[:40] + bytes(len(data) - 40), b"\x80\x05K\x01."]:
+        with open(cache_name, "wb") as cache:
+            cache.write(bad)
+        assert RoomFile.read_cache(file_name) is None
+        assert RoomFile.load_rooms(file_name) == [("Kitchen", ["Gas Stove"]), ("Bedroom", ["Bed"])]
+
+def test_changed_room_file_is_read_again(tmp_path):
+    file_name = write_rooms(tmp_path / "rooms.txt", "Kitchen,Gas Stove\n")
+    RoomFile.load_rooms(file_name)
+    write_rooms(tmp_path / "rooms.txt", "Kitchen,Gas Stove,Sink\n")
+    assert RoomFile.read_cache(file_name) is None
+    assert RoomFile.load_rooms(file_name) == [("Kitchen", ["Gas Stove", "Sink"])]
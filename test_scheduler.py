@@ -0,0 +1,63 @@
+import Duty
+
+def test_events_come_out_in_time_order_and_ties_in_schedule_order():
+    scheduler = Duty.Scheduler()
+    scheduler.schedule(50, "report", "b")
+    scheduler.schedule(10, "spawn", 1)
+    scheduler.schedule(50, "report", "c")
+    scheduler.schedule(30, "end")
+
+    assert scheduler.next_time() == 10
+    assert scheduler.pop_due(9) is None
+    events = []
+    while (event := scheduler.pop_due(100)) is not None:
+        events.append(event)
+    assert events == [(10, "spawn", 1), (30, "end", None), (50, "report", "b"), (50, "report", "c")]
+    assert scheduler.next_time() is None
+
+def make_game(spawned: list) -> Duty.GameManager:
+    game = Duty.GameManager(headless=True, seed=6)
+    game.add_rooms_bulk([(f"Room {i}", ["Chair"]) for i in range(5)])
+
+    def spawner() -> bool:
+        spawned.append(game.get_data("time"))
+        return True
+    game.set_spawner(spawner)
+    # Nothing else gets scheduled after a spawn, so only the events added here run
+    game.set_setting("probability", 0)
+    return game
+
+def test_stale_spawn_generations_are_ignored():
+    spawned = []
+    game = make_game(spawned)
+    game.spawn_generation = 5
+    game.scheduler.schedule(10, "spawn", 3)
+    game.scheduler.schedule(20, "spawn", 4)
+    game.scheduler.schedule(30, "spawn", 5)
+
+    game.advance_time(100)
+    assert spawned == [30]
+    assert len(game.scheduler) == 0
+
+def test_rescheduling_replaces_the_spawn_already_scheduled():
+    spawned = []
+    game = make_game(spawned)
+    game.register("CAMERA MALFUNCTION")
+    game.set_setting("probability", 1)
+    game.set_setting("min_seconds_between_anomalies", 600)
+    game.schedule_spawn()
+    first = game.scheduler.next_time()
+
+    # An anomaly appearing some other way starts the gap again, so the first spawn is out of date
+    game.advance_time(first - 1)
+    assert game.add_anomaly_change("CAMERA MALFUNCTION", game.get_rooms()[0], ("hide",))
+    spawns = sorted(when for when, _, kind, _ in game.scheduler.events if kind == "spawn")
+    assert len(spawns) == 2 and spawns[0] == first
+    second = spawns[1]
+    assert second >= first - 1 + 600
+
+    game.advance_time(1)
+    assert spawned == []
+    game.set_setting("probability", 0)
+    game.advance_time(second - game.get_data("time"))
+    assert spawned == [second]
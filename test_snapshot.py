@@ -0,0 +1,127 @@
+import threading
+
+import Duty
+import Snapshot
+
+def make_game(seed: int) -> Duty.GameManager:
+    game = Duty.GameManager(headless=True, seed=seed)
+    game.add_rooms_bulk([("Kitchen", ["Gas Stove", "Oak Wooden Table"]), ("Bedroom", ["Queen Size Bed"])])
+    return game
+
+def test_checkpoints_are_written_in_the_order_files_first_asked(tmp_path, monkeypatch):
+    written = []
+    write_started = threading.Semaphore(0)
+    finish_write = threading.Semaphore(0)
+
+    def slow_write(parts, file_name, sync=False):
+        written.append(file_name)
+        write_started.release()
+        finish_write.acquire(timeout=5)
+    monkeypatch.setattr(Snapshot, "write", slow_write)
+
+    games = {str(tmp_path / name): make_game(seed) for seed, name in enumerate(["a.snap", "b.snap", "c.snap"])}
+    a, b, c = games
+    checkpointer = Snapshot.Checkpointer(sync=False)
+    try:
+        checkpointer.request(games[a], a)
+        assert write_started.acquire(timeout=5)
+
+        # Every game asks again while each checkpoint is being written, round robin
+        for _ in range(6):
+            for file_name, game in games.items():
+                checkpointer.request(game, file_name)
+            finish_write.release()
+            assert write_started.acquire(timeout=5)
+    finally:
+        for _ in range(10):
+            finish_write.release()
+        checkpointer.close()
+
+    # A file that asks again keeps its place, so no game's checkpoints can be starved by the others
+    assert written[:7] == [a, a, b, c, a, b, c]
+
+def test_resume_carries_on_an_unfinished_shift(tmp_path):
+    file_name = str(tmp_path / "shift.snap")
+    assert Snapshot.resume(file_name) is None
+
+    game = make_game(1)
+    game.register_bulk(["Missing Item"])
+    game.set_spawner(game.create_anomaly)
+    Snapshot.save(game, file_name)
+    previous = Duty.get_game()
+    try:
+        resumed = Snapshot.resume(file_name, ["Missing Item"], headless=True)
+        assert resumed is Duty.get_game()
+        assert [room.name for room in resumed.get_rooms()] == ["KITCHEN", "BEDROOM"]
+
+        # A shift that has ended isn't carried on
+        resumed.end_game("quit")
+        Snapshot.save(resumed, file_name)
+        assert Snapshot.resume(file_name, ["Missing Item"], headless=True) is None
+    finally:
+        Duty.set_game(previous)
+
+def test_server_resumes_a_shift_after_a_disconnect(tmp_path):
+    import asyncio
+    import re
+    import Server
+
+    async def run():
+        server = await Server.start_server(port=0, checkpoint_dir=str(tmp_path), resume=True)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            client = Server.LocalClient()
+            await client.connect("127.0.0.1", port)
+            first = await client.send("")
+            shift = re.search(r"This is (shift-\S+)\.", first).group(1)
+            assert "Welcome" in first
+            await client.send("n")
+            await client.close()
+
+            # Waiting for the checkpoint written when the player left
+            for _ in range(100):
+                if (tmp_path / f"{shift}.snap").exists():
+                    break
+                await asyncio.sleep(0.01)
+
+            client = Server.LocalClient()
+            await client.connect("127.0.0.1", port)
+            screen = await client.send(shift)
+            await client.close()
+
+            # Somebody else can't take over a shift that isn't finished, but nor can they pick one that doesn't exist
+            client = Server.LocalClient()
+            await client.connect("127.0.0.1", port)
+            other = await client.send("shift-0-000000")
+            await client.close()
+
+            # Knowing when the server started and how many shifts it has had isn't enough to take over a shift
+            client = Server.LocalClient()
+            await client.connect("127.0.0.1", port)
+            guessed = await client.send(shift.rsplit("-", 1)[0])
+            await client.close()
+        return shift, screen, other, guessed
+
+    shift, screen, other, guessed = asyncio.run(run())
+    assert f"This is {shift}" in screen
+    assert "Welcome" not in screen
+    assert "There is no unfinished shift called shift-0-000000" in other
+    assert "Welcome" in other
+    assert "Welcome" in guessed and f"This is {shift}" not in guessed
+
+def test_synced_saves_flush_the_directory_too(tmp_path, monkeypatch):
+    synced = []
+    fsync = Snapshot.os.fsync
+    def recording_fsync(fd):
+        # Checkpointers left over from other tests may still be writing on their own threads
+        if threading.current_thread() is not threading.main_thread():
+            return fsync(fd)
+        synced.append(Snapshot.os.path.isdir(f"/proc/self/fd/{fd}") if Snapshot.os.path.exists("/proc/self/fd") else None)
+        fsync(fd)
+    monkeypatch.setattr(Snapshot.os, "fsync", recording_fsync)
+
+    Snapshot.save(make_game(1), str(tmp_path / "game.snap"), sync=True)
+    assert len(synced) == 2
+    if synced[0] is not None:
+        # The snapshot first, then the directory it was renamed into
+        assert synced == [False, True]
@@ -0,0 +1,95 @@
+import random
+from collections import Counter
+
+import pytest
+
+import Duty
+
+DRAWS = 20000
+# How often number_of_anomalies_to_create() checks for a new anomaly
+SECONDS_BETWEEN_CHECKS = 60
+
+def reference_spawns(rng: random.Random, last_check: int, last_anomaly: int, min_between: int, p: float, n_active: int, n_max: int, n_rooms: int) -> tuple[int, int]:
+    """
+    The loop number_of_anomalies_to_create() used to run, rolling the dice once per check.
+    Return the number of anomalies to spawn and the new seconds_since_last_anomaly.
+    """
+    n_checks = last_check // SECONDS_BETWEEN_CHECKS
+    if last_anomaly < min_between:
+        n_checks = 0
+    else:
+        last_anomaly -= (n_checks-1) * SECONDS_BETWEEN_CHECKS
+        last_anomaly = max(0, last_anomaly)
+
+    num_to_spawn = 0
+    for _ in range(n_checks):
+        spawning_is_valid = n_active < n_max and n_rooms > 0
+        last_anomaly += SECONDS_BETWEEN_CHECKS
+        if not spawning_is_valid:
+            continue
+
+        try_to_spawn = rng.random() < p
+
+        if last_anomaly >= min_between and try_to_spawn:
+            n_active += 1
+            num_to_spawn += 1
+            n_rooms -= 1
+            last_anomaly = 0
+    return num_to_spawn, last_anomaly
+
+def sampled_spawns(game: Duty.GameManager, last_check: int, last_anomaly: int, n_active: int) -> tuple[int, int]:
+    game.set_data("seconds_since_last_anomaly_check", last_check)
+    game.set_data("seconds_since_last_anomaly", last_anomaly)
+    game.set_data("active_anomalies", n_active)
+    num_to_spawn = game.number_of_anomalies_to_create()
+    return num_to_spawn, game.get_data("seconds_since_last_anomaly")
+
+def chi_square_critical(df: int, z: float = 3.09) -> float:
+    """
+    Return the chi-square value with df degrees of freedom that is only exceeded by chance 0.1% of the time
+    (z is the matching normal quantile), using the Wilson-Hilferty approximation.
+    """
+    return df * (1 - 2/(9*df) + z * (2/(9*df))**0.5)**3
+
+def chi_square(expected: Counter, observed: Counter) -> tuple[float, int]:
+    """
+    Return the chi-square statistic and degrees of freedom for whether two samples of the same size come from the same distribution.
+    Outcomes seen fewer than 10 times in both samples together are pooled, so every cell is large enough for the test.
+    """
+    cells = []
+    pooled = [0, 0]
+    for outcome in expected.keys() | observed.keys():
+        a, b = expected[outcome], observed[outcome]
+        if a + b < 10:
+            pooled[0] += a
+            pooled[1] += b
+        else:
+            cells.append((a, b))
+    if sum(pooled) > 0:
+        cells.append(tuple(pooled))
+    return sum((a - b)**2 / (a + b) for a, b in cells), len(cells) - 1
+
+@pytest.mark.parametrize("last_check, last_anomaly, min_between, p, n_active, n_max", [
+    (6000, 600, 600, 0.1, 0, 5),   # A long idle gap
+    (3000, 960, 900, 0.2, 0, 5),   # The minimum gap between anomalies blocks most checks
+    (3000, 600, 120, 0.5, 1, 3),   # max_anomalies is reached part way through
+    (600, 600, 600, 0.03, 0, 5),   # A short gap with rare anomalies
+])
+def test_sampler_matches_the_reference_loop(last_check, last_anomaly, min_between, p, n_active, n_max):
+    # Makes the game's random numbers the same on every run
+    random.seed(3)
+    game = Duty.GameManager()
+    for i in range(5):
+        game.add_room(f"Room {i}", ["Chair"])
+    game.set_setting("min_seconds_between_anomalies", min_between)
+    game.set_setting("probability", p)
+    game.set_setting("max_anomalies", n_max)
+
+    rng = random.Random(4)
+    expected = Counter(reference_spawns(rng, last_check, last_anomaly, min_between, p, n_active, n_max, 5) for _ in range(DRAWS))
+    observed = Counter(sampled_spawns(game, last_check, last_anomaly, n_active) for _ in range(DRAWS))
+
+    # Both the number spawned and the timer left afterwards have to follow the same distribution
+    statistic, df = chi_square(expected, observed)
+    assert df > 0
+    assert statistic < chi_square_critical(df)